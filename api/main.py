@@ -1,14 +1,23 @@
-from fastapi import FastAPI, UploadFile, File, Form, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, UploadFile, File, Form, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
 import tempfile
+from typing import Any, Dict, List, Optional
 
+from pydantic import BaseModel, Field
+
+from smartestate.cache import floorplan_cache_key, get_floorplan_cache
 from smartestate.config import get_settings
 from smartestate.db import init_db
-from smartestate.es_client import ensure_index
-from smartestate.etl import ingest_excel
+from smartestate.embedding import get_embedder
+from smartestate.es_client import aclose_es, close_es, ensure_index
+from smartestate.etl import ingest_excel, reindex_from_db
+from smartestate.jobs import JobQueueFull, get_job_manager
 from smartestate.floorplan import FloorplanParser
+from smartestate.search_backends import get_search_backend
+from smartestate.tools.search import get_search_cache, search_latency, search_properties_batch
 from phase3.graph.build_graph import build_graph
 from phase3.graph.state import GraphState, Message
 from smartestate.tools.memory import (
@@ -17,6 +26,7 @@ from smartestate.tools.memory import (
     load_user_memory,
     update_user_memory,
     add_semantic_memory,
+    aadd_semantic_memory,
 )
 
 
@@ -31,6 +41,56 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+UPLOAD_PATHS = {"/ingest", "/parse_floorplan"}
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def _max_upload_bytes() -> int:
+    return int(get_settings().max_upload_mb * 1024 * 1024)
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    # Refuse before the multipart body is read when the client announces a too-large upload
+    if request.method == "POST" and request.url.path in UPLOAD_PATHS:
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > _max_upload_bytes():
+            return JSONResponse({"error": f"Upload exceeds {get_settings().max_upload_mb} MB"}, status_code=413)
+    return await call_next(request)
+
+
+async def _save_upload(file: UploadFile, prefix: str, default_suffix: str) -> str:
+    """Copy an upload to a temp file in bounded chunks; the caller owns (and removes) the file."""
+    limit = _max_upload_bytes()
+    if file.size is not None and file.size > limit:
+        raise UploadTooLarge()
+    fd, tmp = tempfile.mkstemp(prefix=prefix, suffix=os.path.splitext(file.filename or "")[1] or default_suffix)
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > limit:
+                    raise UploadTooLarge()
+                f.write(chunk)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    finally:
+        await file.close()
+    return tmp
+
+
+def _too_large() -> JSONResponse:
+    return JSONResponse({"error": f"Upload exceeds {get_settings().max_upload_mb} MB"}, status_code=413)
+
 
 @app.on_event("startup")
 def on_startup():
@@ -39,40 +99,90 @@ def on_startup():
     except Exception as e:
         print(f"[startup] DB init failed: {e}")
     try:
-        ensure_index()
+        if get_search_backend().name == "elasticsearch":
+            ensure_index()
     except Exception as e:
-        print(f"[startup] ES index ensure failed: {e}")
+        print(f"[startup] Search index ensure failed: {e}")
     try:
         app.state.graph = build_graph()
     except Exception as e:
         print(f"[startup] Graph build failed: {e}")
+    if get_settings().embedding_warmup:
+        try:
+            if not get_embedder().warm_up():
+                print("[startup] Embedding model unavailable; search falls back to keyword matching")
+        except Exception as e:
+            print(f"[startup] Embedding warm-up failed: {e}")
 
 
 @app.get("/health")
 def health():
     settings = get_settings()
+    cache = get_search_cache()
     return {
         "status": "ok",
         "database_url": settings.database_url,
         "elasticsearch_url": settings.elasticsearch_url,
         "elasticsearch_index": settings.elasticsearch_index,
+        "search_backend": get_search_backend().stats(),
+        "embedding": get_embedder().stats(),
+        "search_latency": search_latency.snapshot(),
+        "search_cache": cache.stats() if cache is not None else None,
     }
 
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    get_job_manager().shutdown()
+    batcher = get_embedder().batcher
+    if batcher is not None:
+        batcher.close()
+    get_search_backend().close()
+    close_es()
+    await aclose_es()
+
+
 @app.post("/ingest")
 async def ingest(file: UploadFile = File(None), path: str = Form(None)):
     if file is None and not path:
         return JSONResponse({"error": "Provide either uploaded file or 'path'"}, status_code=400)
+    cleanup = None
     if file is not None:
-        fd, tmp = tempfile.mkstemp(prefix="smartestate_excel_", suffix=os.path.splitext(file.filename or "")[1] or ".xlsx")
-        os.close(fd)
-        with open(tmp, "wb") as f:
-            f.write(await file.read())
-        result = ingest_excel(tmp)
-        os.remove(tmp)
-        return result
-    result = ingest_excel(path)
-    return result
+        try:
+            tmp = await _save_upload(file, "smartestate_excel_", ".xlsx")
+        except UploadTooLarge:
+            return _too_large()
+        path = tmp
+        cleanup = lambda: os.remove(tmp)  # noqa: E731
+    try:
+        job_id = get_job_manager().submit("ingest", ingest_excel, path, cleanup=cleanup)
+    except JobQueueFull as e:
+        if cleanup:
+            cleanup()
+        return JSONResponse({"error": f"Too many ingest jobs: {e}"}, status_code=429)
+    return JSONResponse({"job_id": job_id, "status": "queued"}, status_code=202)
+
+
+@app.get("/ingest/{job_id}")
+def ingest_status(job_id: str):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Unknown job id"}, status_code=404)
+    return job
+
+
+@app.post("/reindex")
+def reindex(keep_old: bool = Form(False)):
+    try:
+        job_id = get_job_manager().submit("reindex", reindex_from_db, keep_old=keep_old)
+    except JobQueueFull as e:
+        return JSONResponse({"error": f"Too many jobs: {e}"}, status_code=429)
+    return JSONResponse({"job_id": job_id, "status": "queued"}, status_code=202)
+
+
+@app.get("/reindex/{job_id}")
+def reindex_status(job_id: str):
+    return ingest_status(job_id)
 
 
 @app.post("/parse_floorplan")
@@ -81,16 +191,54 @@ async def parse_floorplan(file: UploadFile = File(None), path: str = Form(None))
         return JSONResponse({"error": "Provide either uploaded image or 'path'"}, status_code=400)
     parser = FloorplanParser()
     if file is not None:
-        fd, tmp = tempfile.mkstemp(prefix="smartestate_image_", suffix=os.path.splitext(file.filename or "")[1] or ".jpg")
-        os.close(fd)
-        with open(tmp, "wb") as f:
-            f.write(await file.read())
         try:
-            result = parser.parse(tmp)
+            tmp = await _save_upload(file, "smartestate_image_", ".jpg")
+        except UploadTooLarge:
+            return _too_large()
+        try:
+            result = await run_in_threadpool(_parse_with_cache, parser, tmp)
         finally:
             os.remove(tmp)
         return result
-    return parser.parse(path)
+    return await run_in_threadpool(_parse_with_cache, parser, path)
+
+
+def _parse_with_cache(parser: FloorplanParser, image_path: str):
+    cache = get_floorplan_cache()
+    if cache is None:
+        return parser.parse(image_path)
+    key = floorplan_cache_key(image_path, parser.cache_identity())
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    result = parser.parse(image_path)
+    cache.put(key, result)
+    return result
+
+
+# Hard ceilings for one /search/batch call; SEARCH_BATCH_MAX_QUERIES can only lower the query cap
+_BATCH_MAX_QUERIES = 100
+_BATCH_MAX_K = 50
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., max_length=_BATCH_MAX_QUERIES)
+    k: int = Field(5, ge=1, le=_BATCH_MAX_K)
+    mode: Optional[str] = None
+    needs_certificate: bool = False
+    filters: Optional[Dict[str, Any]] = None
+
+
+@app.post("/search/batch")
+def search_batch(req: BatchSearchRequest):
+    """Several listing searches in one request (one embedding call, one ``_msearch``); results per query, in order."""
+    limit = get_settings().search_batch_max_queries
+    if len(req.queries) > limit:
+        return JSONResponse({"error": f"At most {limit} queries per batch"}, status_code=400)
+    results = search_properties_batch(
+        req.queries, k=req.k, needs_certificate=req.needs_certificate, mode=req.mode, filters=req.filters
+    )
+    return {"results": [{"query": q, "hits": hits} for q, hits in zip(req.queries, results)]}
 
 
 @app.post("/chat")
@@ -183,7 +331,8 @@ async def chat_ws(ws: WebSocket):
             conv_id = get_or_create_conversation(user_id)
             add_message(conv_id, "user", message)
             try:
-                add_semantic_memory(user_id, message)
+                # Encodes off the event loop; the graph's search below reuses the cached vector
+                await aadd_semantic_memory(user_id, message)
             except Exception:
                 pass
             user_mem = load_user_memory(user_id)
@@ -1,4 +1,5 @@
 import os
+import time
 import requests
 import streamlit as st
 
@@ -39,7 +40,7 @@ st.caption(f"Using API: {API_BASE}")
 st.set_page_config(page_title="SmartEstate – Ingest", layout="centered")
 st.title("📥 Ingest Properties Excel")
 
-uploaded = st.file_uploader("Upload Excel (.xlsx)", type=["xlsx"]) 
+uploaded = st.file_uploader("Upload feed (.xlsx, .csv, .parquet)", type=["xlsx", "csv", "parquet"]) 
 
 if st.button("Ingest"):
     if not uploaded:
@@ -49,7 +50,21 @@ if st.button("Ingest"):
             files = {"file": (uploaded.name, uploaded.getvalue(), uploaded.type or "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")}
             resp = requests.post(f"{API_BASE}/ingest", files=files, timeout=300)
             resp.raise_for_status()
-            st.success("Ingestion complete")
-            st.json(resp.json())
+            job_id = resp.json()["job_id"]
+            bar = st.progress(0.0, text="Queued")
+            while True:
+                job = requests.get(f"{API_BASE}/ingest/{job_id}", timeout=30).json()
+                total, done = job.get("rows_total") or 0, job.get("rows_processed") or 0
+                if total:
+                    eta = job.get("eta_seconds")
+                    bar.progress(min(1.0, done / total), text=f"{done}/{total} rows" + (f" · ETA {eta:.0f}s" if eta else ""))
+                if job.get("status") in ("succeeded", "failed"):
+                    break
+                time.sleep(2)
+            if job.get("status") == "succeeded":
+                st.success("Ingestion complete")
+                st.json(job.get("result"))
+            else:
+                st.error(f"Ingestion failed: {job.get('error')}")
         except Exception as e:
             st.error(f"Error: {e}")
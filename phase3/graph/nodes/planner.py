@@ -78,6 +78,8 @@ def planner_node(state: GraphState) -> GraphState:
     existing = state.context.get("memory", {}) if state.context else {}
     merged = {**existing, **prefs}
     state.context["memory"] = merged
+    # What this message asked for, as opposed to what was remembered from earlier turns
+    state.context["turn_preferences"] = prefs
     state.plan = steps
     state.plan_idx = 0
     return state
@@ -1,12 +1,64 @@
 import json
+import re
+from typing import Any, Dict
+
 from langchain_core.prompts import ChatPromptTemplate
 
 from ..state import GraphState, AgentResult, Citation
 from ..prompts import RAG_SUMMARY_PROMPT
+from .planner import extract_preferences
+from smartestate.reader import normalize_city
 from smartestate.tools.search import search_properties
 from smartestate.tools.llm_provider import get_llm
 
 
+def _memory_filters(mem: Dict[str, Any]) -> Dict[str, Any]:
+    """Search filters from remembered preferences (same keys as tools.sql.find_properties)."""
+    filters: Dict[str, Any] = {}
+    if mem.get("budget_max"):
+        filters["max_price"] = mem["budget_max"]
+    if mem.get("preferred_locations"):
+        filters["location"] = mem["preferred_locations"][0]
+    if mem.get("min_bedrooms"):
+        filters["min_rooms"] = mem["min_bedrooms"]
+    return filters
+
+
+def _turn_filters(state: GraphState, query: str) -> Dict[str, Any]:
+    """Hard filters for what the current message itself asks for (budget, city, bedrooms)."""
+    prefs = state.context.get("turn_preferences") if state.context else None
+    filters = _memory_filters(extract_preferences(query) if prefs is None else prefs)
+    city = normalize_city(query)
+    if city:
+        # Word-bounded match, so "Navi Mumbai" is not narrowed to "Mumbai" by a substring check
+        filters["location"] = city
+    return filters
+
+
+def _preference_score(hit: Dict[str, Any], preferred: Dict[str, Any]) -> int:
+    """How many remembered preferences a hit satisfies; used for ranking only."""
+    score = 0
+    price, rooms = hit.get("price"), hit.get("rooms")
+    if preferred.get("max_price") and price is not None and price <= preferred["max_price"]:
+        score += 1
+    if preferred.get("min_rooms") and rooms is not None and rooms >= preferred["min_rooms"]:
+        score += 1
+    if preferred.get("location"):
+        wanted = normalize_city(preferred["location"]) or str(preferred["location"]).lower()
+        if wanted == (hit.get("city") or normalize_city(hit.get("location"))):
+            score += 1
+    return score
+
+
+_HIGHLIGHT_TAG = re.compile(r"</?em>")
+
+
+def _snippet(hit: Dict[str, Any], limit: int) -> str:
+    """The full_text passages that matched the query (search highlights), else the description."""
+    passages = [_HIGHLIGHT_TAG.sub("", f) for f in hit.get("highlights") or []]
+    return (" … ".join(passages) or hit.get("long_description") or "")[:limit]
+
+
 def rag_node(state: GraphState) -> GraphState:
     query = state.messages[-1].content if state.messages else ""
     q_lower = query.lower()
@@ -14,9 +66,16 @@ def rag_node(state: GraphState) -> GraphState:
         "certificate", "certification", "inspection", "compliance", "fire", "safety", "report"
     ])
 
-    hits = search_properties(query, k=5, needs_certificate=needs_certificate)
+    filters = _turn_filters(state, query)
+    # Remembered preferences only re-rank: as filters, a stale one would override what is asked now
+    remembered = _memory_filters(state.context.get("memory", {}) if state.context else {})
+    preferred = {key: value for key, value in remembered.items() if key not in filters}
+    hits = search_properties(query, k=15 if preferred else 5, needs_certificate=needs_certificate, filters=filters)
+    if preferred:
+        # Stable sort, so relevance still orders hits that match equally many preferences
+        hits = sorted(hits, key=lambda h: _preference_score(h, preferred), reverse=True)[:5]
     llm = get_llm()
-    cits = [Citation(source_id=str(h.get("id", "")), snippet=(h.get("full_text") or h.get("long_description") or "")[:200]) for h in hits]
+    cits = [Citation(source_id=str(h.get("id", "")), snippet=_snippet(h, 200)) for h in hits]
 
     if llm and hits:
         condensed_hits = []
@@ -27,7 +86,7 @@ def rag_node(state: GraphState) -> GraphState:
                 "location": h.get("location"),
                 "price": h.get("price"),
                 "cert_links": h.get("cert_links"),
-                "snippet": (h.get("full_text") or h.get("long_description") or "")[:800],
+                "snippet": _snippet(h, 800),
             })
         prompt = ChatPromptTemplate.from_messages([
             ("system", RAG_SUMMARY_PROMPT),
@@ -0,0 +1,55 @@
+import argparse
+import random
+import statistics
+import time
+
+from smartestate.config import get_settings
+from smartestate.embedding import Embeddings
+from smartestate.embedding_onnx import PARITY_SAMPLE, OnnxEmbeddings, check_parity
+
+
+def _bench(embedder: Embeddings, texts, queries: int, batch_size: int):
+    embedder.warm_up()
+    latencies = []
+    for i in range(queries):
+        started = time.perf_counter()
+        embedder.encode_array([texts[i % len(texts)]])
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    started = time.perf_counter()
+    embedder.encode_array(texts, batch_size=batch_size)
+    elapsed = time.perf_counter() - started
+    return {
+        "backend": embedder.backend,
+        "single_ms_p50": round(statistics.median(latencies), 3),
+        "single_ms_p95": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        "batch_texts_per_s": round(len(texts) / elapsed, 1),
+    }
+
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Compare latency, throughput and score parity of the torch and ONNX int8 embedding backends")
+    parser.add_argument("--model", default=settings.embedding_model, help="Model name (default from EMBEDDING_MODEL)")
+    parser.add_argument("--texts", type=int, default=2000, help="Texts in the throughput run")
+    parser.add_argument("--queries", type=int, default=200, help="Single-text encodes in the latency run")
+    parser.add_argument("--batch-size", type=int, default=settings.embedding_batch_size, help="Texts per encode() batch")
+    parser.add_argument("--threads", type=int, default=settings.embedding_num_threads, help="Intra-op threads for both backends")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    words = " ".join(PARITY_SAMPLE).split()
+    texts = [" ".join(rng.choices(words, k=rng.randint(8, 120))) for _ in range(args.texts)]
+
+    reference = Embeddings(args.model, num_threads=args.threads)
+    onnx = OnnxEmbeddings(args.model, num_threads=args.threads)
+    for embedder in (reference, onnx):
+        print(_bench(embedder, texts, args.queries, args.batch_size))
+    if onnx.fallback_reason:
+        print({"onnx_fallback_reason": onnx.fallback_reason})
+    else:
+        print(check_parity(reference, onnx, PARITY_SAMPLE + texts[:200]))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,29 @@ from smartestate.etl import ingest_excel
 
 
 def main():
-    parser = argparse.ArgumentParser(description="Ingest property Excel into Postgres and Elasticsearch")
-    parser.add_argument("--file", required=True, help="Path to Excel file")
+    parser = argparse.ArgumentParser(description="Ingest a property feed (Excel, CSV or Parquet) into Postgres and Elasticsearch")
+    parser.add_argument("--file", required=True, help="Path to .xlsx, .csv or .parquet feed")
+    parser.add_argument("--bulk", dest="bulk", action="store_true", default=None, help="Batched upserts + ES bulk indexing (default from INGEST_BULK)")
+    parser.add_argument("--no-bulk", dest="bulk", action="store_false", help="Row-at-a-time writes in a single transaction")
+    parser.add_argument("--batch-size", type=int, default=None, help="Rows per batch (default from INGEST_BATCH_SIZE)")
+    parser.add_argument("--embed-batch-size", type=int, default=None, help="Texts per encode() batch (default from EMBEDDING_BATCH_SIZE)")
+    parser.add_argument("--parse-workers", type=int, default=None, help="Floorplan parser processes (default from FLOORPLAN_WORKERS)")
+    parser.add_argument("--parse-timeout", type=float, default=None, help="Per-image parse timeout in seconds (default from FLOORPLAN_TIMEOUT)")
+    parser.add_argument("--full", dest="incremental", action="store_false", default=None, help="Re-process every row, ignoring stored fingerprints")
+    parser.add_argument("--delete-missing", action="store_true", help="Delete listings that are no longer in the file")
+    parser.add_argument("--restart", dest="resume", action="store_false", default=None, help="Ignore any checkpoint and start from the first row")
     args = parser.parse_args()
-    res = ingest_excel(args.file)
+    res = ingest_excel(
+        args.file,
+        bulk=args.bulk,
+        batch_size=args.batch_size,
+        embed_batch_size=args.embed_batch_size,
+        parse_workers=args.parse_workers,
+        parse_timeout=args.parse_timeout,
+        incremental=args.incremental,
+        delete_missing=args.delete_missing,
+        resume=args.resume,
+    )
     print(res)
 
 
@@ -0,0 +1,17 @@
+import argparse
+
+from smartestate.etl import reindex_from_db
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the Elasticsearch property index from Postgres and swap the alias")
+    parser.add_argument("--batch-size", type=int, default=None, help="Rows per cursor batch (default from INGEST_BATCH_SIZE)")
+    parser.add_argument("--embed-batch-size", type=int, default=None, help="Texts per encode() batch (default from EMBEDDING_BATCH_SIZE)")
+    parser.add_argument("--keep-old", action="store_true", help="Keep the previous index instead of deleting it after the swap")
+    args = parser.parse_args()
+    res = reindex_from_db(batch_size=args.batch_size, embed_batch_size=args.embed_batch_size, keep_old=args.keep_old)
+    print(res)
+
+
+if __name__ == "__main__":
+    main()
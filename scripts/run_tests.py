@@ -24,6 +24,7 @@ DEFAULT_SUITES = [
     "tests/test_phase1.py",
     "tests/test_phase2_utils.py",
     "tests/phase3",
+    "tests/test_phase4_api.py",
 ]
 INTEGRATION_SUITE = "tests/test_phase2_smoke.py"
 REQUIRED_IMPORTS = (
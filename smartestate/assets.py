@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config import get_settings
+
+
+def is_url(path_or_url: str) -> bool:
+    return path_or_url.lower().startswith(("http://", "https://"))
+
+
+class AssetFetcher:
+    """Downloads remote images/certificates into an on-disk cache.
+
+    One pooled ``requests.Session`` is shared by a bounded thread pool; bodies are streamed
+    to a ``.part`` file and atomically renamed. Cached files are revalidated with
+    ``If-None-Match`` / ``If-Modified-Since`` at most once per ``revalidate_after`` seconds.
+    The cache is kept under ``max_bytes`` by dropping the least recently used files, checked
+    every few downloads like ``DiskCache``'s entry cap.
+    """
+
+    _CHUNK = 1 << 16
+    _META_SUFFIX = ".meta.json"
+    _PRUNE_EVERY = 64
+    # Fixed lock stripes: a URL always maps to the same lock and the set never grows
+    _LOCK_STRIPES = 64
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_workers: int = 8,
+        timeout: float = 20.0,
+        revalidate_after: float = 300.0,
+        max_bytes: int = 2 << 30,
+    ):
+        self.cache_dir = cache_dir
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.revalidate_after = revalidate_after
+        self.max_bytes = max(1, max_bytes)
+        os.makedirs(cache_dir, exist_ok=True)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="asset-fetch")
+        self._locks = [threading.Lock() for _ in range(self._LOCK_STRIPES)]
+        self._downloads = 0
+        self._prune_lock = threading.Lock()
+        self._sweep_partials()
+        self.prune()
+
+    def _paths(self, url: str):
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        ext = os.path.splitext(urlparse(url).path)[1][:10]
+        data = os.path.join(self.cache_dir, digest + ext)
+        return data, data + self._META_SUFFIX
+
+    def _lock_for(self, url: str) -> threading.Lock:
+        digest = hashlib.sha256(url.encode("utf-8")).digest()
+        return self._locks[int.from_bytes(digest[:4], "big") % len(self._locks)]
+
+    def prune(self) -> int:
+        """Remove least recently used files until the cache fits ``max_bytes``; returns how many went."""
+        with self._prune_lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                if name.endswith((".part", self._META_SUFFIX)):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+            removed = 0
+            # mtime doubles as last access: cache hits touch it
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                for p in (path, path + self._META_SUFFIX):
+                    try:
+                        os.remove(p)
+                    except OSError:
+                        pass
+                total -= size
+                removed += 1
+            return removed
+
+    def _touch(self, data_path: str) -> None:
+        try:
+            os.utime(data_path)
+        except OSError:
+            pass
+
+    def _sweep_partials(self, max_age: float = 3600.0):
+        # Leftovers from a crashed process; live downloads are much younger than max_age
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".part"):
+                p = os.path.join(self.cache_dir, name)
+                try:
+                    if now - os.path.getmtime(p) > max_age:
+                        os.remove(p)
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _read_meta(meta_path: str) -> Dict[str, str]:
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    @staticmethod
+    def _write_meta(meta_path: str, meta: Dict[str, str]):
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    def fetch(self, url: str) -> Optional[str]:
+        """Return a local path for ``url``, downloading or revalidating as needed; None on failure.
+
+        When revalidation fails on a network or HTTP error the cached copy, if any, is returned as is.
+        """
+        data_path, meta_path = self._paths(url)
+        with self._lock_for(url):
+            meta = self._read_meta(meta_path) if os.path.exists(data_path) else {}
+            if meta and time.time() - float(meta.get("checked_at", 0)) < self.revalidate_after:
+                self._touch(data_path)
+                return data_path
+            headers = {}
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+            tmp = None
+            try:
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as r:
+                    if r.status_code == 304 and meta:
+                        meta["checked_at"] = time.time()
+                        self._write_meta(meta_path, meta)
+                        self._touch(data_path)
+                        return data_path
+                    r.raise_for_status()
+                    fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+                    with os.fdopen(fd, "wb") as f:
+                        for chunk in r.iter_content(chunk_size=self._CHUNK):
+                            if chunk:
+                                f.write(chunk)
+                    os.replace(tmp, data_path)
+                    tmp = None
+                    self._write_meta(meta_path, {
+                        "url": url,
+                        "etag": r.headers.get("ETag", ""),
+                        "last_modified": r.headers.get("Last-Modified", ""),
+                        "checked_at": time.time(),
+                    })
+            except requests.RequestException:
+                # A stale copy beats none during an outage; checked_at is left alone so the next call retries
+                if meta:
+                    self._touch(data_path)
+                    return data_path
+                return None
+            except Exception:
+                return None
+            finally:
+                if tmp and os.path.exists(tmp):
+                    os.remove(tmp)
+        with self._prune_lock:
+            self._downloads += 1
+            due = self._downloads % self._PRUNE_EVERY == 0
+        if due:
+            self.prune()
+        return data_path
+
+    def fetch_many(self, urls: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Fetch distinct URLs concurrently (bounded by ``max_workers``)."""
+        unique = list(dict.fromkeys(urls))
+        return dict(zip(unique, self._executor.map(self.fetch, unique)))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+_fetcher: Optional[AssetFetcher] = None
+_fetcher_lock = threading.Lock()
+
+
+def get_asset_fetcher() -> AssetFetcher:
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            settings = get_settings()
+            _fetcher = AssetFetcher(
+                os.path.join(settings.cache_dir, "assets"),
+                max_workers=settings.asset_fetch_workers,
+                timeout=settings.asset_fetch_timeout,
+                revalidate_after=settings.asset_revalidate_seconds,
+                max_bytes=int(settings.asset_cache_max_mb * 1024 * 1024),
+            )
+        return _fetcher
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .config import get_settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DiskCache:
+    """Small persistent key/value cache (JSON values) backed by SQLite with LRU eviction.
+
+    Safe to share between threads and between processes (ETL workers and the API)
+    pointing at the same file; the entry cap is enforced approximately, every few writes.
+    """
+
+    _EVICT_EVERY = 64
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed)")
+        self._evict()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any) -> None:
+        payload = json.dumps(value, default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, accessed) VALUES (?, ?, ?)",
+                (key, payload, time.time()),
+            )
+            self._puts += 1
+            if self._puts % self._EVICT_EVERY == 0:
+                self._evict_locked()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _evict(self) -> None:
+        with self._lock:
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        # Drop everything past the newest max_entries by access time
+        self._conn.execute(
+            "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": int(entries)}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_caches: Dict[str, DiskCache] = {}
+_caches_lock = threading.Lock()
+
+
+def _named_cache(name: str, max_entries: int) -> DiskCache:
+    settings = get_settings()
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = DiskCache(os.path.join(settings.cache_dir, f"{name}.sqlite"), max_entries=max_entries)
+            _caches[name] = cache
+        return cache
+
+
+def get_floorplan_cache() -> Optional[DiskCache]:
+    """Process-wide floorplan parse cache, or None when disabled via FLOORPLAN_CACHE_ENABLED."""
+    settings = get_settings()
+    if not settings.floorplan_cache_enabled:
+        return None
+    return _named_cache("floorplan_parse", settings.floorplan_cache_max_entries)
+
+
+def get_certificate_cache() -> Optional[DiskCache]:
+    """Process-wide certificate text cache, or None when disabled via CERT_CACHE_ENABLED."""
+    settings = get_settings()
+    if not settings.cert_cache_enabled:
+        return None
+    return _named_cache("certificate_text", settings.cert_cache_max_entries)
+
+
+def floorplan_cache_key(image_path: str, identity: Dict[str, Any]) -> str:
+    """Content-addressed key: image bytes + model weights identity + parser settings."""
+    ident = json.dumps(identity, sort_keys=True)
+    return hashlib.sha256(f"{file_sha256(image_path)}::{ident}".encode("utf-8")).hexdigest()
+
+
+def _generation_path() -> str:
+    return os.path.join(get_settings().cache_dir, "index_generation")
+
+
+def index_generation() -> int:
+    """Counter bumped whenever the search index contents change (ingest, reindex)."""
+    try:
+        with open(_generation_path()) as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def bump_index_generation() -> int:
+    """Advance the index generation, invalidating cached search results in every process sharing CACHE_DIR."""
+    path = _generation_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".lock", "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            generation = index_generation() + 1
+            # Readers never see a half-written file
+            with open(path + ".tmp", "w") as f:
+                f.write(str(generation))
+            os.replace(path + ".tmp", path)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    return generation
@@ -0,0 +1,100 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pypdf import PdfReader
+
+from .cache import DiskCache, file_sha256
+
+
+def _extract(path: str, max_pages: int, max_chars: int) -> Tuple[str, bool]:
+    """``(text, complete)``; ``complete`` is False when reading the PDF failed part way."""
+    texts: List[str] = []
+    total = 0
+    complete = True
+    try:
+        reader = PdfReader(path)
+        for i, page in enumerate(reader.pages):
+            if i >= max_pages or total >= max_chars:
+                break
+            t = page.extract_text() or ""
+            if t:
+                texts.append(t)
+                total += len(t) + 1
+    except Exception:
+        complete = False
+    return "\n".join(texts)[:max_chars], complete
+
+
+def extract_pdf_text(path: str, max_pages: int, max_chars: int) -> str:
+    """Text of the first ``max_pages`` pages, stopping once ``max_chars`` have been collected."""
+    return _extract(path, max_pages, max_chars)[0]
+
+
+class CertificateExtractor:
+    """Extracts certificate text with a content-hash cache and an optional process pool.
+
+    Only complete extractions are cached; a corrupt PDF or a crashed worker yields whatever
+    text was read (possibly none) and is tried again next time.
+    """
+
+    def __init__(self, workers: int, max_pages: int, max_chars: int, cache: Optional[DiskCache] = None):
+        self.max_pages = max_pages
+        self.max_chars = max_chars
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+        self._executor = None
+        if workers > 1:
+            self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _key(self, path: str) -> str:
+        return f"{file_sha256(path)}:{self.max_pages}:{self.max_chars}"
+
+    def extract_many(self, paths: Iterable[str]) -> Dict[str, str]:
+        """Map each local PDF path to its (capped) text."""
+        out: Dict[str, str] = {}
+        keys: Dict[str, str] = {}
+        todo: List[str] = []
+        for p in dict.fromkeys(paths):
+            if not os.path.exists(p):
+                continue
+            if self.cache is not None:
+                try:
+                    keys[p] = self._key(p)
+                    hit = self.cache.get(keys[p])
+                except Exception:
+                    hit = None
+                if hit is not None:
+                    out[p] = hit
+                    self.hits += 1
+                    continue
+                self.misses += 1
+            todo.append(p)
+
+        if self._executor is not None and len(todo) > 1:
+            futures = [self._executor.submit(_extract, p, self.max_pages, self.max_chars) for p in todo]
+            results = (self._result(f) for f in futures)
+        else:
+            results = (_extract(p, self.max_pages, self.max_chars) for p in todo)
+        for p, (text, complete) in zip(todo, results):
+            out[p] = text
+            if complete and self.cache is not None and p in keys:
+                try:
+                    self.cache.put(keys[p], text)
+                except Exception:
+                    pass
+        return out
+
+    @staticmethod
+    def _result(future) -> Tuple[str, bool]:
+        try:
+            return future.result()
+        except Exception:
+            # Worker died (e.g. BrokenProcessPool); the other files still get their text
+            return "", False
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
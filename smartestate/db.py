@@ -1,7 +1,7 @@
 from contextlib import contextmanager
 from datetime import datetime
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
 from .config import get_settings
@@ -20,9 +20,18 @@ engine = get_engine()
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
 
 
+# Columns added after the first release; create_all() does not alter existing tables
+_COLUMN_MIGRATIONS = [
+    ("properties", "content_hash", "VARCHAR(64)"),
+]
+
+
 def init_db():
-    from .models import Property  # noqa: F401
+    from .models import IngestCheckpoint, Property  # noqa: F401
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for table, column, ddl in _COLUMN_MIGRATIONS:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {ddl}"))
 
 
 @contextmanager
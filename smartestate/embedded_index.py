@@ -0,0 +1,460 @@
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import simsimd
+except ImportError:  # optional: int8 SIMD scoring; plain float32 numpy otherwise
+    simsimd = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN.findall(text.lower()) if text else []
+
+
+def _is_word_char(c: str) -> bool:
+    return c.isalnum() or c == "_"
+
+
+def highlight_fragments(text: Optional[str], query: str, fragment_size: int = 200, max_fragments: int = 3) -> List[str]:
+    """Passages of ``text`` around query terms, terms wrapped in ``<em>``; the start of the text when nothing matches."""
+    if not text:
+        return []
+    terms = sorted(set(tokenize(query)), key=len, reverse=True)
+    if not terms:
+        return [text[:fragment_size]]
+    # A plain alternation over lowercased text scans far faster than case-insensitive word-boundary regexes
+    haystack = text.lower()
+    flags = 0
+    if len(haystack) != len(text):
+        haystack, flags = text, re.IGNORECASE
+    pattern = re.compile("|".join(map(re.escape, terms)), flags)
+
+    def _spans(start: int, end: int) -> Iterable[Tuple[int, int]]:
+        for m in pattern.finditer(haystack, start, end):
+            a, b = m.span()
+            if (a == 0 or not _is_word_char(haystack[a - 1])) and (b == len(haystack) or not _is_word_char(haystack[b])):
+                yield a, b
+
+    fragments: List[str] = []
+    covered = 0
+    for a, _ in _spans(0, len(haystack)):
+        if a < covered:
+            continue
+        start = max(covered, a - fragment_size // 4)
+        covered = min(len(text), start + fragment_size)
+        parts, pos = [], start
+        for x, y in _spans(start, covered):
+            parts += [text[pos:x], "<em>", text[x:y], "</em>"]
+            pos = y
+        parts.append(text[pos:covered])
+        fragments.append("".join(parts))
+        if len(fragments) >= max_fragments:
+            break
+    return fragments or [text[:fragment_size]]
+
+
+def quantize_int8(vectors: np.ndarray) -> np.ndarray:
+    # Unit vectors: components are within [-1, 1]
+    return np.clip(np.rint(np.asarray(vectors, dtype=np.float32) * 127.0), -127, 127).astype(np.int8)
+
+
+def _read_pointer(pointer: str) -> Optional[str]:
+    try:
+        with open(pointer) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def _snapshot_lock(directory: str, exclusive: bool):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class EmbeddedIndex:
+    """In-process vector + BM25 index over a small document collection.
+
+    Vectors live in one ``(n, dims)`` matrix, memory-mapped straight from the snapshot
+    (float32 or float16) until the first write copies it out as float32, and are searched
+    brute force. With ``simsimd`` installed, an int8 copy is scanned with SIMD dot products
+    and a shortlist is re-scored exactly; otherwise every candidate is scored exactly, with
+    float16 rows widened a chunk at a time. Text fields feed an inverted index scored with BM25; field
+    boosts are applied by counting a field's tokens ``boost`` times. Keyword and numeric
+    fields are kept as numpy columns so filters are vectorized masks. Deletes leave
+    tombstones that are compacted away when a snapshot is written.
+    """
+
+    K1 = 1.2
+    B = 0.75
+    # Shortlist per requested hit that the int8 scan hands to exact float32 re-scoring
+    RESCORE_FACTOR = 4
+    # Rows widened to float32 at once when scoring float16 snapshot vectors
+    SCAN_CHUNK = 65536
+
+    def __init__(
+        self,
+        text_fields: Dict[str, int],
+        keyword_fields: Sequence[str] = (),
+        numeric_fields: Sequence[str] = (),
+        vector_dtype: str = "float32",
+    ):
+        self.text_fields = dict(text_fields)
+        self.keyword_fields = tuple(keyword_fields)
+        self.numeric_fields = tuple(numeric_fields)
+        self.vector_dtype = vector_dtype
+        self.dims: Optional[int] = None
+        # Name of the snapshot this index was last loaded from or saved to
+        self.snapshot: Optional[str] = None
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.ids: List[str] = []
+        self.sources: List[Optional[Dict[str, Any]]] = []
+        self._row_of: Dict[str, int] = {}
+        self._vectors = np.zeros((0, self.dims or 0), dtype=np.float32)
+        self._vectors_i8 = np.zeros((0, self.dims or 0), dtype=np.int8)
+        self._has_vector = np.zeros(0, dtype=bool)
+        self._alive = np.zeros(0, dtype=bool)
+        # Keyword columns hold int codes into a per-field vocabulary (-1: missing)
+        self._vocab: Dict[str, Dict[str, int]] = {f: {} for f in self.keyword_fields}
+        self._keywords = {f: np.empty(0, dtype=np.int32) for f in self.keyword_fields}
+        self._numbers = {f: np.empty(0, dtype=np.float64) for f in self.numeric_fields}
+        self._doc_len = np.zeros(0, dtype=np.float64)
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._postings_arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._total_len = 0.0
+        self._live = 0
+        self.mutations = 0
+
+    def __len__(self) -> int:
+        return self._live
+
+    # -- writes -----------------------------------------------------------
+
+    def _grow(self, extra: int) -> None:
+        size = len(self.ids)
+        capacity = self._alive.shape[0]
+        if size + extra <= capacity:
+            if self._vectors.shape[0] < capacity or not self._vectors.flags.writeable:
+                # Vectors still memory-mapped from a snapshot: copy them out before the first write
+                vectors = np.zeros((capacity, self._vectors.shape[1]), dtype=np.float32)
+                vectors[:size] = self._vectors[:size]
+                self._vectors = vectors
+                vectors_i8 = np.zeros(vectors.shape, dtype=np.int8)
+                vectors_i8[:size] = self._vectors_i8[:size]
+                self._vectors_i8 = vectors_i8
+            return
+        new_cap = max(size + extra, capacity * 2, 64)
+
+        def _resize(arr: np.ndarray, fill) -> np.ndarray:
+            out = np.full((new_cap,) + arr.shape[1:], fill, dtype=arr.dtype)
+            out[:size] = arr[:size]
+            return out
+
+        vectors = np.zeros((new_cap, self._vectors.shape[1]), dtype=np.float32)
+        vectors[:size] = self._vectors[:size]
+        self._vectors = vectors
+        self._vectors_i8 = _resize(self._vectors_i8, 0)
+        self._has_vector = _resize(self._has_vector, False)
+        self._alive = _resize(self._alive, False)
+        self._doc_len = _resize(self._doc_len, 0.0)
+        self._keywords = {f: _resize(col, -1) for f, col in self._keywords.items()}
+        self._numbers = {f: _resize(col, np.nan) for f, col in self._numbers.items()}
+
+    def _doc_tokens(self, source: Dict[str, Any]) -> Counter:
+        counts: Counter = Counter()
+        for field, boost in self.text_fields.items():
+            for tok in tokenize(source.get(field)):
+                counts[tok] += boost
+        return counts
+
+    def upsert(self, docs: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """Add or replace documents; an ``embedding`` key in the source becomes the vector."""
+        docs = list(docs)
+        with self._lock:
+            self._grow(len(docs))
+            for doc_id, source in docs:
+                source = dict(source)
+                vector = source.pop("embedding", None)
+                if doc_id in self._row_of:
+                    self._delete_row(self._row_of[doc_id])
+                row = len(self.ids)
+                self.ids.append(doc_id)
+                self.sources.append(source)
+                self._row_of[doc_id] = row
+                if vector is not None:
+                    vec = np.asarray(vector, dtype=np.float32)
+                    if self.dims is None:
+                        self.dims = int(vec.shape[0])
+                        self._vectors = np.zeros((self._alive.shape[0], self.dims), dtype=np.float32)
+                        self._vectors_i8 = np.zeros((self._alive.shape[0], self.dims), dtype=np.int8)
+                    elif vec.shape[0] != self.dims:
+                        raise ValueError(f"Expected {self.dims}-d vectors, got {vec.shape[0]}")
+                    self._vectors[row] = vec
+                    self._vectors_i8[row] = quantize_int8(vec)
+                    self._has_vector[row] = True
+                self._alive[row] = True
+                for f in self.keyword_fields:
+                    val = source.get(f)
+                    if isinstance(val, str):
+                        vocab = self._vocab[f]
+                        self._keywords[f][row] = vocab.setdefault(val.lower(), len(vocab))
+                    else:
+                        self._keywords[f][row] = -1
+                for f in self.numeric_fields:
+                    val = source.get(f)
+                    self._numbers[f][row] = float(val) if isinstance(val, (int, float)) else np.nan
+                counts = self._doc_tokens(source)
+                for tok, tf in counts.items():
+                    self._postings.setdefault(tok, {})[row] = tf
+                    self._postings_arrays.pop(tok, None)
+                length = float(sum(counts.values()))
+                self._doc_len[row] = length
+                self._total_len += length
+                self._live += 1
+            self.mutations += len(docs)
+        return len(docs)
+
+    def _delete_row(self, row: int) -> None:
+        source = self.sources[row]
+        if source is not None:
+            for tok in self._doc_tokens(source):
+                posting = self._postings.get(tok)
+                if posting is not None:
+                    posting.pop(row, None)
+                    self._postings_arrays.pop(tok, None)
+                    if not posting:
+                        del self._postings[tok]
+        self._total_len -= self._doc_len[row]
+        self._alive[row] = False
+        self._has_vector[row] = False
+        self.sources[row] = None
+        self._live -= 1
+
+    def delete(self, doc_ids: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for doc_id in doc_ids:
+                row = self._row_of.pop(doc_id, None)
+                if row is not None:
+                    self._delete_row(row)
+                    removed += 1
+            self.mutations += removed
+        return removed
+
+    def doc_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._row_of)
+
+    # -- queries ----------------------------------------------------------
+
+    def _filter_mask(self, clauses: Sequence[Dict[str, Any]]) -> np.ndarray:
+        """Evaluate the subset of ES filter DSL produced by ``tools.search.build_filters``."""
+        n = len(self.ids)
+        mask = self._alive[:n].copy()
+        for clause in clauses:
+            (kind, body), = clause.items()
+            (field, cond), = body.items()
+            if kind == "term":
+                if field in self._keywords:
+                    code = self._vocab[field].get(cond.lower()) if isinstance(cond, str) else None
+                    mask &= self._keywords[field][:n] == (-2 if code is None else code)
+                elif field in self._numbers:
+                    mask &= self._numbers[field][:n] == float(cond)
+                else:
+                    mask &= np.array([(s or {}).get(field) == cond for s in self.sources[:n]], dtype=bool)
+            elif kind == "range":
+                col = self._numbers[field][:n]
+                with np.errstate(invalid="ignore"):
+                    if "gte" in cond:
+                        mask &= col >= cond["gte"]
+                    if "lte" in cond:
+                        mask &= col <= cond["lte"]
+            elif kind == "wildcard":
+                needle = re.sub(r"\\(.)", r"\1", cond["value"].strip("*")).lower()
+                codes = [code for value, code in self._vocab[field].items() if needle in value]
+                mask &= np.isin(self._keywords[field][:n], codes)
+            elif kind == "exists":
+                mask &= np.array([(s or {}).get(cond) is not None for s in self.sources[:n]], dtype=bool)
+            else:
+                raise ValueError(f"Unsupported filter clause for the embedded index: {kind}")
+        return mask
+
+    def _hits(self, rows: np.ndarray, scores: np.ndarray, started: float) -> Dict[str, Any]:
+        hits = [{"_id": self.ids[r], "_score": float(s), "_source": self.sources[r]} for r, s in zip(rows, scores)]
+        return {"took": round((time.perf_counter() - started) * 1000, 3), "hits": {"hits": hits}}
+
+    @staticmethod
+    def _top(scores: np.ndarray, candidates: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if candidates.size > k:
+            part = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[part], scores[part]
+        order = np.argsort(-scores, kind="stable")
+        return candidates[order], scores[order]
+
+    def knn(self, vector: Sequence[float], k: int, clauses: Sequence[Dict[str, Any]] = ()) -> Dict[str, Any]:
+        """Cosine kNN (vectors are normalized) among docs passing ``clauses``; ES-shaped response."""
+        started = time.perf_counter()
+        with self._lock:
+            n = len(self.ids)
+            if self.dims is None or n == 0 or k <= 0:
+                return self._hits(np.empty(0, dtype=int), np.empty(0), started)
+            mask = self._filter_mask(clauses) & self._has_vector[:n]
+            candidates = np.flatnonzero(mask)
+            if candidates.size == 0:
+                return self._hits(candidates, np.empty(0), started)
+            q = np.asarray(vector, dtype=np.float32)
+            shortlist = k * self.RESCORE_FACTOR
+            if simsimd is not None and candidates.size > shortlist:
+                vectors = self._vectors_i8[:n] if candidates.size == n else self._vectors_i8[candidates]
+                approx = np.asarray(simsimd.cdist(quantize_int8(q)[None], vectors, metric="dot")).ravel()
+                candidates, _ = self._top(approx, candidates, shortlist)
+                scores = self._exact_scores(candidates, q)
+            else:
+                scores = self._exact_scores(slice(0, n) if candidates.size == n else candidates, q)
+            rows, top = self._top(scores, candidates, k)
+            # Same scale as ES cosine similarity scores
+            return self._hits(rows, (1.0 + top) / 2.0, started)
+
+    def _exact_scores(self, rows, q: np.ndarray) -> np.ndarray:
+        if self._vectors.dtype == np.float32:
+            return self._vectors[rows] @ q
+        rows = np.arange(len(self.ids))[rows]
+        scores = np.empty(rows.size, dtype=np.float32)
+        for start in range(0, rows.size, self.SCAN_CHUNK):
+            part = rows[start:start + self.SCAN_CHUNK]
+            scores[start:start + part.size] = self._vectors[part].astype(np.float32) @ q
+        return scores
+
+    def _posting_arrays(self, tok: str) -> Tuple[np.ndarray, np.ndarray]:
+        arrays = self._postings_arrays.get(tok)
+        if arrays is None:
+            posting = self._postings.get(tok, {})
+            arrays = (np.fromiter(posting.keys(), dtype=np.int64, count=len(posting)),
+                      np.fromiter(posting.values(), dtype=np.float64, count=len(posting)))
+            self._postings_arrays[tok] = arrays
+        return arrays
+
+    def bm25(
+        self, query: str, k: int, clauses: Sequence[Dict[str, Any]] = (), ids: Sequence[str] = ()
+    ) -> Dict[str, Any]:
+        """BM25 over the text fields among docs passing ``clauses``; ``ids`` get a large boost, like the ES ids clause."""
+        started = time.perf_counter()
+        with self._lock:
+            n = len(self.ids)
+            if n == 0 or self._live == 0 or k <= 0:
+                return self._hits(np.empty(0, dtype=int), np.empty(0), started)
+            scores = np.zeros(n, dtype=np.float64)
+            avg_len = self._total_len / self._live or 1.0
+            for tok in set(tokenize(query)):
+                rows, tfs = self._posting_arrays(tok)
+                if rows.size == 0:
+                    continue
+                idf = math.log(1.0 + (self._live - rows.size + 0.5) / (rows.size + 0.5))
+                norm = self.K1 * (1.0 - self.B + self.B * self._doc_len[rows] / avg_len)
+                scores[rows] += idf * tfs * (self.K1 + 1.0) / (tfs + norm)
+            for doc_id in ids:
+                row = self._row_of.get(doc_id)
+                if row is not None:
+                    scores[row] += 10.0 * (1.0 + scores.max())
+            mask = self._filter_mask(clauses) & (scores > 0)
+            candidates = np.flatnonzero(mask)
+            rows, top = self._top(scores[candidates], candidates, k)
+            return self._hits(rows, top, started)
+
+    # -- persistence ------------------------------------------------------
+
+    def save(self, directory: str) -> str:
+        """Write a compacted snapshot under ``directory`` and point ``CURRENT`` at it atomically.
+
+        The snapshot ``CURRENT`` pointed at before is kept for processes still reading or
+        memory-mapping it; older ones are pruned under the directory's exclusive lock.
+        """
+        with self._lock:
+            live = np.flatnonzero(self._alive[:len(self.ids)])
+            name = f"snapshot-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{os.urandom(4).hex()}"
+            path = os.path.join(directory, name)
+            os.makedirs(path, exist_ok=True)
+            meta = {
+                "dims": self.dims,
+                "vector_dtype": self.vector_dtype,
+                "ids": [self.ids[r] for r in live],
+                "has_vector": self._has_vector[live].tolist(),
+            }
+            if self.dims is not None:
+                np.save(os.path.join(path, "vectors.npy"), self._vectors[live].astype(self.vector_dtype))
+            with open(os.path.join(path, "docs.jsonl"), "w", encoding="utf-8") as f:
+                for r in live:
+                    f.write(json.dumps(self.sources[r], default=str) + "\n")
+            with open(os.path.join(path, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            pointer = os.path.join(directory, "CURRENT")
+            with _snapshot_lock(directory, exclusive=True):
+                previous = _read_pointer(pointer)
+                with open(pointer + ".tmp", "w") as f:
+                    f.write(name)
+                os.replace(pointer + ".tmp", pointer)
+                for old in os.listdir(directory):
+                    if old.startswith("snapshot-") and old not in (name, previous):
+                        shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+            self.snapshot = name
+            self.mutations = 0
+        return path
+
+    def load(self, directory: str) -> bool:
+        """Replace the contents with the snapshot ``CURRENT`` points at; False when there is none."""
+        # Shared lock: a concurrent save cannot prune the snapshot between reading CURRENT and opening it
+        with _snapshot_lock(directory, exclusive=False):
+            name = _read_pointer(os.path.join(directory, "CURRENT"))
+            if name is None:
+                return False
+            path = os.path.join(directory, name)
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+            with open(os.path.join(path, "docs.jsonl"), encoding="utf-8") as f:
+                sources = [json.loads(line) for line in f]
+            vectors = None
+            if meta["dims"] is not None:
+                vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        with self._lock:
+            self.dims = meta["dims"]
+            self._reset()
+            self.upsert((doc_id, src) for doc_id, src in zip(meta["ids"], sources))
+            if vectors is not None:
+                n = len(self.ids)
+                has_vector = np.asarray(meta["has_vector"], dtype=bool)
+                # Searched straight from the page cache; only the int8 copy is held in memory
+                self._vectors = vectors
+                self._vectors_i8 = np.empty(vectors.shape, dtype=np.int8)
+                for start in range(0, vectors.shape[0], self.SCAN_CHUNK):
+                    self._vectors_i8[start:start + self.SCAN_CHUNK] = quantize_int8(vectors[start:start + self.SCAN_CHUNK])
+                self._has_vector[:n] = has_vector
+            self.snapshot = name
+            self.mutations = 0
+        return True
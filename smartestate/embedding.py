@@ -1,27 +1,374 @@
-from typing import Iterable, List, Optional
+import asyncio
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .config import get_settings
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.split())
+
+
+class QueryEmbeddingCache:
+    """Bounded in-memory LRU of query vectors keyed on (model, normalized text), with a TTL."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0):
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl > 0 and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, key: Tuple[str, str], vector: List[float]) -> None:
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), list(vector))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+            }
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-text encodes into one batched ``encode_array`` call.
+
+    A worker thread takes the first waiting request and, when more are already queued
+    behind it, keeps collecting for up to ``max_wait_ms`` or ``max_batch_size`` texts; a
+    lone request is encoded at once. The unique texts are encoded once and every caller's
+    future resolved. ``submit`` blocks; ``asubmit`` awaits.
+    """
+
+    def __init__(self, embedder: "Embeddings", max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.embedder = embedder
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.batches = 0
+        self.requests = 0
+        self.largest_batch = 0
+        self._queue: "queue.Queue[Optional[Tuple[str, Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def _future(self, text: str) -> Future:
+        fut: Future = Future()
+        self._ensure_worker()
+        self._queue.put((text, fut))
+        return fut
+
+    def submit(self, text: str, timeout: Optional[float] = None) -> Optional[List[float]]:
+        return self._future(text).result(timeout=timeout)
+
+    async def asubmit(self, text: str) -> Optional[List[float]]:
+        return await asyncio.wrap_future(self._future(text))
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            stop = False
+            # Waiting only pays off under concurrent load, which shows as requests queued behind this one
+            deadline = time.monotonic() + (0.0 if self._queue.empty() else self.max_wait)
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._encode(batch)
+            if stop:
+                return
+
+    def _encode(self, batch: List[Tuple[str, Future]]) -> None:
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = self.embedder.encode_array(texts)
+        except Exception as e:
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+        by_text = dict(zip(texts, vectors.tolist())) if vectors is not None else {}
+        with self._lock:
+            self.batches += 1
+            self.requests += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+        for text, fut in batch:
+            fut.set_result(by_text.get(text))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else None,
+                "largest_batch": self.largest_batch,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join(timeout=5)
 
 
 class Embeddings:
-    def __init__(self, model_name: str):
+    """Lazily loaded SentenceTransformer wrapper.
+
+    Loading is guarded by a lock so concurrent callers share one model; load time and
+    encode latency are tracked for `stats()`. A failed load is retried once
+    ``load_retry_seconds`` have passed, and its error is reported in `stats()`.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        batch_size: int = 32,
+        num_threads: Optional[int] = None,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+        load_retry_seconds: float = 30.0,
+    ):
         self.model_name = model_name
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.query_cache = query_cache
+        self.batcher: Optional[EmbeddingBatcher] = None
         self._model = None
+        self._load_attempted = False
+        self._load_failed_at: Optional[float] = None
+        self.load_retry_seconds = load_retry_seconds
+        self.load_error: Optional[str] = None
+        self._load_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+        self.encode_calls = 0
+        self.encoded_texts = 0
+        self.encode_seconds = 0.0
+        self.last_encode_seconds: Optional[float] = None
+
+    backend = "torch"
 
     def _lazy_load(self):
-        if self._model is not None:
+        if self._load_attempted:
             return
+        with self._load_lock:
+            if self._load_attempted:
+                return
+            # The embedder is shared process-wide, so one failed load must not pin it to lexical-only search
+            failed_at = self._load_failed_at
+            if failed_at is not None and time.monotonic() - failed_at < self.load_retry_seconds:
+                return
+            started = time.perf_counter()
+            self._load()
+            self.load_seconds = time.perf_counter() - started
+            if self._model is None:
+                self._load_failed_at = time.monotonic()
+                return
+            self.load_error = None
+            self._load_failed_at = None
+            self._load_attempted = True
+
+    def _load(self) -> None:
         try:
             from sentence_transformers import SentenceTransformer
+            if self.num_threads:
+                import torch
+                torch.set_num_threads(self.num_threads)
             self._model = SentenceTransformer(self.model_name)
-        except Exception:
+        except Exception as e:
             self._model = None
+            self.load_error = f"{type(e).__name__}: {e}"
 
-    def embed(self, texts: Iterable[str]) -> Optional[List[List[float]]]:
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        return self._model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def dimension(self) -> Optional[int]:
+        """Output vector size, or None when no model can be loaded."""
+        vectors = self.encode_array(["dimension probe"])
+        return int(vectors.shape[1]) if vectors is not None else None
+
+    @property
+    def identity(self) -> str:
+        """Model name plus backend; vectors from different backends are cached separately."""
+        return self.model_name if self.backend == "torch" else f"{self.model_name}#{self.backend}"
+
+    def warm_up(self) -> bool:
+        """Load the model and run one encode so the first request doesn't pay for it."""
+        return self.embed(["warm up"]) is not None
+
+    def encode_array(self, texts: Iterable[str], batch_size: Optional[int] = None) -> Optional[np.ndarray]:
+        """Encode into a float32 ``(n, dims)`` array; None when there is nothing to encode or no model."""
         self._lazy_load()
         texts = [t for t in texts if t is not None]
         if not texts:
             return None
         if self._model is None:
             return None
-        vectors = self._model.encode(texts, normalize_embeddings=True)
-        return [v.tolist() for v in vectors]
+        started = time.perf_counter()
+        vectors = self._encode(texts, batch_size or self.batch_size)
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self.encode_calls += 1
+            self.encoded_texts += len(texts)
+            self.encode_seconds += elapsed
+            self.last_encode_seconds = elapsed
+        return np.asarray(vectors, dtype=np.float32)
+
+    def embed(self, texts: Iterable[str], batch_size: Optional[int] = None) -> Optional[List[List[float]]]:
+        vectors = self.encode_array(texts, batch_size=batch_size)
+        if vectors is None:
+            return None
+        return vectors.tolist()
+
+    def _encode_query(self, text: str) -> Optional[List[float]]:
+        if self.batcher is not None:
+            return self.batcher.submit(text)
+        return (self.embed([text]) or [None])[0]
+
+    def embed_query(self, text: str) -> Optional[List[float]]:
+        """Embed a single search/memory query, served from the query cache when possible."""
+        if text is None:
+            return None
+        if self.query_cache is None:
+            return self._encode_query(text)
+        key = (self.identity, normalize_query(text))
+        vector = self.query_cache.get(key)
+        if vector is not None:
+            return vector
+        vector = self._encode_query(key[1] or text)
+        if vector is not None:
+            self.query_cache.put(key, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Embed several queries in order; the ones not in the query cache share one encode call."""
+        keys = [(self.identity, normalize_query(t)) for t in texts]
+        out: List[Optional[List[float]]] = [
+            self.query_cache.get(key) if self.query_cache is not None else None for key in keys
+        ]
+        missing = list(dict.fromkeys(key[1] or text for key, text, vec in zip(keys, texts, out) if vec is None))
+        if missing:
+            vectors = self.encode_array(missing)
+            by_text = dict(zip(missing, vectors.tolist())) if vectors is not None else {}
+            for i, (key, text) in enumerate(zip(keys, texts)):
+                if out[i] is None:
+                    out[i] = by_text.get(key[1] or text)
+                    if out[i] is not None and self.query_cache is not None:
+                        self.query_cache.put(key, out[i])
+        return out
+
+    async def aembed_query(self, text: str) -> Optional[List[float]]:
+        """Async ``embed_query`` for event-loop callers; encoding never blocks the loop."""
+        if text is None:
+            return None
+        key = (self.identity, normalize_query(text))
+        if self.query_cache is not None:
+            vector = self.query_cache.get(key)
+            if vector is not None:
+                return vector
+        if self.batcher is not None:
+            vector = await self.batcher.asubmit(key[1] or text)
+        else:
+            vector = await asyncio.get_running_loop().run_in_executor(None, lambda: (self.embed([text]) or [None])[0])
+        if vector is not None and self.query_cache is not None:
+            self.query_cache.put(key, vector)
+        return vector
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            calls = self.encode_calls
+            return {
+                "model": self.model_name,
+                "backend": self.backend,
+                "loaded": self.loaded,
+                "load_seconds": self.load_seconds,
+                "load_error": self.load_error,
+                "encode_calls": calls,
+                "encoded_texts": self.encoded_texts,
+                "encode_seconds_total": round(self.encode_seconds, 6),
+                "encode_ms_avg": round(self.encode_seconds / calls * 1000, 3) if calls else None,
+                "encode_ms_last": round(self.last_encode_seconds * 1000, 3) if self.last_encode_seconds is not None else None,
+                "query_cache": self.query_cache.stats() if self.query_cache is not None else None,
+                "batcher": self.batcher.stats() if self.batcher is not None else None,
+            }
+
+
+_embedder: Optional[Embeddings] = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder() -> Embeddings:
+    """Process-wide embedding model shared by search, memory and the graph nodes."""
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            settings = get_settings()
+            cls = Embeddings
+            if settings.embedding_backend == "onnx":
+                from .embedding_onnx import OnnxEmbeddings
 
+                cls = OnnxEmbeddings
+            _embedder = cls(
+                settings.embedding_model,
+                batch_size=settings.embedding_batch_size,
+                num_threads=settings.embedding_num_threads,
+                query_cache=QueryEmbeddingCache(
+                    settings.query_embedding_cache_size, settings.query_embedding_cache_ttl
+                ),
+                load_retry_seconds=settings.embedding_load_retry_seconds,
+            )
+            if settings.embedding_batch_max_wait_ms > 0:
+                _embedder.batcher = EmbeddingBatcher(
+                    _embedder, settings.embedding_batch_max_size, settings.embedding_batch_max_wait_ms
+                )
+        return _embedder
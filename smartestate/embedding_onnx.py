@@ -0,0 +1,209 @@
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .config import get_settings
+from .embedding import Embeddings
+
+# Listing-style sentences used to compare backends; pairs of near-duplicates and unrelated texts
+PARITY_SAMPLE = [
+    "2BHK apartment in Hyderabad under 70 lakhs",
+    "Two bedroom flat near Gachibowli with covered parking",
+    "Independent villa with garden and swimming pool in Whitefield, Bangalore",
+    "3 BHK gated community apartment close to metro station",
+    "Fire safety certificate and structural inspection report available",
+    "Compliance certificate pending for the commercial office space",
+    "Studio apartment for rent, fully furnished, pet friendly",
+    "Plot for sale in Pune, clear title, corner property",
+    "Penthouse with terrace and city views in Mumbai",
+    "Affordable 1BHK for first time buyers near IT park",
+    "PROP-000123",
+    "Floor plan: living room 18x12, kitchen 10x8, two bathrooms",
+]
+
+
+def onnx_model_dir(model_name: str, base_dir: Optional[str] = None) -> str:
+    settings = get_settings()
+    base_dir = base_dir or settings.embedding_onnx_dir or os.path.join(settings.cache_dir, "onnx")
+    return os.path.join(base_dir, re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name))
+
+
+def check_parity(
+    reference: Embeddings, candidate: Embeddings, texts: Sequence[str] = PARITY_SAMPLE, tolerance: Optional[float] = None
+) -> Dict[str, Any]:
+    """Compare two backends on ``texts``: per-text cosine and the drift of the pairwise score matrix."""
+    tolerance = get_settings().embedding_parity_tolerance if tolerance is None else tolerance
+    a = reference.encode_array(list(texts))
+    b = candidate.encode_array(list(texts))
+    if a is None or b is None:
+        raise RuntimeError("Both backends must produce embeddings for the parity check")
+    max_diff = float(np.abs(a @ a.T - b @ b.T).max())
+    return {
+        "texts": len(texts),
+        "min_self_cosine": round(float((a * b).sum(axis=1).min()), 6),
+        "max_score_diff": round(max_diff, 6),
+        "tolerance": tolerance,
+        "ok": max_diff <= tolerance,
+    }
+
+
+def export_quantized_model(model_name: str, out_dir: str, tolerance: Optional[float] = None) -> Dict[str, Any]:
+    """Export ``model_name``'s transformer to ONNX, quantize weights to int8 and record parity.
+
+    Pooling mode and max sequence length come from the SentenceTransformer config, so the
+    ONNX backend reproduces the same sentence vectors. Writes ``model.int8.onnx``,
+    the tokenizer, ``pipeline.json`` and ``parity.json`` into ``out_dir``.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(out_dir, exist_ok=True)
+    reference_model = SentenceTransformer(model_name, device="cpu")
+    transformer = reference_model[0]
+    pooling = next((m for m in reference_model if hasattr(m, "get_pooling_mode_str")), None)
+    pipeline = {
+        "model_name": model_name,
+        "max_seq_length": int(reference_model.max_seq_length or 512),
+        "pooling": pooling.get_pooling_mode_str() if pooling is not None else "mean",
+    }
+    if pipeline["pooling"] not in ("mean", "cls"):
+        raise ValueError(f"Unsupported pooling mode for ONNX export: {pipeline['pooling']}")
+
+    tokenizer = reference_model.tokenizer
+    sample = tokenizer(["warm up export"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class _Encoder(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            _Encoder(transformer.auto_model.eval()),
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=axes,
+            opset_version=17,
+            dynamo=False,
+        )
+    quantize_dynamic(fp32_path, os.path.join(out_dir, "model.int8.onnx"), weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    tokenizer.save_pretrained(out_dir)
+    with open(os.path.join(out_dir, "pipeline.json"), "w") as f:
+        json.dump(pipeline, f)
+
+    reference = Embeddings(model_name)
+    reference._model = reference_model
+    reference._load_attempted = True
+    candidate = OnnxEmbeddings(model_name, onnx_dir=out_dir)
+    candidate._load_session()
+    candidate._load_attempted = True
+    parity = check_parity(reference, candidate, tolerance=tolerance)
+    with open(os.path.join(out_dir, "parity.json"), "w") as f:
+        json.dump(parity, f)
+    return parity
+
+
+class OnnxEmbeddings(Embeddings):
+    """Embeddings served by onnxruntime from an int8-quantized export of the same model.
+
+    The export happens once per model (see ``export_quantized_model``) and is only used
+    if its parity check passed; otherwise, or when onnxruntime is not installed, this
+    falls back to the SentenceTransformer backend and reports ``fallback_reason``.
+    """
+
+    backend = "onnx-int8"
+
+    def __init__(self, model_name: str, onnx_dir: Optional[str] = None, **kwargs):
+        super().__init__(model_name, **kwargs)
+        self.onnx_dir = onnx_dir or onnx_model_dir(model_name)
+        self.fallback_reason: Optional[str] = None
+        self._tokenizer = None
+        self._pipeline: Dict[str, Any] = {}
+        self._input_names: List[str] = []
+
+    @property
+    def identity(self) -> str:
+        # Resolve a possible fallback before vectors get cached under this name
+        self._lazy_load()
+        return super().identity
+
+    def _load(self) -> None:
+        # A retried load starts from the ONNX path again, not from the last attempt's fallback
+        self.backend = type(self).backend
+        self.fallback_reason = None
+        try:
+            parity_path = os.path.join(self.onnx_dir, "parity.json")
+            if os.path.exists(parity_path):
+                with open(parity_path) as f:
+                    parity = json.load(f)
+            else:
+                parity = export_quantized_model(self.model_name, self.onnx_dir)
+            # Re-judge against the current tolerance so tightening it takes effect without a re-export
+            if parity.get("max_score_diff", float("inf")) > get_settings().embedding_parity_tolerance:
+                raise RuntimeError(f"ONNX parity check failed: {parity}")
+            self._load_session()
+        except Exception as e:
+            self.fallback_reason = str(e)
+            self.backend = "torch"
+            self._model = None
+            super()._load()
+
+    def _load_session(self) -> None:
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(self.onnx_dir, "pipeline.json")) as f:
+            self._pipeline = json.load(f)
+        options = ort.SessionOptions()
+        if self.num_threads:
+            options.intra_op_num_threads = self.num_threads
+        self._model = ort.InferenceSession(
+            os.path.join(self.onnx_dir, "model.int8.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = [i.name for i in self._model.get_inputs()]
+        self._tokenizer = AutoTokenizer.from_pretrained(self.onnx_dir)
+
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        if self.backend == "torch":
+            return super()._encode(texts, batch_size)
+        # Batch similar lengths together to keep padding small, as SentenceTransformer.encode does
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        out = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            enc = self._tokenizer(
+                [texts[i] for i in idx],
+                padding=True,
+                truncation=True,
+                max_length=self._pipeline["max_seq_length"],
+                return_tensors="np",
+            )
+            feed = {name: enc[name].astype(np.int64) for name in self._input_names}
+            hidden = self._model.run(None, feed)[0]
+            if self._pipeline["pooling"] == "cls":
+                pooled = hidden[:, 0]
+            else:
+                mask = enc["attention_mask"][..., None].astype(hidden.dtype)
+                pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if out.shape[1] == 0:
+                out = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+            out[idx] = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        st = super().stats()
+        st["fallback_reason"] = self.fallback_reason
+        return st
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .config import get_settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """Append-only float16 vector file plus a SQLite offset index, one directory per model.
+
+    Vectors are read back through a read-only ``np.memmap``, so lookups over a large
+    corpus do not materialize Python lists. Appends take an exclusive file lock, which
+    keeps the API process and CLI ingests from interleaving rows.
+    """
+
+    DTYPE = np.float16
+
+    def __init__(self, directory: str, model_name: str):
+        self.model_name = model_name
+        self.directory = os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name))
+        os.makedirs(self.directory, exist_ok=True)
+        self.vectors_path = os.path.join(self.directory, "vectors.f16")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._mmap: Optional[np.memmap] = None
+        self._conn = sqlite3.connect(
+            os.path.join(self.directory, "index.sqlite"), timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS offsets (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+
+    @property
+    def dims(self) -> Optional[int]:
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'dims'").fetchone()
+        return int(row[0]) if row else None
+
+    def __len__(self) -> int:
+        return int(self._conn.execute("SELECT COUNT(*) FROM offsets").fetchone()[0])
+
+    def _vectors(self, min_rows: int) -> np.memmap:
+        """Memory-map the vector file, remapping when another writer has grown it."""
+        if self._mmap is None or self._mmap.shape[0] < min_rows:
+            dims = self.dims
+            rows = os.path.getsize(self.vectors_path) // (dims * np.dtype(self.DTYPE).itemsize)
+            self._mmap = np.memmap(self.vectors_path, dtype=self.DTYPE, mode="r", shape=(rows, dims))
+        return self._mmap
+
+    def _rows_for(self, keys: List[str]) -> Dict[str, int]:
+        rows: Dict[str, int] = {}
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            marks = ",".join("?" * len(part))
+            for key, row in self._conn.execute(f"SELECT key, row FROM offsets WHERE key IN ({marks})", part):
+                rows[key] = row
+        return rows
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Return float16 row views for the stored keys; missing keys are simply absent."""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        with self._lock:
+            rows = self._rows_for(keys)
+            self.hits += len(rows)
+            self.misses += len(keys) - len(rows)
+            if not rows:
+                return {}
+            vectors = self._vectors(max(rows.values()) + 1)
+        return {key: vectors[row] for key, row in rows.items()}
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        if not items:
+            return
+        keys = list(items)
+        matrix = np.asarray([items[k] for k in keys], dtype=self.DTYPE)
+        with self._lock, open(self.vectors_path, "ab") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                dims = self.dims
+                if dims is None:
+                    self._conn.execute("INSERT INTO meta (name, value) VALUES ('dims', ?)", (str(matrix.shape[1]),))
+                elif dims != matrix.shape[1]:
+                    raise ValueError(f"Embedding store for {self.model_name} holds {dims}-d vectors, got {matrix.shape[1]}")
+                known = self._rows_for(keys)
+                fresh = [i for i, k in enumerate(keys) if k not in known]
+                if not fresh:
+                    return
+                row_bytes = matrix.shape[1] * matrix.itemsize
+                f.seek(0, os.SEEK_END)
+                first_row, torn = divmod(f.tell(), row_bytes)
+                if torn:
+                    # Drop a partial row left by an interrupted writer
+                    f.truncate(first_row * row_bytes)
+                f.write(matrix[fresh].tobytes())
+                f.flush()
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO offsets (key, row) VALUES (?, ?)",
+                    [(keys[i], first_row + n) for n, i in enumerate(fresh)],
+                )
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+    def close(self) -> None:
+        with self._lock:
+            self._mmap = None
+            self._conn.close()
+
+
+_stores: Dict[str, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_embedding_store(model_name: Optional[str] = None) -> Optional[EmbeddingStore]:
+    """Process-wide embedding store for a model, or None when disabled via EMBEDDING_STORE_ENABLED."""
+    settings = get_settings()
+    if not settings.embedding_store_enabled:
+        return None
+    model_name = model_name or settings.embedding_model
+    with _stores_lock:
+        store = _stores.get(model_name)
+        if store is None:
+            store = EmbeddingStore(os.path.join(settings.cache_dir, "embeddings"), model_name)
+            _stores[model_name] = store
+        return store
+
+
+def lookup_or_embed(texts: List[str], embedder, store: Optional[EmbeddingStore], batch_size: int) -> List[Optional[np.ndarray]]:
+    """Vectors for ``texts`` in order: stored ones from the memmap, the rest encoded in one call and saved."""
+    keys = [text_key(t) for t in texts]
+    found = store.get_many(keys) if store is not None else {}
+    missing = [i for i, k in enumerate(keys) if k not in found]
+    out: List[Optional[np.ndarray]] = [found.get(k) for k in keys]
+    if missing:
+        vectors = embedder.encode_array([texts[i] for i in missing], batch_size=batch_size)
+        if vectors is not None:
+            for i, vec in zip(missing, vectors):
+                out[i] = vec
+            if store is not None:
+                store.put_many({keys[i]: vec for i, vec in zip(missing, vectors)})
+    return out
@@ -1,22 +1,117 @@
-from typing import Optional
+import os
+import threading
+from typing import Any, Dict, List, Optional
 
 from elasticsearch import Elasticsearch
 
 from .config import get_settings
 
 
+def _client_options() -> Dict[str, Any]:
+    settings = get_settings()
+    return {
+        "connections_per_node": settings.es_connections_per_node,
+        "request_timeout": settings.es_request_timeout,
+        "max_retries": settings.es_max_retries,
+        "retry_on_timeout": settings.es_retry_on_timeout,
+    }
+
+
+_es: Optional[Elasticsearch] = None
+_es_pid: Optional[int] = None
+_async_es = None
+_es_lock = threading.Lock()
+
+
 def get_es() -> Elasticsearch:
+    """Process-wide client; its connection pool is shared by all threads (ES_* pool/timeout/retry settings)."""
+    global _es, _es_pid
+    if _es is not None and _es_pid == os.getpid():
+        return _es
+    with _es_lock:
+        # A client inherited through fork would share sockets with the parent, so build a fresh one
+        if _es is None or _es_pid != os.getpid():
+            _es = Elasticsearch(get_settings().elasticsearch_url, **_client_options())
+            _es_pid = os.getpid()
+        return _es
+
+
+def get_async_es():
+    """Process-wide ``AsyncElasticsearch`` for event-loop callers (needs aiohttp); bound to the API's loop."""
+    global _async_es
+    with _es_lock:
+        if _async_es is None:
+            from elasticsearch import AsyncElasticsearch
+
+            _async_es = AsyncElasticsearch(get_settings().elasticsearch_url, **_client_options())
+        return _async_es
+
+
+def close_es() -> None:
+    global _es, _es_pid
+    with _es_lock:
+        client, _es, _es_pid = _es, None, None
+    if client is not None:
+        client.close()
+
+
+async def aclose_es() -> None:
+    global _async_es
+    with _es_lock:
+        client, _async_es = _async_es, None
+    if client is not None:
+        await client.close()
+
+
+# Output sizes of common sentence-transformers models, so mappings don't require loading one
+_KNOWN_DIMS = {
+    "sentence-transformers/all-MiniLM-L6-v2": 384,
+    "sentence-transformers/all-MiniLM-L12-v2": 384,
+    "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2": 384,
+    "sentence-transformers/all-mpnet-base-v2": 768,
+    "sentence-transformers/multi-qa-mpnet-base-dot-v1": 768,
+    "BAAI/bge-small-en-v1.5": 384,
+    "BAAI/bge-base-en-v1.5": 768,
+}
+_DEFAULT_DIMS = 384
+
+
+def embedding_dims() -> int:
+    """Vector size for mappings: EMBEDDING_DIMS, else the known size of EMBEDDING_MODEL, else the loaded model's."""
     settings = get_settings()
-    return Elasticsearch(settings.elasticsearch_url)
+    if settings.embedding_dims:
+        return settings.embedding_dims
+    if settings.embedding_model in _KNOWN_DIMS:
+        return _KNOWN_DIMS[settings.embedding_model]
+    from .embedding import get_embedder
 
+    return get_embedder().dimension or _DEFAULT_DIMS
 
-def ensure_index(es: Optional[Elasticsearch] = None):
+
+def vector_mapping(dims: Optional[int] = None) -> Dict[str, Any]:
+    """dense_vector field built from the ES_VECTOR_* settings (HNSW graph parameters only apply to *hnsw types)."""
     settings = get_settings()
-    es = es or get_es()
-    index = settings.elasticsearch_index
-    if es.indices.exists(index=index):
-        return
-    mapping = {
+    index_options: Dict[str, Any] = {"type": settings.es_vector_index_type}
+    if settings.es_vector_index_type.endswith("hnsw"):
+        index_options["m"] = settings.es_hnsw_m
+        index_options["ef_construction"] = settings.es_hnsw_ef_construction
+    return {
+        "type": "dense_vector",
+        "dims": dims or embedding_dims(),
+        "index": True,
+        "similarity": "cosine",
+        "index_options": index_options,
+    }
+
+
+def knn_num_candidates(k: int, num_candidates: Optional[int] = None) -> int:
+    """Per-shard kNN candidates: explicit value or SEARCH_NUM_CANDIDATES, never below k nor above ES's 10000 cap."""
+    n = num_candidates or get_settings().search_num_candidates
+    return min(max(n, k), 10000)
+
+
+def property_index_body() -> Dict[str, Any]:
+    return {
         "settings": {
             "number_of_shards": 1,
             "number_of_replicas": 0
@@ -33,16 +128,72 @@ def ensure_index(es: Optional[Elasticsearch] = None):
                 "parsed_json": {"type": "object", "enabled": True},
                 "rooms_detail": {"type": "nested"},
                 "full_text": {"type": "text"},
-                "embedding": {
-                    "type": "dense_vector",
-                    "dims": 384,
-                    "index": True,
-                    "similarity": "cosine"
-                }
+                "city": {"type": "keyword"},
+                "has_certificates": {"type": "boolean"},
+                "cert_links": {"type": "keyword", "index": False},
+                "rooms": {"type": "integer"},
+                "halls": {"type": "integer"},
+                "kitchens": {"type": "integer"},
+                "bathrooms": {"type": "integer"},
+                "embedding": vector_mapping()
             }
         }
     }
-    es.indices.create(index=index, body=mapping)
+
+
+def ensure_index(es: Optional[Elasticsearch] = None):
+    """Create the listings index, or bring an existing one up to ``property_index_body``.
+
+    Fields the live mapping lacks are added in place (new fields are additive). A field
+    already mapped with another type, e.g. ``city`` dynamically mapped as text by writes
+    that predate it, cannot be changed in place and raises until ``scripts/reindex.py`` runs.
+    """
+    settings = get_settings()
+    es = es or get_es()
+    index = settings.elasticsearch_index
+    if not es.indices.exists(index=index):
+        es.indices.create(index=index, body=property_index_body())
+        return
+    wanted = property_index_body()["mappings"]["properties"]
+    live: Dict[str, Any] = {}
+    # Keyed by concrete index, also when ``index`` is an alias
+    for mapping in dict(es.indices.get_mapping(index=index)).values():
+        live.update(mapping.get("mappings", {}).get("properties", {}))
+    conflicts = sorted(
+        field
+        for field, spec in wanted.items()
+        if field in live and live[field].get("type", "object") != spec["type"]
+    )
+    if conflicts:
+        raise RuntimeError(
+            f"Index {index!r} maps {', '.join(conflicts)} with the wrong type; "
+            "filters on them will not match. Rebuild it with scripts/reindex.py"
+        )
+    missing = {field: spec for field, spec in wanted.items() if field not in live}
+    if missing:
+        es.indices.put_mapping(index=index, properties=missing)
+
+
+def swap_alias(es: Elasticsearch, alias: str, new_index: str, keep_old: bool = False) -> List[str]:
+    """Atomically point ``alias`` at ``new_index``; returns the indices it used to point at.
+
+    A concrete index that still carries the alias name (created before aliases were used)
+    is dropped in the same atomic request.
+    """
+    actions: List[Dict[str, Any]] = []
+    old: List[str] = []
+    if es.indices.exists_alias(name=alias):
+        old = list(dict(es.indices.get_alias(name=alias)).keys())
+        actions += [{"remove": {"index": idx, "alias": alias}} for idx in old if idx != new_index]
+    elif es.indices.exists(index=alias):
+        actions.append({"remove_index": {"index": alias}})
+    actions.append({"add": {"index": new_index, "alias": alias}})
+    es.indices.update_aliases(actions=actions)
+    old = [idx for idx in old if idx != new_index]
+    if not keep_old:
+        for idx in old:
+            es.indices.delete(index=idx, ignore_unavailable=True)
+    return old
 
 
 def ensure_memory_index(es: Optional[Elasticsearch] = None):
@@ -57,7 +208,7 @@ def ensure_memory_index(es: Optional[Elasticsearch] = None):
             "properties": {
                 "user_id": {"type": "keyword"},
                 "text": {"type": "text"},
-                "embedding": {"type": "dense_vector", "dims": 384, "index": True, "similarity": "cosine"},
+                "embedding": vector_mapping(),
                 "created_at": {"type": "date"}
             }
         }
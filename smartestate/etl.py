@@ -1,86 +1,67 @@
 import hashlib
+import json
 import os
-import tempfile
-from datetime import datetime, date
-from typing import Any, Dict, List, Optional, Tuple
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-import pandas as pd
-import requests
-from pypdf import PdfReader
-from sqlalchemy import select
+import numpy as np
+from elasticsearch import helpers
+from sqlalchemy import delete, func, null, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
+from .assets import get_asset_fetcher, is_url
+from .cache import DiskCache, bump_index_generation, file_sha256, floorplan_cache_key, get_certificate_cache, get_floorplan_cache
+from .certificates import CertificateExtractor
 from .config import get_settings
 from .db import session_scope, init_db
-from .embedding import Embeddings
-from .es_client import get_es, ensure_index
-from .floorplan import FloorplanParser
-from .models import Property
-
-
-def _stable_id(*parts: str) -> str:
-    base = "::".join([p or "" for p in parts])
-    return hashlib.sha1(base.encode("utf-8")).hexdigest()  # nosec B324
+from .embedding import Embeddings, get_embedder
+from .embedding_store import EmbeddingStore, get_embedding_store, lookup_or_embed
+from .es_client import get_es, ensure_index, property_index_body, swap_alias
+from .floorplan import FloorplanParser, FloorplanPool
+from .models import IngestCheckpoint, Property
+from .reader import count_rows, iter_records, normalize_city
+from .search_backends import get_search_backend
 
 
 def _ensure_local(path_or_url: str) -> Optional[str]:
     if not path_or_url:
         return None
-    if path_or_url.lower().startswith("http://") or path_or_url.lower().startswith("https://"):
-        try:
-            with requests.get(path_or_url, timeout=20) as r:
-                r.raise_for_status()
-                fd, tmp = tempfile.mkstemp(prefix="smartestate_")
-                with os.fdopen(fd, "wb") as f:
-                    f.write(r.content)
-                return tmp
-        except Exception:
-            return None
+    if is_url(path_or_url):
+        return get_asset_fetcher().fetch(path_or_url)
     if os.path.exists(path_or_url):
         return path_or_url
     return None
 
 
-def _read_pdfs_text(paths: List[str]) -> str:
-    texts: List[str] = []
-    for p in paths:
-        local = _ensure_local(p)
-        if not local or not os.path.exists(local):
-            continue
-        try:
-            reader = PdfReader(local)
-            for page in reader.pages:
-                t = page.extract_text() or ""
-                if t:
-                    texts.append(t)
-        except Exception:
-            continue
-    return "\n".join(texts)
-
+def _prefetch_assets(recs: List[Dict[str, Any]]) -> None:
+    """Download a window's remote images and certificates concurrently ahead of use."""
+    urls: List[str] = []
+    for rec in recs:
+        img = rec.get("floorplan_image")
+        if img and is_url(img):
+            urls.append(img)
+        urls.extend(c for c in rec.get("certs") or [] if is_url(c))
+    if urls:
+        get_asset_fetcher().fetch_many(urls)
 
-def _parse_cert_links(raw: Any) -> List[str]:
-    if raw is None:
-        return []
-    if isinstance(raw, list):
-        return [str(x).strip() for x in raw if str(x).strip()]
-    if isinstance(raw, str):
-        if raw.lower() == "nan" or not raw.strip():
-            return []
-        # support pipe or comma separated filenames/links
-        sep = "|" if "|" in raw else ","
-        parts = [x.strip() for x in raw.split(sep)]
-        return [p for p in parts if p]
-    return []
 
-
-def _to_date(val: Any) -> Optional[date]:
-    try:
-        if pd.isna(val):
-            return None
-        if isinstance(val, datetime):
-            return val.date()
-        return pd.to_datetime(val).date()
-    except Exception:
-        return None
+def _certificate_texts(recs: List[Dict[str, Any]], extractor: CertificateExtractor) -> List[str]:
+    """Extract certificate text for a window of rows with one extractor call; one string per row."""
+    per_row: List[List[str]] = []
+    local_of: Dict[str, Optional[str]] = {}
+    for rec in recs:
+        pdfs = [c for c in _resolve_certificate_paths(rec["certs"]) if c.lower().endswith(".pdf")]
+        for c in pdfs:
+            if c not in local_of:
+                local_of[c] = _ensure_local(c)
+        per_row.append(pdfs)
+    texts = extractor.extract_many([p for p in local_of.values() if p])
+    out: List[str] = []
+    for pdfs in per_row:
+        parts = [texts.get(local_of[c] or "") for c in pdfs]
+        out.append("\n".join(t for t in parts if t))
+    return out
 
 
 def _resolve_image_path(image_name_or_path: Optional[str]) -> Optional[str]:
@@ -111,130 +92,597 @@ def _resolve_certificate_paths(names_or_links: List[str]) -> List[str]:
     return out
 
 
-def ingest_excel(file_path: str) -> Dict[str, Any]:
+# Version of the document _build_doc produces. It is part of every row fingerprint, so bumping it
+# when documents gain or change fields makes the next incremental ingest re-index unchanged rows.
+# 2: flat filter fields (city, has_certificates, room counts)
+_DOC_SCHEMA_VERSION = 2
+
+
+def _row_fingerprint(rec: Dict[str, Any]) -> Tuple[str, bool]:
+    """Hash of the normalized row, image/certificate contents and doc schema; returns ``(fingerprint, has_image)``."""
+    local_img = _resolve_image_path(rec["floorplan_image"])
+    image_hash = file_sha256(local_img) if local_img and os.path.exists(local_img) else None
+    cert_hashes: List[str] = []
+    for c in _resolve_certificate_paths(rec["certs"]):
+        local = _ensure_local(c) if c.lower().endswith(".pdf") else None
+        cert_hashes.append(file_sha256(local) if local and os.path.exists(local) else c)
+    payload = {k: v for k, v in rec.items() if k != "content_hash"}
+    payload["_image"] = image_hash
+    payload["_certs"] = cert_hashes
+    payload["_schema"] = _DOC_SCHEMA_VERSION
+    blob = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest(), image_hash is not None
+
+
+def _existing_fingerprints(external_ids: List[str]) -> Dict[str, Optional[str]]:
+    if not external_ids:
+        return {}
+    with session_scope() as session:
+        rows = session.execute(
+            select(Property.external_id, Property.content_hash).where(Property.external_id.in_(external_ids))
+        ).all()
+    return {ext_id: h for ext_id, h in rows}
+
+
+def _delete_missing(es, index: str, seen: set, chunk: int = 1000) -> int:
+    """Remove listings that are in Postgres/the search index but no longer present in the feed.
+
+    ``es`` is None when listings live in the embedded search backend.
+    """
+    with session_scope() as session:
+        stale = [ext_id for ext_id in session.execute(select(Property.external_id)).scalars() if ext_id not in seen]
+    for i in range(0, len(stale), chunk):
+        part = stale[i:i + chunk]
+        with session_scope() as session:
+            session.execute(delete(Property).where(Property.external_id.in_(part)))
+        if es is None:
+            get_search_backend().delete_documents(part)
+            continue
+        actions = [{"_op_type": "delete", "_index": index, "_id": ext_id} for ext_id in part]
+        try:
+            helpers.bulk(es, actions, stats_only=True, raise_on_error=False, raise_on_exception=False)
+        except Exception:
+            pass
+    return len(stale)
+
+
+def _load_checkpoint(fingerprint: str) -> int:
+    with session_scope() as session:
+        rec = session.execute(
+            select(IngestCheckpoint).where(IngestCheckpoint.file_fingerprint == fingerprint)
+        ).scalar_one_or_none()
+        return rec.rows_committed if rec else 0
+
+
+def _save_checkpoint(fingerprint: str, rows_committed: int) -> None:
+    with session_scope() as session:
+        stmt = pg_insert(IngestCheckpoint).values(file_fingerprint=fingerprint, rows_committed=rows_committed)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[IngestCheckpoint.file_fingerprint],
+            set_={"rows_committed": rows_committed, "updated_at": func.now()},
+        )
+        session.execute(stmt)
+
+
+def _clear_checkpoint(fingerprint: str) -> None:
+    with session_scope() as session:
+        session.execute(delete(IngestCheckpoint).where(IngestCheckpoint.file_fingerprint == fingerprint))
+
+
+def _parse_floorplans(
+    recs: List[Dict[str, Any]],
+    parser: FloorplanParser,
+    pool: Optional[FloorplanPool],
+    cache: Optional[DiskCache],
+    stats: Dict[str, int],
+) -> Dict[int, Dict[str, Any]]:
+    """Parse the floorplans of a window of rows, from the cache, inline or through the worker pool."""
+    images: List[Tuple[int, str]] = []
+    for i, rec in enumerate(recs):
+        local_img = _resolve_image_path(rec["floorplan_image"])
+        if local_img and os.path.exists(local_img):
+            images.append((i, local_img))
+
+    parsed: Dict[int, Dict[str, Any]] = {}
+    keys: Dict[int, str] = {}
+    if cache is not None:
+        identity = parser.cache_identity()
+        todo: List[Tuple[int, str]] = []
+        for i, local_img in images:
+            try:
+                keys[i] = floorplan_cache_key(local_img, identity)
+                hit = cache.get(keys[i])
+            except Exception:
+                hit = None
+            if hit is not None:
+                parsed[i] = hit
+                stats["parse_cache_hits"] += 1
+            else:
+                todo.append((i, local_img))
+                stats["parse_cache_misses"] += 1
+        images = todo
+
+    def _store(i: int, result: Dict[str, Any]):
+        parsed[i] = result
+        if cache is not None and i in keys:
+            try:
+                cache.put(keys[i], result)
+            except Exception:
+                pass
+
+    if pool is not None:
+        for i, result, _err in pool.parse_many(images):
+            if result is not None:
+                _store(i, result)
+        return parsed
+    for i, local_img in images:
+        try:
+            _store(i, parser.parse(local_img))
+        except Exception:
+            continue
+    return parsed
+
+
+def _prepare_item(rec: Dict[str, Any], parsed_json: Optional[Dict[str, Any]], cert_text: str) -> Dict[str, Any]:
+    """Attach certificate text and the parsed floorplan to a normalized row."""
+    certs = rec.pop("certs")
+    cert_paths = _resolve_certificate_paths(certs)
+
+    values = dict(rec)
+    values["cert_links"] = {"links": cert_paths} if certs else None
+    values["parsed_json"] = parsed_json
+
+    full_text_parts = [p for p in [rec["title"], rec["long_description"], cert_text] if p]
+    full_text = "\n\n".join(full_text_parts)
+    return {"values": values, "full_text": full_text, "doc": _build_doc(values, full_text, None)}
+
+
+def _embed_items(
+    items: List[Dict[str, Any]], embedder: Embeddings, batch_size: int, store: Optional[EmbeddingStore] = None
+) -> int:
+    """Attach vectors for the ``full_text`` of a window of items to their docs.
+
+    Texts already in the embedding store are read from it; the rest are encoded in one
+    call and saved. Returns how many vectors came from the store.
+    """
+    pending = [it for it in items if it.get("full_text")]
+    if not pending:
+        return 0
+    hits_before = store.hits if store is not None else 0
+    try:
+        vectors = lookup_or_embed([it["full_text"] for it in pending], embedder, store, batch_size)
+    except Exception:
+        return 0
+    for it, vec in zip(pending, vectors):
+        if vec is not None:
+            it["doc"]["embedding"] = vec.astype(np.float32).tolist()
+    return store.hits - hits_before if store is not None else 0
+
+
+_ROOM_COUNT_FIELDS = ("rooms", "halls", "kitchens", "bathrooms")
+
+
+def _build_doc(values: Dict[str, Any], full_text: str, embedding: Optional[List[float]]) -> Dict[str, Any]:
+    parsed_json = values.get("parsed_json")
+    tags = values.get("metadata_tags")
+    ldate = values.get("listing_date")
+    cert_links = values.get("cert_links") or {}
+    doc = {
+        "title": values.get("title"),
+        "long_description": values.get("long_description"),
+        "location": values.get("location"),
+        "price": values.get("price"),
+        "listing_date": ldate.isoformat() if ldate else None,
+        "seller_type": values.get("seller_type"),
+        "metadata_tags": (tags or {}).get("tags") if tags else None,
+        "parsed_json": parsed_json,
+        "rooms_detail": (parsed_json or {}).get("rooms_detail") if parsed_json else None,
+        "full_text": full_text or None,
+        # Flat filter fields for kNN pre-filtering
+        "city": normalize_city(values.get("location")),
+        "has_certificates": bool(cert_links.get("links")),
+        "cert_links": cert_links.get("links") or None,
+    }
+    for field in _ROOM_COUNT_FIELDS:
+        count = (parsed_json or {}).get(field)
+        doc[field] = int(count) if isinstance(count, (int, float)) else None
+    if embedding is not None:
+        doc["embedding"] = embedding
+    return doc
+
+
+def _write_rows(session, es, index: str, items: List[Dict[str, Any]], stats: Dict[str, int]) -> None:
+    """Row-at-a-time write path: ORM add/update plus one ``es.index`` per document."""
+    for item in items:
+        values = item["values"]
+        external_id = values["external_id"]
+        try:
+            existing = session.execute(select(Property).where(Property.external_id == external_id)).scalar_one_or_none()
+            if existing is None:
+                existing = Property(**values)
+                session.add(existing)
+            else:
+                for key, val in values.items():
+                    if key == "parsed_json":
+                        val = val or existing.parsed_json
+                    setattr(existing, key, val)
+            stats["ingested_rows"] += 1
+        except Exception:
+            stats["failed_rows"] += 1
+            continue
+        try:
+            if es is None:
+                get_search_backend().index_documents([(external_id, item["doc"])])
+            else:
+                es.index(index=index, id=external_id, document=item["doc"])
+            stats["indexed_docs"] += 1
+        except Exception:
+            # Forget the fingerprint so the next incremental run retries this row
+            existing.content_hash = None
+            stats["skipped_index"] += 1
+
+
+_JSON_COLUMNS = ("metadata_tags", "cert_links", "parsed_json")
+
+
+# Postgres (and psycopg) cap a single statement at 65535 bind parameters
+_MAX_BIND_PARAMS = 65535
+
+
+def _upsert_properties(session, rows: List[Dict[str, Any]]) -> None:
+    """``INSERT ... ON CONFLICT (external_id) DO UPDATE`` for a batch of rows.
+
+    A repeated external_id keeps its last row, since one statement cannot update a row twice,
+    and large batches are split so each statement stays under the bind parameter cap.
+    """
+    # SQL NULL rather than JSON 'null' so COALESCE keeps a previously parsed floorplan
+    rows = list({
+        r["external_id"]: {k: (null() if k in _JSON_COLUMNS and v is None else v) for k, v in r.items()}
+        for r in rows
+    }.values())
+    if not rows:
+        return
+    per_statement = max(1, _MAX_BIND_PARAMS // len(rows[0]))
+    for start in range(0, len(rows), per_statement):
+        stmt = pg_insert(Property).values(rows[start:start + per_statement])
+        excluded = stmt.excluded
+        update_cols = {k: getattr(excluded, k) for k in rows[0].keys() if k not in ("external_id", "parsed_json")}
+        update_cols["parsed_json"] = func.coalesce(excluded.parsed_json, Property.parsed_json)
+        update_cols["updated_at"] = func.now()
+        stmt = stmt.on_conflict_do_update(constraint="uq_properties_external_id", set_=update_cols)
+        session.execute(stmt)
+
+
+def _flush_batch(es, index: str, items: List[Dict[str, Any]], stats: Dict[str, int]) -> None:
+    """Bulk write path: one upsert + commit in Postgres, one ``_bulk`` request to Elasticsearch."""
+    if not items:
+        return
+    # Postgres refuses to update the same row twice in one statement; last occurrence wins
+    by_id: Dict[str, Dict[str, Any]] = {}
+    for item in items:
+        by_id[item["values"]["external_id"]] = item
+    unique = list(by_id.values())
+    duplicates = len(items) - len(unique)
+
+    written: List[Dict[str, Any]] = []
+    try:
+        with session_scope() as session:
+            _upsert_properties(session, [it["values"] for it in unique])
+        written = unique
+    except Exception:
+        # Isolate the offending rows so one bad record does not sink the batch
+        for item in unique:
+            try:
+                with session_scope() as session:
+                    _upsert_properties(session, [item["values"]])
+                written.append(item)
+            except Exception:
+                stats["failed_rows"] += 1
+    stats["ingested_rows"] += len(written) + (duplicates if written else 0)
+    if not written:
+        return
+
+    ok, failed_ids = _bulk_index(es, index, written)
+    stats["indexed_docs"] += ok
+    stats["skipped_index"] += len(failed_ids)
+    if failed_ids:
+        # Forget fingerprints of rows missing from the index so the next incremental run retries them
+        try:
+            with session_scope() as session:
+                session.execute(
+                    update(Property).where(Property.external_id.in_(failed_ids)).values(content_hash=None)
+                )
+        except Exception:
+            pass
+
+
+def _bulk_index(es, index: str, items: List[Dict[str, Any]]) -> Tuple[int, List[str]]:
+    """Index item docs through ``_bulk`` (or the embedded backend when ``es`` is None); returns ``(indexed, failed_ids)``."""
+    if es is None:
+        return get_search_backend().index_documents([(it["values"]["external_id"], it["doc"]) for it in items])
+    actions = [
+        {"_op_type": "index", "_index": index, "_id": it["values"]["external_id"], "_source": it["doc"]}
+        for it in items
+    ]
+    try:
+        ok, errors = helpers.bulk(es, actions, raise_on_error=False, raise_on_exception=False)
+        return ok, [next(iter(e.values())).get("_id") for e in errors]
+    except Exception:
+        return 0, [a["_id"] for a in actions]
+
+
+@contextmanager
+def _relaxed_refresh(es, index: str):
+    """Disable index refreshes for the duration of a bulk load, then restore and refresh once."""
+    if es is None:
+        yield
+        return
+    previous = None
+    relaxed = False
+    try:
+        current = es.indices.get_settings(index=index, name="index.refresh_interval")
+        for conf in dict(current).values():
+            previous = ((conf.get("settings") or {}).get("index") or {}).get("refresh_interval")
+            break
+        es.indices.put_settings(index=index, settings={"index": {"refresh_interval": "-1"}})
+        relaxed = True
+    except Exception:
+        relaxed = False
+    try:
+        yield
+    finally:
+        if relaxed:
+            try:
+                es.indices.put_settings(index=index, settings={"index": {"refresh_interval": previous}})
+                es.indices.refresh(index=index)
+            except Exception:
+                pass
+
+
+def _invalidate_search_cache(backend) -> None:
+    bump_index_generation()
+    try:
+        # Reaches API hosts that don't share CACHE_DIR (a reindex needs no marker: the alias moves)
+        backend.mark_changed()
+    except Exception:
+        pass
+
+
+def ingest_excel(
+    file_path: str,
+    bulk: Optional[bool] = None,
+    batch_size: Optional[int] = None,
+    embed_batch_size: Optional[int] = None,
+    parse_workers: Optional[int] = None,
+    parse_timeout: Optional[float] = None,
+    incremental: Optional[bool] = None,
+    delete_missing: bool = False,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    resume: Optional[bool] = None,
+) -> Dict[str, Any]:
     settings = get_settings()
+    bulk = settings.ingest_bulk if bulk is None else bulk
+    batch_size = max(1, batch_size or settings.ingest_batch_size)
+    embed_batch_size = max(1, embed_batch_size or settings.embedding_batch_size)
+    parse_workers = settings.floorplan_workers if parse_workers is None else parse_workers
+    parse_timeout = settings.floorplan_timeout if parse_timeout is None else parse_timeout
+    incremental = settings.ingest_incremental if incremental is None else incremental
+    resume = settings.ingest_resume if resume is None else resume
     init_db()
-    ensure_index()
-
-    df = pd.read_excel(file_path)
-    cols = {c.lower().strip(): c for c in df.columns}
-
-    # Map to dataset columns
-    col_title = cols.get("title")
-    col_desc = cols.get("long_description") or cols.get("description")
-    col_loc = cols.get("location") or cols.get("city")
-    col_price = cols.get("price")
-    col_date = cols.get("listing_date") or cols.get("date")
-    col_img = cols.get("floorplan_image") or cols.get("image") or cols.get("image_url") or cols.get("image_file")
-    col_certs = cols.get("cert_links") or cols.get("certificates") or cols.get("certifications")
-    col_seller_type = cols.get("seller_type")
-    col_seller_contact = cols.get("seller_contact")
-    col_tags = cols.get("metadata_tags")
-    col_ext_id = cols.get("id") or cols.get("external_id") or cols.get("property_id")
+    backend = get_search_backend()
+    # Listings go to Elasticsearch, or to the in-process index when SEARCH_BACKEND=embedded
+    es = get_es() if backend.name == "elasticsearch" else None
+    if es is not None:
+        ensure_index(es)
 
     parser = FloorplanParser()
-    embedder = Embeddings(settings.embedding_model)
-    es = get_es()
+    embedder = get_embedder()
+    embedding_store = get_embedding_store(embedder.identity)
+    index = settings.elasticsearch_index
 
-    successes, failures = 0, 0
-    indexed, skipped = 0, 0
+    stats = {
+        "ingested_rows": 0,
+        "failed_rows": 0,
+        "indexed_docs": 0,
+        "skipped_index": 0,
+        "parse_cache_hits": 0,
+        "parse_cache_misses": 0,
+        "unchanged_rows": 0,
+        "deleted_rows": 0,
+        "resumed_from_row": 0,
+        "embedding_store_hits": 0,
+    }
+    seen_ids: set = set()
+    rows_total = count_rows(file_path)
+    rows_processed = 0
+    # Checkpoints only make sense with per-batch commits
+    file_fingerprint = file_sha256(file_path) if bulk else None
+    if file_fingerprint and resume:
+        stats["resumed_from_row"] = _load_checkpoint(file_fingerprint)
+    parse_cache = get_floorplan_cache()
 
-    with session_scope() as session:
-        for _, row in df.iterrows():
-            try:
-                title = str(row[col_title]).strip() if col_title else None
-                desc = str(row[col_desc]).strip() if col_desc else None
-                loc = str(row[col_loc]).strip() if col_loc else None
-                price = float(row[col_price]) if col_price and not pd.isna(row[col_price]) else None
-                ldate = _to_date(row[col_date]) if col_date else None
-                img_val = str(row[col_img]).strip() if col_img else None
-                img = img_val
-                certs = _parse_cert_links(row[col_certs]) if col_certs else []
-                external_id = str(row[col_ext_id]).strip() if col_ext_id else _stable_id(title or "", loc or "", str(price or ""))
-                seller_type = str(row[col_seller_type]).strip() if col_seller_type else None
-                seller_contact = str(row[col_seller_contact]).strip() if col_seller_contact else None
-                tags_raw = str(row[col_tags]).strip() if col_tags else None
-                tags = None
-                if tags_raw and tags_raw.lower() != "nan":
-                    sep = "|" if "|" in tags_raw else ","
-                    tags = {"tags": [t.strip() for t in tags_raw.split(sep) if t.strip()]}
-
-                local_img = _resolve_image_path(img)
-                parsed_json = None
-                if local_img and os.path.exists(local_img):
-                    try:
-                        parsed_json = parser.parse(local_img)
-                    except Exception:
-                        parsed_json = None
-
-                cert_paths = _resolve_certificate_paths(certs)
-                cert_text = _read_pdfs_text([c for c in cert_paths if c.lower().endswith(".pdf")])
-
-                existing = session.execute(select(Property).where(Property.external_id == external_id)).scalar_one_or_none()
-                if existing is None:
-                    rec = Property(
-                        external_id=external_id,
-                        title=title,
-                        long_description=desc,
-                        location=loc,
-                        price=price,
-                        listing_date=ldate,
-                        floorplan_image=img,
-                        seller_type=seller_type,
-                        seller_contact=seller_contact,
-                        metadata_tags=tags,
-                        cert_links={"links": cert_paths} if certs else None,
-                        parsed_json=parsed_json,
-                    )
-                    session.add(rec)
-                else:
-                    existing.title = title
-                    existing.long_description = desc
-                    existing.location = loc
-                    existing.price = price
-                    existing.listing_date = ldate
-                    existing.floorplan_image = img
-                    existing.seller_type = seller_type
-                    existing.seller_contact = seller_contact
-                    existing.metadata_tags = tags
-                    existing.cert_links = {"links": cert_paths} if certs else None
-                    existing.parsed_json = parsed_json or existing.parsed_json
-                successes += 1
-
-                # Build ES doc
-                full_text_parts = [p for p in [title, desc, cert_text] if p]
-                full_text = "\n\n".join(full_text_parts)
-                embedding = None
-                if full_text:
-                    vecs = embedder.embed([full_text])
-                    embedding = vecs[0] if vecs else None
-                doc = {
-                    "title": title,
-                    "long_description": desc,
-                    "location": loc,
-                    "price": price,
-                    "listing_date": ldate.isoformat() if ldate else None,
-                    "seller_type": seller_type,
-                    "metadata_tags": (tags or {}).get("tags") if tags else None,
-                    "parsed_json": parsed_json,
-                    "rooms_detail": (parsed_json or {}).get("rooms_detail") if parsed_json else None,
-                    "full_text": full_text or None,
-                }
-                if embedding is not None:
-                    doc["embedding"] = embedding
-                try:
-                    es.index(index=settings.elasticsearch_index, id=external_id, document=doc)
-                    indexed += 1
-                except Exception:
-                    skipped += 1
+    pool = FloorplanPool(parse_workers, timeout=parse_timeout) if parse_workers > 1 else None
+    extractor = CertificateExtractor(
+        settings.cert_workers, settings.cert_max_pages, settings.cert_max_chars, get_certificate_cache()
+    )
 
+    def _prepare_window(normalized: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        seen_ids.update(rec["external_id"] for rec in normalized)
+        _prefetch_assets(normalized)
+        recs: List[Dict[str, Any]] = []
+        has_image: List[bool] = []
+        for rec in normalized:
+            try:
+                rec["content_hash"], img = _row_fingerprint(rec)
+                recs.append(rec)
+                has_image.append(img)
             except Exception:
-                failures += 1
-                continue
-
-    return {
-        "ingested_rows": successes,
-        "failed_rows": failures,
-        "indexed_docs": indexed,
-        "skipped_index": skipped,
+                stats["failed_rows"] += 1
+        if incremental:
+            known = _existing_fingerprints([r["external_id"] for r in recs])
+            keep = [i for i, r in enumerate(recs) if known.get(r["external_id"]) != r["content_hash"]]
+            stats["unchanged_rows"] += len(recs) - len(keep)
+            recs = [recs[i] for i in keep]
+            has_image = [has_image[i] for i in keep]
+        parsed = _parse_floorplans(recs, parser, pool, parse_cache, stats)
+        try:
+            cert_texts = _certificate_texts(recs, extractor)
+        except Exception:
+            cert_texts = [""] * len(recs)
+        items: List[Dict[str, Any]] = []
+        for i, rec in enumerate(recs):
+            if has_image[i] and i not in parsed:
+                # Parse failed; leave the row without a fingerprint so it is retried next time
+                rec["content_hash"] = None
+            try:
+                items.append(_prepare_item(rec, parsed.get(i), cert_texts[i]))
+            except Exception:
+                stats["failed_rows"] += 1
+        stats["embedding_store_hits"] += _embed_items(items, embedder, embed_batch_size, embedding_store)
+        return items
+
+    def _windows():
+        nonlocal rows_processed
+        skip = stats["resumed_from_row"]
+        for window in iter_records(file_path, batch_size):
+            if skip:
+                # Rows before the checkpoint were committed by an earlier run
+                done, window = window[:skip], window[skip:]
+                skip -= len(done)
+                seen_ids.update(rec["external_id"] for rec in done)
+                rows_processed += len(done)
+                if not window:
+                    continue
+            yield window
+            rows_processed += len(window)
+            if file_fingerprint:
+                _save_checkpoint(file_fingerprint, rows_processed)
+            _report()
+
+    def _report():
+        if progress is not None:
+            progress({**stats, "rows_processed": rows_processed, "rows_total": rows_total})
+
+    try:
+        if bulk:
+            with _relaxed_refresh(es, index):
+                for rows in _windows():
+                    _flush_batch(es, index, _prepare_window(rows), stats)
+        else:
+            with session_scope() as session:
+                for rows in _windows():
+                    _write_rows(session, es, index, _prepare_window(rows), stats)
+    except Exception:
+        # Part of the feed may already be searchable
+        _invalidate_search_cache(backend)
+        raise
+    finally:
+        if pool is not None:
+            pool.close()
+        extractor.close()
+    stats["cert_cache_hits"] = extractor.hits
+    stats["cert_cache_misses"] = extractor.misses
+    if file_fingerprint:
+        _clear_checkpoint(file_fingerprint)
+
+    # Reached only when the whole feed was read, so anything unseen really left the feed
+    if delete_missing:
+        stats["deleted_rows"] = _delete_missing(es, index, seen_ids)
+    backend.flush()
+    # Only once the new data is searchable, so cached results cannot outlive it
+    _invalidate_search_cache(backend)
+
+    return stats
+
+
+_PROPERTY_FIELDS = (
+    "external_id", "title", "long_description", "location", "price", "listing_date",
+    "floorplan_image", "seller_type", "seller_contact", "metadata_tags", "cert_links", "parsed_json",
+)
+
+
+def reindex_from_db(
+    batch_size: Optional[int] = None,
+    embed_batch_size: Optional[int] = None,
+    keep_old: bool = False,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """Build a fresh versioned index from the ``properties`` table and swap the search alias to it.
+
+    Floorplans are not re-parsed (``parsed_json`` is reused) and certificate text comes from the
+    extraction cache, so this is the way to apply mapping or embedding-model changes. With the
+    embedded backend the fresh index is built in memory and swapped in as a new snapshot.
+    """
+    settings = get_settings()
+    batch_size = max(1, batch_size or settings.ingest_batch_size)
+    embed_batch_size = max(1, embed_batch_size or settings.embedding_batch_size)
+    backend = get_search_backend()
+    es = get_es() if backend.name == "elasticsearch" else None
+    alias = settings.elasticsearch_index
+    new_index = f"{alias}_v{time.strftime('%Y%m%d%H%M%S')}"
+
+    if es is None:
+        target = backend.new_properties_index()
+    else:
+        body = property_index_body()
+        body["settings"] = {**body["settings"], "refresh_interval": "-1"}
+        es.indices.create(index=new_index, body=body)
+
+    embedder = get_embedder()
+    embedding_store = get_embedding_store(embedder.identity)
+    extractor = CertificateExtractor(
+        settings.cert_workers, settings.cert_max_pages, settings.cert_max_chars, get_certificate_cache()
+    )
+    stats = {
+        "index": new_index,
+        "indexed_docs": 0,
+        "skipped_index": 0,
+        "embedding_store_hits": 0,
+        "rows_processed": 0,
+        "rows_total": 0,
     }
+    try:
+        with session_scope() as session:
+            stats["rows_total"] = session.scalar(select(func.count()).select_from(Property)) or 0
+            # yield_per streams through a server-side cursor instead of loading the table
+            result = session.execute(select(Property).order_by(Property.id).execution_options(yield_per=batch_size))
+            for part in result.scalars().partitions(batch_size):
+                recs = []
+                for row in part:
+                    rec = {f: getattr(row, f) for f in _PROPERTY_FIELDS}
+                    rec["certs"] = (rec["cert_links"] or {}).get("links") or []
+                    recs.append(rec)
+                cert_texts = _certificate_texts(recs, extractor)
+                items = []
+                for rec, cert_text in zip(recs, cert_texts):
+                    rec.pop("certs")
+                    full_text = "\n\n".join(p for p in [rec["title"], rec["long_description"], cert_text] if p)
+                    items.append({"values": rec, "full_text": full_text, "doc": _build_doc(rec, full_text, None)})
+                stats["embedding_store_hits"] += _embed_items(items, embedder, embed_batch_size, embedding_store)
+                if es is None:
+                    ok, failed = target.upsert((it["values"]["external_id"], it["doc"]) for it in items), []
+                else:
+                    ok, failed = _bulk_index(es, new_index, items)
+                stats["indexed_docs"] += ok
+                stats["skipped_index"] += len(failed)
+                stats["rows_processed"] += len(items)
+                if progress is not None:
+                    progress(dict(stats))
+    except Exception:
+        if es is not None:
+            es.indices.delete(index=new_index, ignore_unavailable=True)
+        raise
+    finally:
+        extractor.close()
+
+    if es is None:
+        backend.replace_properties(target)
+        bump_index_generation()
+        stats["index"] = target.snapshot
+        stats["replaced"] = []
+        return stats
+    es.indices.put_settings(index=new_index, settings={"index": {"refresh_interval": None}})
+    es.indices.refresh(index=new_index)
+    stats["replaced"] = swap_alias(es, alias, new_index, keep_old=keep_old)
+    bump_index_generation()
+    return stats
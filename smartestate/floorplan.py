@@ -1,8 +1,12 @@
 import importlib.util
 import json
+import multiprocessing
 import os
 import re
-from typing import Any, Dict, List, Tuple
+import signal
+from concurrent.futures import ProcessPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
@@ -50,6 +54,26 @@ class FloorplanParser:
         self._categories = {cat["id"]: cat["name"] for cat in metadata["categories"]}
         self._num_classes = metadata["num_classes"]
 
+    def _model_path(self) -> str:
+        models_dir = os.path.join(self.settings.model_dir, "models")
+        preferred = os.path.join(models_dir, "floorplan_model_inference.pth")
+        fallback = os.path.join(models_dir, "best_model.pth")
+        return preferred if os.path.exists(preferred) else fallback
+
+    def cache_identity(self) -> Dict[str, Any]:
+        """Everything besides the image that determines parse output, for cache keys."""
+        model_path = self._model_path()
+        try:
+            st = os.stat(model_path)
+            weights = f"{os.path.abspath(model_path)}:{st.st_size}:{int(st.st_mtime)}"
+        except OSError:
+            weights = os.path.abspath(model_path)
+        return {
+            "weights": weights,
+            "threshold": self.settings.floorplan_threshold,
+            "ocr_langs": list(self.settings.ocr_langs),
+        }
+
     def _load_model(self):
         if self._model is not None:
             return
@@ -58,10 +82,7 @@ class FloorplanParser:
         # Ensure PyTorch loads checkpoint with full compatibility on 2.6+
         # Default torch.load weights_only=True can fail on older checkpoints; force legacy behavior safely here.
         os.environ.setdefault("TORCH_FORCE_NO_WEIGHTS_ONLY_LOAD", "1")
-        models_dir = os.path.join(self.settings.model_dir, "models")
-        preferred = os.path.join(models_dir, "floorplan_model_inference.pth")
-        fallback = os.path.join(models_dir, "best_model.pth")
-        model_path = preferred if os.path.exists(preferred) else fallback
+        model_path = self._model_path()
 
         # Try robust loader directly (handles both state_dict and full checkpoint dicts)
         try:
@@ -125,7 +146,8 @@ class FloorplanParser:
 
     # ------- Enhanced pipeline helpers -------
 
-    def _run_detection(self, image: Image.Image, threshold: float = 0.5) -> Dict[str, np.ndarray]:
+    def _run_detection(self, image: Image.Image, threshold: Optional[float] = None) -> Dict[str, np.ndarray]:
+        threshold = self.settings.floorplan_threshold if threshold is None else threshold
         tensor = transforms.ToTensor()(image).unsqueeze(0).to(self._device)
         with torch.no_grad():
             pred = self._model(tensor)[0]
@@ -306,3 +328,98 @@ class FloorplanParser:
             'detected_texts': detected_texts[:50],
             'overlay_path': overlay_path,
         }
+
+
+# ------- Worker pool for batch parsing -------
+
+_WORKER_PARSER: Optional[FloorplanParser] = None
+
+
+def _pool_init(num_threads: int):
+    """Load the detector and OCR reader once per worker process."""
+    global _WORKER_PARSER
+    torch.set_num_threads(max(1, num_threads))
+    parser = FloorplanParser()
+    try:
+        parser._load_model()
+        parser._load_ocr()
+    except Exception:
+        # parse() re-raises the load error per image so the caller sees it as a failure
+        pass
+    _WORKER_PARSER = parser
+
+
+@contextmanager
+def _time_limit(seconds: Optional[float]):
+    # SIGALRM is only available on POSIX and only in the main thread, which is where pool workers run tasks
+    if not seconds or not hasattr(signal, "SIGALRM"):
+        yield
+        return
+
+    def _on_alarm(signum, frame):
+        raise TimeoutError(f"floorplan parse exceeded {seconds}s")
+
+    previous = signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _pool_parse(key: Any, image_path: str, timeout: Optional[float]) -> Tuple[Any, Optional[Dict[str, Any]], Optional[str]]:
+    parser = _WORKER_PARSER or FloorplanParser()
+    try:
+        with _time_limit(timeout):
+            return key, parser.parse(image_path), None
+    except Exception as e:
+        return key, None, str(e)
+
+
+class FloorplanPool:
+    """Process pool that parses many floorplans in parallel, one warm parser per worker."""
+
+    def __init__(self, workers: int, timeout: Optional[float] = None):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_pool_init,
+            initargs=(threads,),
+        )
+
+    def parse_many(self, images: Iterable[Tuple[Any, str]]) -> Iterator[Tuple[Any, Optional[Dict[str, Any]], Optional[str]]]:
+        """Yield ``(key, parsed, error)`` for each ``(key, image_path)`` in completion order."""
+        futures = {self._executor.submit(_pool_parse, key, path, self.timeout): key for key, path in images}
+        if not futures:
+            return
+        # Backstop for parses the in-worker alarm cannot interrupt (e.g. stuck inside native code)
+        deadline = None
+        if self.timeout:
+            waves = -(-len(futures) // self.workers)
+            deadline = self.timeout * (waves + 1)
+        done = set()
+        try:
+            for fut in as_completed(futures, timeout=deadline):
+                done.add(fut)
+                try:
+                    yield fut.result()
+                except Exception as e:
+                    yield futures[fut], None, str(e)
+        except FuturesTimeout:
+            for fut, key in futures.items():
+                if fut not in done:
+                    fut.cancel()
+                    yield key, None, "timeout"
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
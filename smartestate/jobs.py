@@ -0,0 +1,145 @@
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .config import get_settings
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobManager:
+    """Runs long tasks (ingest, reindex) on a small background executor and tracks their progress.
+
+    At most ``max_concurrent`` jobs run at once; up to ``max_queued`` more may wait, after which
+    ``submit`` raises :class:`JobQueueFull` so large imports cannot pile up behind each other.
+    """
+
+    def __init__(self, max_concurrent: int = 1, max_queued: int = 4, keep_finished: int = 100):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max(0, max_queued)
+        self.keep_finished = keep_finished
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="job")
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Futures of jobs that have not finished yet, with their cleanup, for shutdown()
+        self._futures: Dict[str, Tuple[Future, Optional[Callable[[], None]]]] = {}
+        self._lock = threading.Lock()
+
+    def _pending(self) -> int:
+        return sum(1 for j in self._jobs.values() if j["status"] in ("queued", "running"))
+
+    def submit(self, kind: str, fn: Callable[..., Any], *args, cleanup: Optional[Callable[[], None]] = None, **kwargs) -> str:
+        """Queue ``fn(*args, progress=callback, **kwargs)``; returns the job id."""
+        with self._lock:
+            if self._pending() >= self.max_concurrent + self.max_queued:
+                raise JobQueueFull(f"{self._pending()} jobs already pending")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "kind": kind,
+                "status": "queued",
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "rows_processed": 0,
+                "rows_total": None,
+                "throughput_rows_per_s": None,
+                "eta_seconds": None,
+                "failures": 0,
+                "progress": {},
+                "result": None,
+                "error": None,
+            }
+            self._trim()
+            self._futures[job_id] = (self._executor.submit(self._run, job_id, fn, args, kwargs, cleanup), cleanup)
+        return job_id
+
+    def _run(self, job_id: str, fn, args, kwargs, cleanup):
+        self._update(job_id, status="running", started_at=time.time())
+        try:
+            result = fn(*args, progress=lambda p: self._on_progress(job_id, p), **kwargs)
+            self._update(job_id, status="succeeded", result=result, finished_at=time.time())
+            if isinstance(result, dict):
+                self._on_progress(job_id, result)
+        except Exception as e:
+            self._update(job_id, status="failed", error=f"{e}\n{traceback.format_exc(limit=5)}", finished_at=time.time())
+        finally:
+            with self._lock:
+                self._futures.pop(job_id, None)
+            _run_cleanup(cleanup)
+
+    def _on_progress(self, job_id: str, progress: Dict[str, Any]):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job["progress"] = dict(progress)
+            done = int(progress.get("rows_processed", job["rows_processed"]) or 0)
+            total = progress.get("rows_total", job["rows_total"])
+            job["rows_processed"] = done
+            job["rows_total"] = total
+            job["failures"] = int(progress.get("failed_rows", 0) or 0) + int(progress.get("skipped_index", 0) or 0)
+            elapsed = time.time() - (job["started_at"] or time.time())
+            if done and elapsed > 0:
+                rate = done / elapsed
+                job["throughput_rows_per_s"] = round(rate, 2)
+                if total:
+                    job["eta_seconds"] = round(max(0, total - done) / rate, 1)
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def _trim(self):
+        finished = [k for k, j in self._jobs.items() if j["status"] in ("succeeded", "failed", "cancelled")]
+        for k in finished[: max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[k]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self) -> list:
+        with self._lock:
+            return [dict(j) for j in self._jobs.values()]
+
+    def shutdown(self):
+        """Cancel queued jobs (running their cleanup) and stop accepting work; running jobs finish on their own."""
+        with self._lock:
+            pending = list(self._futures.items())
+        for job_id, (future, cleanup) in pending:
+            # False once the job has started; _run then cleans up after itself
+            if future.cancel():
+                with self._lock:
+                    self._futures.pop(job_id, None)
+                self._update(job_id, status="cancelled", finished_at=time.time())
+                _run_cleanup(cleanup)
+        self._executor.shutdown(wait=False)
+
+
+def _run_cleanup(cleanup: Optional[Callable[[], None]]) -> None:
+    if cleanup is not None:
+        try:
+            cleanup()
+        except Exception:
+            pass
+
+
+_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            settings = get_settings()
+            _manager = JobManager(settings.ingest_max_concurrent_jobs, settings.ingest_max_queued_jobs)
+        return _manager
@@ -25,10 +25,21 @@ class Property(Base):
     metadata_tags: Mapped[Optional[dict]] = mapped_column(JSONB)
     cert_links: Mapped[Optional[dict]] = mapped_column(JSONB)
     parsed_json: Mapped[Optional[dict]] = mapped_column(JSONB)
+    # sha256 over normalized row fields + image/certificate content; lets re-ingest skip unchanged rows
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
 
+class IngestCheckpoint(Base):
+    """Last committed row offset of an in-progress bulk ingest, keyed by the feed's content hash."""
+    __tablename__ = "ingest_checkpoints"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    file_fingerprint: Mapped[str] = mapped_column(String(64), unique=True, index=True)
+    rows_committed: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 class Conversation(Base):
     __tablename__ = "conversations"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -0,0 +1,200 @@
+import csv
+import hashlib
+import os
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+
+# Canonical field -> accepted source column names (case-insensitive), first match wins
+COLUMN_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "external_id": ("id", "external_id", "property_id"),
+    "title": ("title",),
+    "long_description": ("long_description", "description"),
+    "location": ("location", "city"),
+    "price": ("price",),
+    "listing_date": ("listing_date", "date"),
+    "floorplan_image": ("floorplan_image", "image", "image_url", "image_file"),
+    "certs": ("cert_links", "certificates", "certifications"),
+    "seller_type": ("seller_type",),
+    "seller_contact": ("seller_contact",),
+    "metadata_tags": ("metadata_tags",),
+}
+
+# Canonical city -> spellings seen in addresses; used for the filterable ``city`` field
+CITY_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "hyderabad": ("hyderabad", "secunderabad"),
+    "mumbai": ("mumbai", "bombay"),
+    "navi mumbai": ("navi mumbai",),
+    "thane": ("thane",),
+    "delhi": ("delhi", "new delhi"),
+    "gurgaon": ("gurgaon", "gurugram"),
+    "noida": ("noida",),
+    "bangalore": ("bangalore", "bengaluru"),
+    "chennai": ("chennai", "madras"),
+    "kolkata": ("kolkata", "calcutta"),
+    "pune": ("pune",),
+    "ahmedabad": ("ahmedabad",),
+    "jaipur": ("jaipur",),
+    "lucknow": ("lucknow",),
+    "chandigarh": ("chandigarh",),
+    "indore": ("indore",),
+    "kochi": ("kochi", "cochin"),
+    "coimbatore": ("coimbatore",),
+    "visakhapatnam": ("visakhapatnam", "vizag"),
+    "jamshedpur": ("jamshedpur",),
+    "nagpur": ("nagpur",),
+}
+# Longest spellings first so "navi mumbai" wins over "mumbai"
+_CITY_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted((re.escape(a) for v in CITY_ALIASES.values() for a in v), key=len, reverse=True)) + r")\b"
+)
+_CITY_BY_ALIAS = {a: city for city, aliases in CITY_ALIASES.items() for a in aliases}
+
+_TEXT_FIELDS = ("title", "long_description", "location", "floorplan_image", "seller_type", "seller_contact")
+
+
+def resolve_columns(columns: Iterable[Any]) -> Dict[str, Optional[str]]:
+    by_lower = {str(c).lower().strip(): c for c in columns}
+    out: Dict[str, Optional[str]] = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        out[field] = next((by_lower[a] for a in aliases if a in by_lower), None)
+    return out
+
+
+def normalize_city(location: Optional[str]) -> Optional[str]:
+    """Canonical lowercase city named in a free-text address (first mention), or None."""
+    if not location:
+        return None
+    m = _CITY_PATTERN.search(" ".join(str(location).lower().split()))
+    return _CITY_BY_ALIAS[m.group(1)] if m else None
+
+
+def _stable_id(*parts: str) -> str:
+    base = "::".join([p or "" for p in parts])
+    return hashlib.sha1(base.encode("utf-8")).hexdigest()  # nosec B324
+
+
+def _clean_str(s: pd.Series) -> pd.Series:
+    s = s.astype("string").str.strip()
+    return s.mask((s == "") | (s.str.lower() == "nan"))
+
+
+def _split_multi(s: pd.Series) -> pd.Series:
+    """Split pipe- or comma-separated cells into lists (pipe wins when present); NaN where empty."""
+    s = _clean_str(s)
+    has_pipe = s.str.contains("|", regex=False, na=False)
+    parts = s.str.split("|", regex=False).where(has_pipe, s.str.split(",", regex=False))
+    exploded = parts.explode().str.strip()
+    exploded = exploded[exploded.notna() & (exploded != "")]
+    return exploded.groupby(level=0).agg(list).reindex(s.index)
+
+
+def _as_objects(s: pd.Series) -> pd.Series:
+    return s.astype(object).where(s.notna(), None)
+
+
+def normalize_frame(df: pd.DataFrame, cols: Dict[str, Optional[str]]) -> pd.DataFrame:
+    """Map a raw chunk onto the canonical schema with column-wise conversions."""
+    df = df.reset_index(drop=True)
+    missing = pd.Series([None] * len(df), index=df.index, dtype=object)
+
+    def col(field: str) -> pd.Series:
+        name = cols.get(field)
+        return df[name] if name is not None else missing
+
+    out = pd.DataFrame(index=df.index)
+    for field in _TEXT_FIELDS:
+        out[field] = _as_objects(_clean_str(col(field)))
+    out["price"] = _as_objects(pd.to_numeric(col("price"), errors="coerce"))
+    # format="mixed" parses each cell on its own, like the old per-row parser; without it pandas
+    # infers one format from the first value and turns every other spelling into NaT
+    dates = pd.to_datetime(col("listing_date"), errors="coerce", format="mixed")
+    out["listing_date"] = _as_objects(dates.dt.date.where(dates.notna()))
+    certs = _split_multi(col("certs"))
+    out["certs"] = [v if isinstance(v, list) else [] for v in certs]
+    tags = _split_multi(col("metadata_tags"))
+    out["metadata_tags"] = [{"tags": v} if isinstance(v, list) else None for v in tags]
+
+    ext = _clean_str(col("external_id"))
+    out["external_id"] = _as_objects(ext)
+    missing_ids = ext.isna()
+    if missing_ids.any():
+        out.loc[missing_ids, "external_id"] = [
+            _stable_id(t or "", loc or "", str(p or ""))
+            for t, loc, p in zip(out.loc[missing_ids, "title"], out.loc[missing_ids, "location"], out.loc[missing_ids, "price"])
+        ]
+    return out
+
+
+def _raw_chunks(path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".csv", ".txt"):
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=True)
+    elif ext in (".parquet", ".pq"):
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(path)
+        for batch in pf.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif ext in (".xlsx", ".xlsm"):
+        from openpyxl import load_workbook
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            # The first sheet, as pd.read_excel reads it; wb.active is whichever sheet was last selected
+            rows = wb.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            header = [str(h) if h is not None else f"column_{i}" for i, h in enumerate(header)]
+            buf: List[tuple] = []
+            for r in rows:
+                if r is None or all(v is None for v in r):
+                    continue
+                buf.append(r)
+                if len(buf) >= chunk_size:
+                    yield pd.DataFrame(buf, columns=header)
+                    buf = []
+            if buf:
+                yield pd.DataFrame(buf, columns=header)
+        finally:
+            wb.close()
+    else:
+        # Legacy .xls and anything else pandas can open; not streamed
+        df = pd.read_excel(path)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+
+
+def iter_records(path: str, chunk_size: int = 500) -> Iterator[List[Dict[str, Any]]]:
+    """Yield the feed as lists of at most ``chunk_size`` normalized row dicts (CSV, Parquet, XLSX)."""
+    cols: Optional[Dict[str, Optional[str]]] = None
+    for chunk in _raw_chunks(path, max(1, chunk_size)):
+        if cols is None:
+            cols = resolve_columns(chunk.columns)
+        if len(chunk):
+            yield normalize_frame(chunk, cols).to_dict("records")
+
+
+def count_rows(path: str) -> Optional[int]:
+    """Cheap row count for progress reporting; None when it cannot be known up front."""
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext in (".csv", ".txt"):
+            # Records, not lines: quoted descriptions may span several lines; blank lines are skipped as read_csv does
+            with open(path, newline="", encoding="utf-8", errors="replace") as f:
+                return max(0, sum(1 for r in csv.reader(f) if r) - 1)
+        if ext in (".parquet", ".pq"):
+            import pyarrow.parquet as pq
+            return pq.ParquetFile(path).metadata.num_rows
+        if ext in (".xlsx", ".xlsm"):
+            from openpyxl import load_workbook
+            wb = load_workbook(path, read_only=True)
+            try:
+                max_row = wb.worksheets[0].max_row
+            finally:
+                wb.close()
+            return max(0, max_row - 1) if max_row else None
+    except Exception:
+        return None
+    return None
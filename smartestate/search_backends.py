@@ -0,0 +1,376 @@
+import asyncio
+import fnmatch
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .config import get_settings
+from .embedded_index import EmbeddedIndex, highlight_fragments
+from .es_client import ensure_memory_index, get_async_es, get_es, knn_num_candidates
+
+_ID_TOKEN = re.compile(r"\b[A-Za-z]{2,}-\d+\b")
+
+LEGS = ("lexical", "vector")
+
+
+def _lexical_query(query: str, filters: List[Dict[str, Any]]) -> Dict[str, Any]:
+    match_query: Dict[str, Any] = {
+        "multi_match": {
+            "query": query,
+            "fields": ["title^2", "long_description", "full_text"],
+            "type": "best_fields",
+        }
+    }
+    # Listing ids (PROP-000123) are document ids, not indexed text
+    ids = _ID_TOKEN.findall(query)
+    if ids:
+        match_query = {"bool": {"should": [match_query, {"ids": {"values": ids, "boost": 10.0}}]}}
+    if filters:
+        match_query = {"bool": {"must": match_query, "filter": filters}}
+    return match_query
+
+
+def _knn_clause(vector: List[float], k: int, num_candidates: Optional[int], filters: List[Dict[str, Any]]) -> Dict[str, Any]:
+    knn_body: Dict[str, Any] = {
+        "field": "embedding",
+        "query_vector": vector,
+        "k": k,
+        "num_candidates": knn_num_candidates(k, num_candidates),
+    }
+    if filters:
+        knn_body["filter"] = {"bool": {"filter": filters}}
+    return knn_body
+
+
+def source_filter() -> Dict[str, List[str]]:
+    """``_source`` projection for listing hits from SEARCH_SOURCE_*; the vector is never returned."""
+    settings = get_settings()
+    projection = {"excludes": sorted(set(settings.search_source_excludes) | {"embedding"})}
+    if settings.search_source_includes:
+        projection["includes"] = list(settings.search_source_includes)
+    return projection
+
+
+def _highlight(query: str) -> Dict[str, Any]:
+    settings = get_settings()
+    size = settings.search_highlight_fragment_size
+    return {
+        # Given explicitly so kNN hits, which have no query of their own, get passages too
+        "highlight_query": {"match": {"full_text": query}},
+        "fields": {
+            "full_text": {
+                "fragment_size": size,
+                "number_of_fragments": settings.search_highlight_fragments,
+                "no_match_size": size,
+            }
+        },
+    }
+
+
+def _project(source: Dict[str, Any], projection: Dict[str, List[str]]) -> Dict[str, Any]:
+    includes = projection.get("includes")
+    return {
+        field: value
+        for field, value in source.items()
+        if (not includes or any(fnmatch.fnmatchcase(field, p) for p in includes))
+        and not any(fnmatch.fnmatchcase(field, p) for p in projection["excludes"])
+    }
+
+
+class SearchBackend(ABC):
+    """Where listings and semantic memories are indexed and searched.
+
+    Search methods return Elasticsearch-shaped responses (``{"took", "hits": {"hits": [...]}}``)
+    so ranking, fusion and result shaping in ``tools.search`` stay backend independent.
+    """
+
+    name = ""
+
+    @abstractmethod
+    def search_legs(
+        self,
+        query: str,
+        vector: Optional[List[float]],
+        size: int,
+        clauses: List[Dict[str, Any]],
+        num_candidates: Optional[int] = None,
+        legs: Sequence[str] = LEGS,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Run the requested legs ("lexical" BM25, "vector" kNN) with the same filter clauses."""
+
+    def search_legs_many(
+        self,
+        requests: List[Tuple[str, Optional[List[float]], int, Sequence[str]]],
+        clauses: List[Dict[str, Any]],
+        num_candidates: Optional[int] = None,
+    ) -> List[Dict[str, Dict[str, Any]]]:
+        """``search_legs`` for several ``(query, vector, size, legs)`` requests; responses in request order."""
+        return [
+            self.search_legs(query, vector, size, clauses, num_candidates, legs)
+            for query, vector, size, legs in requests
+        ]
+
+    @abstractmethod
+    def add_memory(self, doc: Dict[str, Any]) -> None:
+        """Store one semantic memory document."""
+
+    async def aadd_memory(self, doc: Dict[str, Any]) -> None:
+        """``add_memory`` for event-loop callers."""
+        await asyncio.to_thread(self.add_memory, doc)
+
+    @abstractmethod
+    def search_memory(self, user_id: str, query: str, vector: Optional[List[float]], k: int) -> Dict[str, Any]:
+        """A user's memories closest to ``vector`` (or matching ``query`` when there is no vector)."""
+
+    def flush(self) -> None:
+        """Make writes durable (a no-op where the engine handles it)."""
+
+    def generation(self) -> Optional[str]:
+        """Marker of the listing contents, seen to change by every process using this backend."""
+        return None
+
+    def mark_changed(self) -> None:
+        """Record that listings changed, so ``generation()`` moves on for every process."""
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+    def close(self) -> None:
+        self.flush()
+
+
+class ElasticsearchBackend(SearchBackend):
+    name = "elasticsearch"
+
+    def __init__(self):
+        self._memory_index: Optional[str] = None
+
+    def _memory_idx(self) -> str:
+        # Checked once per process rather than with an extra round trip per memory call
+        if self._memory_index is None:
+            self._memory_index = ensure_memory_index(get_es())
+        return self._memory_index
+
+    @staticmethod
+    def _bodies(query, vector, size, clauses, num_candidates, legs) -> Dict[str, Dict[str, Any]]:
+        shared = {"size": size, "_source": source_filter(), "highlight": _highlight(query)}
+        bodies: Dict[str, Dict[str, Any]] = {}
+        if "lexical" in legs:
+            bodies["lexical"] = {**shared, "query": _lexical_query(query, clauses)}
+        if "vector" in legs and vector is not None:
+            bodies["vector"] = {**shared, "knn": _knn_clause(vector, size, num_candidates, clauses)}
+        return bodies
+
+    def search_legs(self, query, vector, size, clauses, num_candidates=None, legs=LEGS):
+        index = get_settings().elasticsearch_index
+        bodies = self._bodies(query, vector, size, clauses, num_candidates, legs)
+        es = get_es()
+        if len(bodies) == 1:
+            (leg, body), = bodies.items()
+            return {leg: es.search(index=index, body=body)}
+        searches: List[Dict[str, Any]] = []
+        for body in bodies.values():
+            searches += [{}, body]
+        res = es.msearch(index=index, searches=searches)
+        return dict(zip(bodies, res.get("responses", [{}] * len(bodies))))
+
+    def search_legs_many(self, requests, clauses, num_candidates=None):
+        # Every leg of every request in a single _msearch round trip
+        per_request = [self._bodies(q, v, size, clauses, num_candidates, legs) for q, v, size, legs in requests]
+        searches: List[Dict[str, Any]] = []
+        for bodies in per_request:
+            for body in bodies.values():
+                searches += [{}, body]
+        if not searches:
+            return [{} for _ in requests]
+        res = get_es().msearch(index=get_settings().elasticsearch_index, searches=searches)
+        responses = iter(res.get("responses", []))
+        return [{leg: next(responses, {}) for leg in bodies} for bodies in per_request]
+
+    def generation(self):
+        # The concrete index behind the alias (a reindex swaps it) and the marker ingest leaves in _meta
+        mappings = dict(get_es().indices.get_mapping(index=get_settings().elasticsearch_index))
+        return ",".join(
+            f"{name}:{mapping.get('mappings', {}).get('_meta', {}).get('generation', '')}"
+            for name, mapping in sorted(mappings.items())
+        )
+
+    def mark_changed(self):
+        get_es().indices.put_mapping(index=get_settings().elasticsearch_index, meta={"generation": os.urandom(8).hex()})
+
+    def add_memory(self, doc):
+        get_es().index(index=self._memory_idx(), document=doc)
+
+    async def aadd_memory(self, doc):
+        index = self._memory_index or await asyncio.to_thread(self._memory_idx)
+        await get_async_es().index(index=index, document=doc)
+
+    def search_memory(self, user_id, query, vector, k):
+        idx = self._memory_idx()
+        user_filter = {"term": {"user_id": user_id}}
+        if vector is not None:
+            # Filter inside kNN; a top-level query next to knn would OR in other users' memories
+            body = {
+                "size": k,
+                "_source": {"excludes": ["embedding"]},
+                "knn": {
+                    "field": "embedding",
+                    "query_vector": vector,
+                    "k": k,
+                    "num_candidates": knn_num_candidates(k),
+                    "filter": user_filter,
+                },
+            }
+        else:
+            body = {
+                "size": k,
+                "_source": {"excludes": ["embedding"]},
+                "query": {
+                    "bool": {
+                        "must": {"multi_match": {"query": query, "fields": ["text"]}},
+                        "filter": user_filter,
+                    }
+                },
+            }
+        return get_es().search(index=idx, body=body)
+
+
+def _snapshot_name(directory: str) -> Optional[str]:
+    try:
+        with open(os.path.join(directory, "CURRENT")) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+class EmbeddedBackend(SearchBackend):
+    """In-process ``EmbeddedIndex`` pair (listings, memories) persisted as snapshots.
+
+    Listings are written by ingest/reindex and saved at the end of each run; a process that
+    did not write them (e.g. the API after a CLI ingest) picks up a newer snapshot on its
+    next search. Memories are saved every EMBEDDED_AUTOSAVE_EVERY writes and on shutdown.
+    """
+
+    name = "embedded"
+
+    PROPERTY_TEXT = {"title": 2, "long_description": 1, "full_text": 1}
+    PROPERTY_KEYWORDS = ("location", "city", "seller_type")
+    PROPERTY_NUMBERS = ("price", "rooms", "halls", "kitchens", "bathrooms", "has_certificates")
+
+    def __init__(self, directory: str, vector_dtype: str = "float32", autosave_every: int = 200):
+        self.directory = directory
+        self.vector_dtype = vector_dtype
+        self.autosave_every = autosave_every
+        self.properties_dir = os.path.join(directory, "properties")
+        self.memory_dir = os.path.join(directory, "memory")
+        os.makedirs(self.properties_dir, exist_ok=True)
+        os.makedirs(self.memory_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.properties = self.new_properties_index()
+        self.properties.load(self.properties_dir)
+        self.memory = EmbeddedIndex({"text": 1}, keyword_fields=("user_id",), vector_dtype=vector_dtype)
+        self.memory.load(self.memory_dir)
+
+    def new_properties_index(self) -> EmbeddedIndex:
+        return EmbeddedIndex(
+            self.PROPERTY_TEXT, self.PROPERTY_KEYWORDS, self.PROPERTY_NUMBERS, vector_dtype=self.vector_dtype
+        )
+
+    def _current_properties(self) -> EmbeddedIndex:
+        name = _snapshot_name(self.properties_dir)
+        index = self.properties
+        if name is None or name == index.snapshot or index.mutations:
+            return index
+        with self._lock:
+            if self.properties is index:
+                # Load beside the live index so searches keep being served meanwhile
+                fresh = self.new_properties_index()
+                fresh.load(self.properties_dir)
+                self.properties = fresh
+            return self.properties
+
+    def search_legs(self, query, vector, size, clauses, num_candidates=None, legs=LEGS):
+        # Exact search: num_candidates has nothing to bound here
+        index = self._current_properties()
+        out: Dict[str, Dict[str, Any]] = {}
+        if "lexical" in legs:
+            out["lexical"] = index.bm25(query, size, clauses, ids=_ID_TOKEN.findall(query))
+        if "vector" in legs and vector is not None:
+            out["vector"] = index.knn(vector, size, clauses)
+        settings = get_settings()
+        projection = source_filter()
+        for response in out.values():
+            for hit in response["hits"]["hits"]:
+                source = hit["_source"]
+                hit["highlight"] = {"full_text": highlight_fragments(
+                    source.get("full_text"), query,
+                    settings.search_highlight_fragment_size, settings.search_highlight_fragments,
+                )}
+                hit["_source"] = _project(source, projection)
+        return out
+
+    def index_documents(self, docs: List[Tuple[str, Dict[str, Any]]]) -> Tuple[int, List[str]]:
+        """Index ``(id, doc)`` pairs into the listings index; returns ``(indexed, failed_ids)``."""
+        self.properties.upsert(docs)
+        return len(docs), []
+
+    def delete_documents(self, ids: Iterable[str]) -> int:
+        return self.properties.delete(ids)
+
+    def replace_properties(self, index: EmbeddedIndex) -> None:
+        """Persist a freshly built index and serve it from now on (the embedded reindex swap)."""
+        index.save(self.properties_dir)
+        with self._lock:
+            self.properties = index
+
+    def add_memory(self, doc):
+        self.memory.upsert([(os.urandom(10).hex(), doc)])
+        if self.autosave_every and self.memory.mutations >= self.autosave_every:
+            self.memory.save(self.memory_dir)
+
+    def search_memory(self, user_id, query, vector, k):
+        clauses = [{"term": {"user_id": user_id}}]
+        if vector is not None:
+            return self.memory.knn(vector, k, clauses)
+        return self.memory.bm25(query, k, clauses)
+
+    def flush(self):
+        if self.properties.mutations:
+            self.properties.save(self.properties_dir)
+        if self.memory.mutations:
+            self.memory.save(self.memory_dir)
+
+    def generation(self):
+        # Every flush writes a new snapshot, so the name CURRENT points at tracks the contents
+        return _snapshot_name(self.properties_dir)
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "properties": len(self.properties),
+            "memories": len(self.memory),
+            "snapshot": self.properties.snapshot,
+        }
+
+
+_backend: Optional[SearchBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend() -> SearchBackend:
+    """Process-wide search backend selected by SEARCH_BACKEND ("elasticsearch" or "embedded")."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            settings = get_settings()
+            if settings.search_backend == "embedded":
+                _backend = EmbeddedBackend(
+                    settings.embedded_index_dir or os.path.join(settings.cache_dir, "embedded"),
+                    vector_dtype=settings.embedded_vector_dtype,
+                    autosave_every=settings.embedded_autosave_every,
+                )
+            else:
+                _backend = ElasticsearchBackend()
+        return _backend
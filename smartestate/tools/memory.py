@@ -6,9 +6,8 @@ from sqlalchemy import select
 
 from ..db import session_scope
 from ..models import Conversation, ChatMessage, UserMemory, Shortlist
-from ..es_client import get_es, ensure_memory_index
-from ..embedding import Embeddings
-from ..config import get_settings
+from ..embedding import get_embedder
+from ..search_backends import get_search_backend
 
 
 def get_or_create_conversation(user_id: str) -> int:
@@ -61,46 +60,26 @@ def remember_shortlist(user_id: str, property_ids: List[str]) -> List[str]:
         return rec.properties["ids"]
 
 
-def add_semantic_memory(user_id: str, text: str):
-    es = get_es()
-    idx = ensure_memory_index(es)
-    settings = get_settings()
-    embedder = Embeddings(settings.embedding_model)
-    vec = (embedder.embed([text]) or [None])[0]
+def _memory_doc(user_id: str, text: str, vec: Optional[List[float]]) -> Dict[str, Any]:
     doc = {"user_id": user_id, "text": text, "created_at": datetime.utcnow().isoformat()}
     if vec is not None:
         doc["embedding"] = vec
-    es.index(index=idx, document=doc)
+    return doc
+
+
+def add_semantic_memory(user_id: str, text: str):
+    get_search_backend().add_memory(_memory_doc(user_id, text, get_embedder().embed_query(text)))
+
+
+async def aadd_semantic_memory(user_id: str, text: str):
+    """``add_semantic_memory`` for async handlers: encodes off the loop and writes with the async ES client."""
+    vec = await get_embedder().aembed_query(text)
+    await get_search_backend().aadd_memory(_memory_doc(user_id, text, vec))
 
 
 def search_semantic_memory(user_id: str, query: str, k: int = 3):
-    es = get_es()
-    idx = ensure_memory_index(es)
-    settings = get_settings()
-    embedder = Embeddings(settings.embedding_model)
-    vec = (embedder.embed([query]) or [None])[0]
-    if vec is not None:
-        body = {
-            "size": k,
-            "knn": {
-                "field": "embedding",
-                "query_vector": vec,
-                "k": k,
-                "num_candidates": max(10, k * 4)
-            },
-            "query": {"term": {"user_id": user_id}}
-        }
-    else:
-        body = {
-            "size": k,
-            "query": {
-                "bool": {
-                    "must": {"multi_match": {"query": query, "fields": ["text"]}},
-                    "filter": {"term": {"user_id": user_id}}
-                }
-            }
-        }
-    res = es.search(index=idx, body=body)
+    vec = get_embedder().embed_query(query)
+    res = get_search_backend().search_memory(user_id, query, vec, k)
     out = []
     for h in res.get("hits", {}).get("hits", []):
         out.append({"id": h.get("_id"), **(h.get("_source") or {})})
@@ -1,51 +1,361 @@
-from typing import List, Dict, Any
+import json
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import List, Dict, Any, Optional, Tuple
 
-from ..es_client import get_es
+from ..cache import index_generation
 from ..config import get_settings
-from ..embedding import Embeddings
+from ..embedding import get_embedder, normalize_query
+from ..reader import normalize_city
+from ..search_backends import get_search_backend, source_filter
 
 
-def search_properties(query: str, k: int = 5, needs_certificate: bool = False) -> List[Dict[str, Any]]:
-    es = get_es()
-    settings = get_settings()
-    index = settings.elasticsearch_index
-    embedder = Embeddings(settings.embedding_model)
-    vectors = embedder.embed([query]) or [None]
-    vector = vectors[0]
-
-    filters: List[Dict[str, Any]] = []
-    if needs_certificate:
-        filters.append({"exists": {"field": "cert_links"}})
-
-    if vector is not None:
-        knn_body: Dict[str, Any] = {
-            "field": "embedding",
-            "query_vector": vector,
-            "k": k,
-            "num_candidates": max(20, k * 5),
-        }
-        if filters:
-            knn_body["filter"] = {"bool": {"filter": filters}}
-        body = {"size": k, "knn": knn_body}
-    else:
-        match_query: Dict[str, Any] = {
-            "multi_match": {
-                "query": query,
-                "fields": ["title^2", "long_description", "full_text"],
-                "type": "best_fields",
+class LatencyStats:
+    """Rolling per-leg latencies (ms) for tuning hybrid search."""
+
+    def __init__(self, window: int = 1000):
+        self._samples: Dict[str, deque] = {}
+        self._window = window
+        self._lock = threading.Lock()
+
+    def record(self, leg: str, ms: float) -> None:
+        with self._lock:
+            self._samples.setdefault(leg, deque(maxlen=self._window)).append(ms)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            samples = {leg: sorted(vals) for leg, vals in self._samples.items()}
+        out = {}
+        for leg, vals in samples.items():
+            out[leg] = {
+                "count": len(vals),
+                "avg_ms": round(sum(vals) / len(vals), 3),
+                "p50_ms": round(vals[len(vals) // 2], 3),
+                "p95_ms": round(vals[min(len(vals) - 1, int(len(vals) * 0.95))], 3),
+            }
+        return out
+
+
+search_latency = LatencyStats()
+
+
+class SearchResultCache:
+    """Bounded LRU of search results with a TTL; keys carry the index generation.
+
+    Concurrent misses on the same key share one computation: the first caller runs it and
+    the others wait on its future instead of each embedding the query and calling the backend.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 300.0):
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries: "OrderedDict[Tuple, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._inflight: Dict[Tuple, Future] = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: Tuple) -> Optional[List[Dict[str, Any]]]:
+        entry = self._entries.get(key)
+        if entry is not None and self.ttl > 0 and time.monotonic() - entry[0] > self.ttl:
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return [dict(r) for r in entry[1]]
+
+    def _store(self, key: Tuple, results: List[Dict[str, Any]]) -> None:
+        if self.max_entries:
+            self._entries[key] = (time.monotonic(), results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: Tuple) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            results = self._lookup(key)
+            if results is None:
+                self.misses += 1
+            return results
+
+    def put(self, key: Tuple, results: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._store(key, results)
+
+    def get_or_compute(self, key: Tuple, compute) -> List[Dict[str, Any]]:
+        with self._lock:
+            cached = self._lookup(key)
+            if cached is not None:
+                return cached
+            fut = self._inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            return [dict(r) for r in fut.result()]
+        try:
+            results = compute()
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            fut.set_exception(e)
+            raise
+        with self._lock:
+            self._inflight.pop(key, None)
+            self._store(key, results)
+        fut.set_result(results)
+        return [dict(r) for r in results]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": round(self.hits / total, 4) if total else None,
             }
-        }
-        if filters:
-            match_query = {"bool": {"must": match_query, "filter": filters}}
-        body = {"size": k, "query": match_query}
-
-    res = es.search(index=index, body=body)
-    out: List[Dict[str, Any]] = []
-    for hit in res.get("hits", {}).get("hits", []):
-        source = hit.get("_source", {})
-        out.append({
-            "id": hit.get("_id"),
-            "score": hit.get("_score"),
-            **source,
-        })
+
+
+_result_cache: Optional[SearchResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> Optional[SearchResultCache]:
+    """Process-wide search result cache, or None when SEARCH_CACHE_SIZE is 0."""
+    global _result_cache
+    settings = get_settings()
+    if settings.search_cache_size <= 0:
+        return None
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = SearchResultCache(settings.search_cache_size, settings.search_cache_ttl)
+        return _result_cache
+
+
+def build_filters(filters: Optional[Dict[str, Any]] = None, needs_certificate: bool = False) -> List[Dict[str, Any]]:
+    """Translate a ``tools.sql.find_properties`` filter dict into ES filter clauses on the indexed doc fields."""
+    filters = filters or {}
+    clauses: List[Dict[str, Any]] = []
+    price: Dict[str, float] = {}
+    if filters.get("min_price") is not None:
+        price["gte"] = float(filters["min_price"])
+    if filters.get("max_price") is not None:
+        price["lte"] = float(filters["max_price"])
+    if price:
+        clauses.append({"range": {"price": price}})
+    if filters.get("location"):
+        city = normalize_city(filters["location"])
+        if city:
+            clauses.append({"term": {"city": city}})
+        else:
+            # Same partial, case-insensitive semantics as the SQL ILIKE
+            literal = re.sub(r"([\\*?])", r"\\\1", str(filters["location"]))
+            clauses.append({"wildcard": {"location": {"value": f"*{literal}*", "case_insensitive": True}}})
+    if filters.get("seller_type") in {"owner", "builder", "agent"}:
+        clauses.append({"term": {"seller_type": filters["seller_type"]}})
+    rooms: Dict[str, int] = {}
+    if filters.get("min_rooms") is not None:
+        rooms["gte"] = int(filters["min_rooms"])
+    if filters.get("max_rooms") is not None:
+        rooms["lte"] = int(filters["max_rooms"])
+    if rooms:
+        clauses.append({"range": {"rooms": rooms}})
+    if needs_certificate or filters.get("has_certificates"):
+        clauses.append({"term": {"has_certificates": True}})
+    return clauses
+
+
+def reciprocal_rank_fusion(
+    legs: List[List[Dict[str, Any]]], weights: List[float], rank_constant: int = 60
+) -> List[Tuple[Dict[str, Any], float]]:
+    """Fuse ranked hit lists: score(d) = sum_i w_i / (rank_constant + rank_i(d)), ranks starting at 1."""
+    scores: Dict[str, float] = {}
+    first_seen: Dict[str, Dict[str, Any]] = {}
+    for hits, weight in zip(legs, weights):
+        for rank, hit in enumerate(hits, start=1):
+            doc_id = hit.get("_id")
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (rank_constant + rank)
+            first_seen.setdefault(doc_id, hit)
+    ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+    return [(first_seen[doc_id], score) for doc_id, score in ranked]
+
+
+def _to_result(hit: Dict[str, Any], score: Optional[float]) -> Dict[str, Any]:
+    result = {"id": hit.get("_id"), "score": score, **hit.get("_source", {})}
+    fragments = (hit.get("highlight") or {}).get("full_text")
+    if fragments:
+        result["highlights"] = fragments
+    return result
+
+
+def _leg_hits(response: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    if response.get("error"):
+        return None
+    return response.get("hits", {}).get("hits", [])
+
+
+_backend_generation: Tuple[float, Optional[str]] = (float("-inf"), None)
+
+
+def _generation(settings) -> Tuple[int, Optional[str]]:
+    """The CACHE_DIR counter plus the backend's own marker, re-read every SEARCH_CACHE_GENERATION_POLL seconds.
+
+    The counter only reaches processes sharing CACHE_DIR; the marker also reaches other API hosts.
+    """
+    global _backend_generation
+    checked_at, marker = _backend_generation
+    now = time.monotonic()
+    if now - checked_at >= settings.search_cache_generation_poll:
+        try:
+            marker = get_search_backend().generation()
+        except Exception:
+            marker = None
+        _backend_generation = (now, marker)
+    return index_generation(), marker
+
+
+def _cache_key(query: str, k: int, mode: str, num_candidates: Optional[int], clauses: List[Dict[str, Any]], settings) -> Tuple:
+    return (
+        _generation(settings),
+        normalize_query(query),
+        k,
+        mode,
+        num_candidates,
+        json.dumps(clauses, sort_keys=True),
+        # Fusion knobs change the ranking, so they are part of the key too
+        settings.search_rrf_window,
+        settings.search_rrf_rank_constant,
+        settings.search_lexical_weight,
+        settings.search_vector_weight,
+        json.dumps(source_filter(), sort_keys=True),
+    )
+
+
+def search_properties(
+    query: str,
+    k: int = 5,
+    needs_certificate: bool = False,
+    num_candidates: Optional[int] = None,
+    mode: Optional[str] = None,
+    filters: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """Search listings. ``mode`` is hybrid (BM25 + kNN fused with RRF), knn or lexical (default SEARCH_MODE).
+
+    ``filters`` takes the ``find_properties`` keys (price, location, seller_type, rooms) and is
+    applied inside both legs, as a kNN pre-filter on the vector side. Hybrid and knn fall back
+    to lexical when no query vector is available. Results are cached per index generation
+    (see ``SEARCH_CACHE_*``), so repeated searches skip both the embedding and the backend.
+
+    Hits carry the ``SEARCH_SOURCE_*`` projection of the listing (never the embedding) plus
+    ``highlights``: the ``full_text`` passages that matched the query.
+    """
+    settings = get_settings()
+    mode = mode or settings.search_mode
+    clauses = build_filters(filters, needs_certificate)
+    cache = get_search_cache()
+    if cache is None:
+        return _search(query, k, clauses, num_candidates, mode)
+    key = _cache_key(query, k, mode, num_candidates, clauses, settings)
+    return cache.get_or_compute(key, lambda: _search(query, k, clauses, num_candidates, mode))
+
+
+def search_properties_batch(
+    queries: List[str],
+    k: int = 5,
+    needs_certificate: bool = False,
+    num_candidates: Optional[int] = None,
+    mode: Optional[str] = None,
+    filters: Optional[Dict[str, Any]] = None,
+) -> List[List[Dict[str, Any]]]:
+    """``search_properties`` for many queries sharing k, mode and filters; one result list per query, in order.
+
+    Cached queries are answered from the result cache; the rest are embedded with one encode
+    call and searched in one backend round trip (a single ``_msearch`` on Elasticsearch).
+    """
+    settings = get_settings()
+    mode = mode or settings.search_mode
+    clauses = build_filters(filters, needs_certificate)
+    cache = get_search_cache()
+    keys = [_cache_key(q, k, mode, num_candidates, clauses, settings) for q in queries]
+    out: List[Optional[List[Dict[str, Any]]]] = [None] * len(queries)
+    pending: Dict[Tuple, List[int]] = {}
+    for i, key in enumerate(keys):
+        if key in pending:
+            pending[key].append(i)
+            continue
+        out[i] = cache.get(key) if cache is not None else None
+        if out[i] is None:
+            pending[key] = [i]
+    if pending:
+        started = time.perf_counter()
+        texts = [queries[idxs[0]] for idxs in pending.values()]
+        vectors = get_embedder().embed_queries(texts) if mode != "lexical" else [None] * len(texts)
+        requests = []
+        for text, vector in zip(texts, vectors):
+            size, legs = _plan(k, mode, vector, settings)
+            requests.append((text, vector, size, legs))
+        responses = get_search_backend().search_legs_many(requests, clauses, num_candidates)
+        for (key, idxs), res in zip(pending.items(), responses):
+            results = _results(res, k, settings)
+            if cache is not None:
+                cache.put(key, results)
+            for i in idxs:
+                out[i] = [dict(r) for r in results]
+        search_latency.record("batch", (time.perf_counter() - started) * 1000)
+    return out
+
+
+def _plan(k: int, mode: str, vector: Optional[List[float]], settings) -> Tuple[int, Tuple[str, ...]]:
+    """Hits to fetch per leg and which legs to run for one query."""
+    if vector is None:
+        return k, ("lexical",)
+    if mode == "hybrid":
+        return max(k, settings.search_rrf_window), ("lexical", "vector")
+    return k, ("vector",)
+
+
+def _results(res: Dict[str, Dict[str, Any]], k: int, settings) -> List[Dict[str, Any]]:
+    """Turn backend leg responses into results: RRF-fused when both legs ran, otherwise the leg's own ranking."""
+    for leg, response in res.items():
+        search_latency.record(leg, float(response.get("took", 0)))
+    if len(res) == 1:
+        (response,) = res.values()
+        return [_to_result(hit, hit.get("_score")) for hit in _leg_hits(response) or []]
+    legs, weights = [], []
+    for leg, weight in (("lexical", settings.search_lexical_weight), ("vector", settings.search_vector_weight)):
+        hits = _leg_hits(res.get(leg, {}))
+        if hits is not None:
+            legs.append(hits)
+            weights.append(weight)
+    fuse_started = time.perf_counter()
+    fused = reciprocal_rank_fusion(legs, weights, settings.search_rrf_rank_constant)[:k]
+    search_latency.record("fusion", (time.perf_counter() - fuse_started) * 1000)
+    return [_to_result(hit, round(score, 6)) for hit, score in fused]
+
+
+def _search(
+    query: str, k: int, clauses: List[Dict[str, Any]], num_candidates: Optional[int], mode: str
+) -> List[Dict[str, Any]]:
+    settings = get_settings()
+    started = time.perf_counter()
+    vector = get_embedder().embed_query(query) if mode != "lexical" else None
+    size, legs = _plan(k, mode, vector, settings)
+    res = get_search_backend().search_legs(query, vector, size, clauses, num_candidates, legs=legs)
+    out = _results(res, k, settings)
+    search_latency.record("total", (time.perf_counter() - started) * 1000)
     return out
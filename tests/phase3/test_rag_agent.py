@@ -0,0 +1,33 @@
+from phase3.graph.nodes import rag_agent
+from phase3.graph.state import GraphState, Message
+
+
+def _run(monkeypatch, text, memory, hits):
+    calls = []
+
+    def fake_search(query, k=5, needs_certificate=False, filters=None):
+        calls.append({"k": k, "filters": filters})
+        return list(hits)
+
+    monkeypatch.setattr(rag_agent, "search_properties", fake_search)
+    monkeypatch.setattr(rag_agent, "get_llm", lambda: None)
+    state = GraphState(messages=[Message(role="user", content=text)], context={"memory": memory})
+    return rag_agent.rag_node(state), calls
+
+
+def test_explicit_query_overrides_remembered_preferences(monkeypatch):
+    memory = {"preferred_locations": ["Hyderabad"], "budget_max": 5000000}
+    _, calls = _run(monkeypatch, "Show flats in Navi Mumbai under 90L", memory, [])
+    assert calls == [{"k": 5, "filters": {"max_price": 9000000.0, "location": "navi mumbai"}}]
+
+
+def test_remembered_preferences_only_rerank(monkeypatch):
+    memory = {"preferred_locations": ["Hyderabad"], "budget_max": 5000000}
+    hits = [
+        {"id": "PROP-1", "city": "pune", "price": 9000000},
+        {"id": "PROP-2", "city": "hyderabad", "price": 4000000},
+        {"id": "PROP-3", "city": "hyderabad", "price": 8000000},
+    ]
+    out, calls = _run(monkeypatch, "quiet villa with a garden", memory, hits)
+    assert calls == [{"k": 15, "filters": {}}]
+    assert [h["id"] for h in out.result.data["hits"]] == ["PROP-2", "PROP-3", "PROP-1"]
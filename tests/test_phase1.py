@@ -44,3 +44,30 @@ def test_phase1_wrapper_and_parse_smoke():
         assert k in result
     assert isinstance(result["rooms_detail"], list)
     assert result["rooms"] >= 0 and result["bathrooms"] >= 0
+
+
+def test_pool_parse_enforces_timeout(monkeypatch):
+    try:
+        import smartestate.floorplan as floorplan
+    except Exception as e:
+        pytest.skip(f"Phase 1 dependencies not available: {e}")
+    import signal
+    import time
+    if not hasattr(signal, "SIGALRM"):
+        pytest.skip("SIGALRM not available on this platform")
+
+    class _SlowParser:
+        def parse(self, image_path):
+            time.sleep(2)
+            return {"rooms": 1}
+
+    class _FastParser:
+        def parse(self, image_path):
+            return {"rooms": 2, "path": image_path}
+
+    monkeypatch.setattr(floorplan, "_WORKER_PARSER", _SlowParser())
+    key, parsed, err = floorplan._pool_parse("row-1", "plan.jpg", 0.1)
+    assert key == "row-1" and parsed is None and "exceeded" in err
+
+    monkeypatch.setattr(floorplan, "_WORKER_PARSER", _FastParser())
+    assert floorplan._pool_parse("row-2", "plan.jpg", 5) == ("row-2", {"rooms": 2, "path": "plan.jpg"}, None)
@@ -5,16 +5,20 @@ ETL_IMPORT_ERROR = None
 ES_IMPORT_ERROR = None
 try:
     from smartestate.etl import (
-        _parse_cert_links,
+        _certificate_texts,
         _resolve_certificate_paths,
         _resolve_image_path,
-        _read_pdfs_text,
+        _embed_items,
+        _relaxed_refresh,
+        _row_fingerprint,
+        _upsert_properties,
+        _build_doc,
     )
 except Exception as e:
     ETL_IMPORT_ERROR = e
 
 try:
-    from smartestate.es_client import ensure_index
+    from smartestate.es_client import ensure_index, swap_alias
 except Exception as e:
     ES_IMPORT_ERROR = e
 
@@ -23,6 +27,7 @@ class FakeIndices:
     def __init__(self):
         self.created = None
         self._exists = False
+        self.mapping = {}
 
     def exists(self, index):
         return self._exists
@@ -32,19 +37,86 @@ class FakeIndices:
         self._exists = True
         return {"acknowledged": True}
 
+    def get_settings(self, index, name=None):
+        return {index: {"settings": {"index": {"refresh_interval": "5s"}}}}
+
+    def get_mapping(self, index):
+        return {"properties_v1": {"mappings": {"properties": self.mapping}}}
+
+    def put_mapping(self, index, properties):
+        self.mapping_puts = getattr(self, "mapping_puts", []) + [properties]
+        return {"acknowledged": True}
+
+    def put_settings(self, index, settings):
+        self.settings_calls = getattr(self, "settings_calls", []) + [settings]
+        return {"acknowledged": True}
+
+    def refresh(self, index):
+        self.refreshed = True
+
 
 class FakeES:
     def __init__(self):
         self.indices = FakeIndices()
 
 
+class FakeEmbedder:
+    """Embedder stand-in that records its encode calls; vectors come from ``vector_of(text)``."""
+
+    def __init__(self, vector_of=lambda text: [float(len(text))]):
+        self.vector_of = vector_of
+        self.calls = []
+        self.batch_sizes = []
+
+    def encode_array(self, texts, batch_size=None):
+        import numpy as np
+
+        self.calls.append(list(texts))
+        self.batch_sizes.append(batch_size)
+        return np.array([self.vector_of(t) for t in texts], dtype=np.float32)
+
+    def embed_query(self, text):
+        return self.vector_of(text)
+
+
+class FakeSearchES:
+    """Elasticsearch stand-in for search tests: records each msearch and answers with ``respond(searches)``."""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.calls = []
+
+    def msearch(self, index, searches):
+        self.calls.append(searches)
+        return self.respond(searches)
+
+
+@pytest.fixture
+def search_es(monkeypatch):
+    """Route ``tools.search`` through the Elasticsearch backend onto a ``FakeSearchES``, with an empty result cache."""
+
+    def install(respond, embedder=None):
+        from smartestate import search_backends
+        from smartestate.tools import search
+
+        es = FakeSearchES(respond)
+        monkeypatch.setattr(search_backends, "get_es", lambda: es)
+        monkeypatch.setattr(search, "get_search_backend", lambda: search_backends.ElasticsearchBackend())
+        monkeypatch.setattr(search, "_result_cache", search.SearchResultCache())
+        if embedder is not None:
+            monkeypatch.setattr(search, "get_embedder", lambda: embedder)
+        return es
+
+    return install
+
+
 def test_parse_cert_links_splitters():
-    if ETL_IMPORT_ERROR:
-        pytest.skip(f"ETL module not available: {ETL_IMPORT_ERROR}")
-    assert _parse_cert_links("a.pdf|b.pdf") == ["a.pdf", "b.pdf"]
-    assert _parse_cert_links("a.pdf, b.pdf") == ["a.pdf", "b.pdf"]
-    assert _parse_cert_links(None) == []
-    assert _parse_cert_links("nan") == []
+    pd = pytest.importorskip("pandas")
+    from smartestate.reader import normalize_frame, resolve_columns
+
+    df = pd.DataFrame({"cert_links": ["a.pdf|b.pdf", "a.pdf, b.pdf", None, "nan"]})
+    certs = normalize_frame(df, resolve_columns(df.columns))["certs"].tolist()
+    assert certs == [["a.pdf", "b.pdf"], ["a.pdf", "b.pdf"], [], []]
 
 
 def test_resolve_certificate_paths_to_assets():
@@ -77,9 +149,11 @@ def test_resolve_image_path_from_filename():
 def test_read_pdfs_text_nonempty():
     if ETL_IMPORT_ERROR:
         pytest.skip(f"ETL module not available: {ETL_IMPORT_ERROR}")
-    names = ["assets/certificates/fire-safety.pdf"]
-    text = _read_pdfs_text(names)
-    assert isinstance(text, str)
+    from smartestate.certificates import CertificateExtractor
+
+    recs = [{"certs": ["assets/certificates/fire-safety.pdf"]}, {"certs": []}]
+    texts = _certificate_texts(recs, CertificateExtractor(0, max_pages=5, max_chars=20000))
+    assert len(texts) == 2 and all(isinstance(t, str) for t in texts) and texts[1] == ""
     # Not all PDFs are text-extractable; allow empty but should not error
 
 
@@ -95,3 +169,997 @@ def test_ensure_index_creates_mapping():
     assert "embedding" in props
     assert props["embedding"]["type"] == "dense_vector"
     assert props["embedding"]["dims"] == 384
+
+
+def test_ensure_index_adds_fields_missing_from_existing_index():
+    if ES_IMPORT_ERROR:
+        pytest.skip(f"ES client not available: {ES_IMPORT_ERROR}")
+    fake = FakeES()
+    fake.indices._exists = True
+    fake.indices.mapping = {
+        "title": {"type": "text"},
+        "location": {"type": "keyword"},
+        "parsed_json": {"properties": {"rooms": {"type": "long"}}},
+        "rooms_detail": {"type": "nested"},
+        "embedding": {"type": "dense_vector", "dims": 384},
+    }
+    ensure_index(fake)
+    assert fake.indices.created is None
+    (added,) = fake.indices.mapping_puts
+    assert added["city"] == {"type": "keyword"}
+    assert added["has_certificates"] == {"type": "boolean"}
+    assert {"rooms", "bathrooms", "price"} <= set(added) and "title" not in added
+
+    # Written before the field was declared: dynamic text, only a reindex can fix it
+    fake.indices.mapping = {**fake.indices.mapping, **added, "city": {"type": "text"}}
+    with pytest.raises(RuntimeError, match="city"):
+        ensure_index(fake)
+
+
+def test_vector_mapping_follows_settings(monkeypatch):
+    if ES_IMPORT_ERROR:
+        pytest.skip(f"ES client not available: {ES_IMPORT_ERROR}")
+    from smartestate.es_client import knn_num_candidates, vector_mapping
+
+    monkeypatch.setenv("EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2")
+    monkeypatch.setenv("ES_VECTOR_INDEX_TYPE", "int8_hnsw")
+    monkeypatch.setenv("ES_HNSW_M", "32")
+    monkeypatch.setenv("ES_HNSW_EF_CONSTRUCTION", "200")
+    monkeypatch.setenv("SEARCH_NUM_CANDIDATES", "100")
+    mapping = vector_mapping()
+    assert mapping["dims"] == 768
+    assert mapping["index_options"] == {"type": "int8_hnsw", "m": 32, "ef_construction": 200}
+    monkeypatch.setenv("EMBEDDING_DIMS", "256")
+    monkeypatch.setenv("ES_VECTOR_INDEX_TYPE", "int8_flat")
+    assert vector_mapping()["dims"] == 256
+    assert vector_mapping()["index_options"] == {"type": "int8_flat"}
+    assert knn_num_candidates(5) == 100
+    assert knn_num_candidates(500) == 500
+    assert knn_num_candidates(5, 20000) == 10000
+
+
+def test_relaxed_refresh_restores_interval():
+    if ETL_IMPORT_ERROR:
+        pytest.skip(f"ETL module not available: {ETL_IMPORT_ERROR}")
+    fake = FakeES()
+    with _relaxed_refresh(fake, "properties"):
+        assert fake.indices.settings_calls == [{"index": {"refresh_interval": "-1"}}]
+    assert fake.indices.settings_calls[-1] == {"index": {"refresh_interval": "5s"}}
+    assert fake.indices.refreshed
+
+
+def test_upsert_properties_on_conflict_statement():
+    if ETL_IMPORT_ERROR:
+        pytest.skip(f"ETL module not available: {ETL_IMPORT_ERROR}")
+    from sqlalchemy.dialects import postgresql
+
+    class _Session:
+        def execute(self, stmt):
+            self.stmt = stmt
+
+    s = _Session()
+    _upsert_properties(s, [
+        {"external_id": "PROP-1", "title": "A", "parsed_json": None},
+        {"external_id": "PROP-2", "title": "B", "parsed_json": {"rooms": 2}},
+    ])
+    sql = str(s.stmt.compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT ON CONSTRAINT uq_properties_external_id DO UPDATE" in sql
+    assert "coalesce(excluded.parsed_json, properties.parsed_json)" in sql
+
+
+def test_upsert_properties_dedupes_and_stays_under_bind_limit(monkeypatch):
+    if ETL_IMPORT_ERROR:
+        pytest.skip(f"ETL module not available: {ETL_IMPORT_ERROR}")
+    from smartestate import etl
+
+    class _Session:
+        def __init__(self):
+            self.stmts = []
+
+        def execute(self, stmt):
+            self.stmts.append(stmt.compile().params)
+
+    monkeypatch.setattr(etl, "_MAX_BIND_PARAMS", 6)
+    s = _Session()
+    rows = [{"external_id": f"PROP-{i}", "title": f"v{i}"} for i in range(5)]
+    _upsert_properties(s, rows + [{"external_id": "PROP-1", "title": "latest"}])
+    # Two columns per row: three rows per statement, the duplicate collapsed into its last value
+    assert [len(p) for p in s.stmts] == [6, 4]
+    titles = [v for p in s.stmts for k, v in p.items() if k.startswith("title")]
+    assert sorted(titles) == ["latest", "v0", "v2", "v3", "v4"]
+
+
+def test_embed_items_single_encode_call():
+    if ETL_IMPORT_ERROR:
+        pytest.skip(f"ETL module not available: {ETL_IMPORT_ERROR}")
+
+    emb = FakeEmbedder()
+    items = [
+        {"full_text": "aa", "doc": {}},
+        {"full_text": "", "doc": {}},
+        {"full_text": "bbbb", "doc": {}},
+    ]
+    _embed_items(items, emb, batch_size=16)
+    assert emb.calls == [["aa", "bbbb"]] and emb.batch_sizes == [16]
+    assert items[0]["doc"]["embedding"] == [2.0]
+    assert "embedding" not in items[1]["doc"]
+    assert items[2]["doc"]["embedding"] == [4.0]
+
+
+def test_disk_cache_lru_eviction(tmp_path):
+    from smartestate.cache import DiskCache
+
+    cache = DiskCache(str(tmp_path / "c.sqlite"), max_entries=2)
+    cache.put("a", {"rooms": 1})
+    cache.put("b", {"rooms": 2})
+    assert cache.get("a") == {"rooms": 1}  # a is now most recently used
+    cache.put("c", {"rooms": 3})
+    cache._evict()
+    assert cache.get("b") is None
+    assert cache.get("a") == {"rooms": 1}
+    assert cache.get("c") == {"rooms": 3}
+    st = cache.stats()
+    assert st["entries"] == 2 and st["hits"] == 3 and st["misses"] == 1
+
+
+def test_row_fingerprint_tracks_image_content(tmp_path):
+    if ETL_IMPORT_ERROR:
+        pytest.skip(f"ETL module not available: {ETL_IMPORT_ERROR}")
+    img = tmp_path / "plan.jpg"
+    img.write_bytes(b"v1")
+    rec = {"external_id": "PROP-1", "title": "Flat", "price": 100.0, "floorplan_image": str(img), "certs": []}
+    h1, has_image = _row_fingerprint(rec)
+    assert has_image
+    assert _row_fingerprint(dict(rec))[0] == h1
+    assert _row_fingerprint({**rec, "price": 101.0})[0] != h1
+    img.write_bytes(b"v2")
+    assert _row_fingerprint(rec)[0] != h1
+
+
+def test_certificate_extractor_caps_and_caches(tmp_path):
+    try:
+        from smartestate.cache import DiskCache
+        from smartestate.certificates import CertificateExtractor
+        from smartestate.tools.pdf import generate_summary_pdf
+    except Exception as e:
+        pytest.skip(f"certificate extraction deps not available: {e}")
+    lines = [f"inspection line {i}" for i in range(120)]
+    pdf = tmp_path / "report.pdf"
+    pdf.write_bytes(generate_summary_pdf("Fire Safety", [{"heading": "Findings", "lines": lines}]))
+
+    cache = DiskCache(str(tmp_path / "certs.sqlite"))
+    ex = CertificateExtractor(0, max_pages=1, max_chars=300, cache=cache)
+    text = ex.extract_many([str(pdf)])[str(pdf)]
+    assert "Fire Safety" in text
+    assert len(text) <= 300
+    assert "inspection line 119" not in text
+    assert ex.extract_many([str(pdf)])[str(pdf)] == text
+    assert (ex.hits, ex.misses) == (1, 1)
+
+    # A failed extraction is not cached, so a fixed file is read again
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"%PDF-1.4 truncated")
+    assert ex.extract_many([str(broken)])[str(broken)] == ""
+    assert cache.get(ex._key(str(broken))) is None
+    assert ex.extract_many([str(broken)])[str(broken)] == ""
+    assert (ex.hits, ex.misses) == (1, 3)
+
+
+def test_asset_fetcher_caches_and_revalidates(tmp_path):
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    import requests
+    from smartestate.assets import AssetFetcher
+
+    class _Unreachable(requests.adapters.BaseAdapter):
+        def send(self, request, **kwargs):
+            raise requests.ConnectionError("network is unreachable")
+
+        def close(self):
+            pass
+
+    hits = {"full": 0, "not_modified": 0}
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/missing.pdf":
+                self.send_response(404)
+                self.end_headers()
+                return
+            if self.headers.get("If-None-Match") == '"v1"':
+                hits["not_modified"] += 1
+                self.send_response(304)
+                self.end_headers()
+                return
+            hits["full"] += 1
+            body = b"%PDF-fake" * 1000
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        fetcher = AssetFetcher(str(tmp_path), max_workers=4, revalidate_after=0)
+        out = fetcher.fetch_many([f"{base}/a.pdf", f"{base}/a.pdf", f"{base}/missing.pdf"])
+        local = out[f"{base}/a.pdf"]
+        assert local and local.endswith(".pdf") and os.path.getsize(local) == 9000
+        assert out[f"{base}/missing.pdf"] is None
+        assert fetcher.fetch(f"{base}/a.pdf") == local
+        assert hits == {"full": 1, "not_modified": 1}
+        assert not [n for n in os.listdir(tmp_path) if n.endswith(".part")]
+
+        # Revalidation that cannot reach the server falls back to the cached copy
+        offline = AssetFetcher(str(tmp_path), revalidate_after=0, timeout=1)
+        offline.session.mount("http://", _Unreachable())
+        assert offline.fetch(f"{base}/a.pdf") == local
+        assert offline.fetch(f"{base}/never-fetched.pdf") is None
+        offline.close()
+
+        # Over the byte cap the least recently used file goes, together with its metadata
+        fetcher.max_bytes = 15000
+        os.utime(local, (1, 1))
+        other = fetcher.fetch(f"{base}/b.pdf")
+        assert fetcher.prune() == 1
+        assert os.path.exists(other) and not os.path.exists(local)
+        assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(other), os.path.basename(other) + ".meta.json"])
+        fetcher.close()
+    finally:
+        server.shutdown()
+
+
+def test_reader_normalizes_chunks_across_formats(tmp_path):
+    pd = pytest.importorskip("pandas")
+    from smartestate.reader import count_rows, iter_records
+
+    df = pd.DataFrame({
+        "Property_ID": ["PROP-1", "PROP-2", None],
+        "Title": [" 2BHK Flat ", "Villa", "Plot"],
+        "City": ["Hyderabad", None, "Pune"],
+        "Price": ["6500000", "bad", 1200000],
+        "Listing_Date": ["2024-01-05", None, "2024-02-10"],
+        "Certificates": ["fire.pdf|pest.pdf", "a.pdf, b.pdf", None],
+        "metadata_tags": ["gym,pool", None, "nan"],
+    })
+    paths = {"csv": tmp_path / "feed.csv", "xlsx": tmp_path / "feed.xlsx"}
+    df.to_csv(paths["csv"], index=False)
+    with pd.ExcelWriter(paths["xlsx"]) as writer:
+        df.to_excel(writer, index=False)
+        # Saved as the active sheet; the feed is still the first one
+        pd.DataFrame({"Notes": ["x"] * 5}).to_excel(writer, sheet_name="Notes", index=False)
+        writer.book.active = 1
+    try:
+        paths["parquet"] = tmp_path / "feed.parquet"
+        df.astype(str).replace("None", None).to_parquet(paths["parquet"])
+    except Exception:
+        paths.pop("parquet")
+
+    for path in paths.values():
+        chunks = list(iter_records(str(path), chunk_size=2))
+        assert [len(c) for c in chunks] == [2, 1]
+        assert count_rows(str(path)) == 3
+        r1, r2, r3 = chunks[0] + chunks[1]
+        assert r1["external_id"] == "PROP-1" and r1["title"] == "2BHK Flat"
+        assert r1["location"] == "Hyderabad" and r1["price"] == 6500000.0
+        assert r1["listing_date"].isoformat() == "2024-01-05"
+        assert r1["certs"] == ["fire.pdf", "pest.pdf"]
+        assert r1["metadata_tags"] == {"tags": ["gym", "pool"]}
+        assert r2["location"] is None and r2["price"] is None and r2["listing_date"] is None
+        assert r2["certs"] == ["a.pdf", "b.pdf"] and r2["metadata_tags"] is None
+        assert r3["certs"] == [] and r3["metadata_tags"] is None
+        assert r3["external_id"] and len(r3["external_id"]) == 40
+
+
+def test_reader_parses_mixed_date_formats_per_cell(tmp_path):
+    pd = pytest.importorskip("pandas")
+    from smartestate.reader import iter_records
+
+    path = tmp_path / "feed.csv"
+    pd.DataFrame({
+        "Title": ["a", "b", "c", "d"],
+        "Listing_Date": ["2024-01-05", "Jan 7, 2024", "07/03/2024", "someday"],
+    }).to_csv(path, index=False)
+    (records,) = list(iter_records(str(path)))
+    dates = [r["listing_date"].isoformat() if r["listing_date"] else None for r in records]
+    assert dates == ["2024-01-05", "2024-01-07", "2024-07-03", None]
+
+
+def test_count_rows_counts_csv_records_not_lines(tmp_path):
+    from smartestate.reader import count_rows, iter_records
+
+    path = tmp_path / "feed.csv"
+    path.write_text('title,long_description\nVilla,"Two floors\n\nwith a garden"\n\nPlot,"Corner\nplot"\n', encoding="utf-8")
+    assert count_rows(str(path)) == 2 == sum(len(c) for c in iter_records(str(path)))
+
+
+class FakeAliasIndices:
+    def __init__(self, indices, aliases):
+        self.indices = set(indices)
+        self.aliases = dict(aliases)  # index -> alias
+        self.actions = None
+        self.deleted = []
+
+    def exists_alias(self, name):
+        return name in self.aliases.values()
+
+    def exists(self, index):
+        return index in self.indices or index in self.aliases.values()
+
+    def get_alias(self, name):
+        return {idx: {"aliases": {name: {}}} for idx, a in self.aliases.items() if a == name}
+
+    def update_aliases(self, actions):
+        self.actions = actions
+
+    def delete(self, index, ignore_unavailable=False):
+        self.deleted.append(index)
+
+
+def test_swap_alias_replaces_previous_version():
+    if ES_IMPORT_ERROR:
+        pytest.skip(f"ES client not available: {ES_IMPORT_ERROR}")
+    es = FakeES()
+    es.indices = FakeAliasIndices({"properties_v1", "properties_v2"}, {"properties_v1": "properties"})
+    old = swap_alias(es, "properties", "properties_v2")
+    assert old == ["properties_v1"]
+    assert es.indices.actions == [
+        {"remove": {"index": "properties_v1", "alias": "properties"}},
+        {"add": {"index": "properties_v2", "alias": "properties"}},
+    ]
+    assert es.indices.deleted == ["properties_v1"]
+
+
+def test_swap_alias_migrates_concrete_index():
+    if ES_IMPORT_ERROR:
+        pytest.skip(f"ES client not available: {ES_IMPORT_ERROR}")
+    es = FakeES()
+    es.indices = FakeAliasIndices({"properties", "properties_v2"}, {})
+    swap_alias(es, "properties", "properties_v2")
+    assert es.indices.actions == [
+        {"remove_index": {"index": "properties"}},
+        {"add": {"index": "properties_v2", "alias": "properties"}},
+    ]
+
+
+def test_shared_embedder_loads_once_across_threads(monkeypatch):
+    import sys
+    import threading
+    import types
+
+    import numpy as np
+
+    from smartestate import embedding
+
+    loads = []
+
+    class _Model:
+        def __init__(self, name):
+            loads.append(name)
+
+        def encode(self, texts, batch_size=None, normalize_embeddings=True):
+            return np.ones((len(texts), 3), dtype=np.float32)
+
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(SentenceTransformer=_Model))
+    monkeypatch.setattr(embedding, "_embedder", None)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(embedding.get_embedder().embed(["2BHK Hyderabad"])))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(loads) == 1
+    assert embedding.get_embedder() is embedding.get_embedder()
+    assert all(r == [[1.0, 1.0, 1.0]] for r in results)
+    st = embedding.get_embedder().stats()
+    assert st["loaded"] and st["encode_calls"] == 8 and st["load_seconds"] is not None
+
+
+def test_failed_model_load_is_retried_after_backoff(monkeypatch):
+    import sys
+    import types
+
+    import numpy as np
+
+    from smartestate.embedding import Embeddings
+
+    attempts = []
+
+    class _Model:
+        def __init__(self, name):
+            attempts.append(name)
+            if len(attempts) == 1:
+                raise OSError("connection reset while downloading")
+
+        def encode(self, texts, batch_size=None, normalize_embeddings=True):
+            return np.ones((len(texts), 2), dtype=np.float32)
+
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(SentenceTransformer=_Model))
+    emb = Embeddings("m", load_retry_seconds=60)
+    assert emb.embed(["q"]) is None
+    assert "connection reset" in emb.stats()["load_error"]
+    assert emb.embed(["q"]) is None and len(attempts) == 1  # still backing off
+
+    emb.load_retry_seconds = 0
+    assert emb.embed(["q"]) == [[1.0, 1.0]]
+    assert len(attempts) == 2 and emb.stats()["load_error"] is None
+    emb.embed(["q"])
+    assert len(attempts) == 2
+
+
+def test_query_embedding_cache_reuses_vectors(monkeypatch):
+    import time
+
+    from smartestate.embedding import Embeddings, QueryEmbeddingCache
+
+    emb = Embeddings("m", query_cache=QueryEmbeddingCache(max_entries=2, ttl=60))
+    calls = []
+    monkeypatch.setattr(emb, "embed", lambda texts, batch_size=None: calls.append(list(texts)) or [[0.5] for _ in texts])
+
+    assert emb.embed_query("2BHK in  Hyderabad ") == [0.5]
+    assert emb.embed_query("2BHK in Hyderabad") == [0.5]
+    assert calls == [["2BHK in Hyderabad"]]
+    emb.embed_query("villa")
+    emb.embed_query("plot")  # evicts the least recently used entry
+    emb.embed_query("2BHK in Hyderabad")
+    assert len(calls) == 4
+    st = emb.query_cache.stats()
+    assert st["entries"] == 2 and st["hits"] == 1 and st["misses"] == 4
+
+    expiring = QueryEmbeddingCache(max_entries=4, ttl=0.01)
+    expiring.put(("m", "q"), [1.0])
+    time.sleep(0.02)
+    assert expiring.get(("m", "q")) is None
+
+
+def test_embedding_store_roundtrip_and_reuse(tmp_path):
+    if ETL_IMPORT_ERROR:
+        pytest.skip(f"ETL module not available: {ETL_IMPORT_ERROR}")
+    import numpy as np
+
+    from smartestate.embedding_store import EmbeddingStore, text_key
+
+    store = EmbeddingStore(str(tmp_path), "org/model")
+    emb = FakeEmbedder(lambda text: [0.25, -0.5, float(len(text))])
+    items = [{"full_text": "aa", "doc": {}}, {"full_text": "bbb", "doc": {}}]
+    assert _embed_items(items, emb, 8, store) == 0
+    again = [{"full_text": "bbb", "doc": {}}, {"full_text": "cccc", "doc": {}}]
+    assert _embed_items(again, emb, 8, store) == 1
+    assert emb.calls == [["aa", "bbb"], ["cccc"]]
+    assert again[0]["doc"]["embedding"] == [0.25, -0.5, 3.0]
+
+    reopened = EmbeddingStore(str(tmp_path), "org/model")
+    got = reopened.get_many([text_key("aa"), text_key("zz")])
+    assert list(got) == [text_key("aa")]
+    assert got[text_key("aa")].dtype == np.float16
+    assert isinstance(got[text_key("aa")].base, np.memmap)
+    assert len(reopened) == 3 and reopened.dims == 3
+    with pytest.raises(ValueError):
+        reopened.put_many({"other": np.zeros(4)})
+
+
+def test_embedding_batcher_coalesces_concurrent_queries():
+    import asyncio
+    import threading
+    import time
+
+    import numpy as np
+
+    from smartestate.embedding import EmbeddingBatcher
+
+    class _BusyEmbedder(FakeEmbedder):
+        def __init__(self):
+            super().__init__()
+            self.busy = threading.Event()
+            self.release = threading.Event()
+
+        def encode_array(self, texts, batch_size=None):
+            if not self.calls:
+                self.busy.set()
+                self.release.wait(5)
+            return super().encode_array(texts, batch_size)
+
+    emb = _BusyEmbedder()
+    batcher = EmbeddingBatcher(emb, max_batch_size=16, max_wait_ms=2000)
+    # A lone request does not wait out max_wait_ms
+    started = time.monotonic()
+    lone = threading.Thread(target=lambda: batcher.submit("lone", timeout=5))
+    lone.start()
+    assert emb.busy.wait(1) and time.monotonic() - started < 1
+
+    # Requests queued while the encoder is busy go out together as the next batch
+    results = {}
+
+    def worker(i):
+        results[i] = batcher.submit("x" * (i % 3 + 1), timeout=5)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(6)]
+    for t in threads:
+        t.start()
+    while batcher._queue.qsize() < 6:
+        time.sleep(0.005)
+    emb.release.set()
+    for t in threads + [lone]:
+        t.join()
+
+    assert results == {i: [float(i % 3 + 1)] for i in range(6)}
+    assert len(emb.calls) == 2 and sorted(emb.calls[1]) == ["x", "xx", "xxx"]
+    assert asyncio.run(batcher.asubmit("abcd")) == [4.0]
+    st = batcher.stats()
+    assert st["batches"] == 3 and st["requests"] == 8 and st["largest_batch"] == 6
+    batcher.close()
+
+
+def test_onnx_backend_falls_back_when_parity_failed(tmp_path, monkeypatch):
+    import json
+    import sys
+    import types
+
+    from smartestate.embedding_onnx import OnnxEmbeddings
+
+    class _Model:
+        def __init__(self, name):
+            pass
+
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(SentenceTransformer=_Model))
+    (tmp_path / "parity.json").write_text(json.dumps({"max_score_diff": 0.3, "ok": False}))
+    emb = OnnxEmbeddings("some/model", onnx_dir=str(tmp_path))
+    assert emb.identity == "some/model"
+    assert emb.backend == "torch" and "parity" in emb.fallback_reason
+    assert emb.stats()["fallback_reason"] == emb.fallback_reason
+
+
+def test_onnx_int8_export_matches_reference(tmp_path):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnx")
+    pytest.importorskip("sentence_transformers")
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizer
+
+    from smartestate.embedding import Embeddings
+    from smartestate.embedding_onnx import OnnxEmbeddings, check_parity
+
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + list("abcdefghijklmnopqrstuvwxyz0123456789")
+    vocab += ["##" + c for c in "abcdefghijklmnopqrstuvwxyz0123456789"]
+    (tmp_path / "vocab.txt").write_text("\n".join(vocab))
+    hf_dir = str(tmp_path / "hf")
+    BertTokenizer(str(tmp_path / "vocab.txt")).save_pretrained(hf_dir)
+    BertModel(BertConfig(
+        vocab_size=len(vocab), hidden_size=32, num_hidden_layers=1, num_attention_heads=2,
+        intermediate_size=64, max_position_embeddings=64,
+    )).save_pretrained(hf_dir)
+    word = models.Transformer(hf_dir, max_seq_length=32)
+    model_dir = str(tmp_path / "st")
+    SentenceTransformer(modules=[word, models.Pooling(word.get_word_embedding_dimension(), "mean")]).save(model_dir)
+
+    onnx = OnnxEmbeddings(model_dir, onnx_dir=str(tmp_path / "onnx"))
+    assert onnx.identity == f"{model_dir}#onnx-int8", onnx.fallback_reason
+    assert (tmp_path / "onnx" / "parity.json").exists()
+    texts = ["2bhk in hyderabad", "villa", "fire safety certificate for plot 12"] * 5
+    report = check_parity(Embeddings(model_dir), onnx, texts, tolerance=0.05)
+    assert report["ok"] and report["min_self_cosine"] > 0.98
+
+
+def test_hybrid_search_fuses_legs_from_one_msearch(monkeypatch, search_es):
+    try:
+        from smartestate.tools import search
+    except Exception as e:
+        pytest.skip(f"search tools unavailable: {e}")
+
+    def _hits(*ids):
+        return {"took": 3, "hits": {"hits": [{"_id": i, "_score": 1.0, "_source": {"title": i}} for i in ids]}}
+
+    es = search_es(
+        lambda searches: {"responses": [_hits("PROP-7", "A", "B"), _hits("B", "PROP-7", "C")]},
+        FakeEmbedder(lambda text: [0.1, 0.2]),
+    )
+    monkeypatch.setenv("SEARCH_MODE", "hybrid")
+    monkeypatch.setenv("SEARCH_LEXICAL_WEIGHT", "1.0")
+    monkeypatch.setenv("SEARCH_VECTOR_WEIGHT", "1.0")
+
+    out = search.search_properties("flat PROP-7", k=3)
+    assert [r["id"] for r in out] == ["PROP-7", "B", "A"]
+    assert len(es.calls) == 1
+    lexical, knn = es.calls[0][1], es.calls[0][3]
+    assert {"ids": {"values": ["PROP-7"], "boost": 10.0}} in lexical["query"]["bool"]["should"]
+    assert knn["knn"]["query_vector"] == [0.1, 0.2]
+    assert {"lexical", "vector", "fusion", "total"} <= set(search.search_latency.snapshot())
+
+    monkeypatch.setenv("SEARCH_LEXICAL_WEIGHT", "0")
+    assert [r["id"] for r in search.search_properties("flat PROP-7", k=3)] == ["B", "PROP-7", "C"]
+
+
+def test_build_doc_carries_filter_fields():
+    if ETL_IMPORT_ERROR:
+        pytest.skip(f"ETL module not available: {ETL_IMPORT_ERROR}")
+    values = {
+        "title": "2BHK",
+        "location": "Kondapur, Secunderabad, Telangana",
+        "cert_links": {"links": ["fire.pdf"]},
+        "parsed_json": {"rooms": 2, "bathrooms": 2, "kitchens": 1},
+    }
+    doc = _build_doc(values, "2BHK", None)
+    assert doc["city"] == "hyderabad" and doc["has_certificates"] is True
+    assert (doc["rooms"], doc["bathrooms"], doc["kitchens"], doc["halls"]) == (2, 2, 1, None)
+    assert doc["cert_links"] == ["fire.pdf"]
+    bare = _build_doc({"title": "Plot", "location": "Somewhere", "cert_links": None, "parsed_json": None}, "Plot", None)
+    assert bare["city"] is None and bare["has_certificates"] is False and bare["rooms"] is None
+
+
+def test_search_filters_are_pushed_into_both_legs(search_es):
+    try:
+        from smartestate.tools import search
+    except Exception as e:
+        pytest.skip(f"search tools unavailable: {e}")
+
+    clauses = search.build_filters(
+        {"max_price": 7000000, "location": "Bengaluru", "min_rooms": 2, "max_rooms": 2, "seller_type": "owner"},
+        needs_certificate=True,
+    )
+    assert clauses == [
+        {"range": {"price": {"lte": 7000000.0}}},
+        {"term": {"city": "bangalore"}},
+        {"term": {"seller_type": "owner"}},
+        {"range": {"rooms": {"gte": 2, "lte": 2}}},
+        {"term": {"has_certificates": True}},
+    ]
+    assert search.build_filters({"location": "Sector 5*"})[0]["wildcard"]["location"]["value"] == "*Sector 5\\**"
+
+    es = search_es(
+        lambda searches: {"responses": [{"hits": {"hits": []}}, {"hits": {"hits": []}}]},
+        FakeEmbedder(lambda text: [1.0]),
+    )
+    search.search_properties("villa", k=3, mode="hybrid", filters={"min_rooms": 3})
+    (searches,) = es.calls
+    expected = [{"range": {"rooms": {"gte": 3}}}]
+    assert searches[1]["query"]["bool"]["filter"] == expected
+    assert searches[3]["knn"]["filter"] == {"bool": {"filter": expected}}
+
+
+def test_embedded_backend_search_and_snapshots(tmp_path, monkeypatch):
+    try:
+        from smartestate import search_backends
+        from smartestate.tools import search
+    except Exception as e:
+        pytest.skip(f"search tools unavailable: {e}")
+
+    import numpy as np
+
+    backend = search_backends.EmbeddedBackend(str(tmp_path), vector_dtype="float16")
+    docs = [
+        ("PROP-1", {"title": "Villa with pool", "city": "bangalore", "price": 9e6, "rooms": 4, "has_certificates": True, "embedding": [1.0, 0.0]}),
+        ("PROP-2", {"title": "Compact flat", "city": "hyderabad", "price": 4e6, "rooms": 2, "has_certificates": False, "embedding": [0.0, 1.0]}),
+        ("PROP-3", {"title": "Flat near metro", "location": "Sector 5, Noida", "price": 5e6, "rooms": 2, "embedding": [0.6, 0.8]}),
+    ]
+    assert backend.index_documents(docs) == (3, [])
+    legs = backend.search_legs("flat", [0.0, 1.0], 2, search.build_filters({"max_price": 6e6}))
+    assert [h["_id"] for h in legs["lexical"]["hits"]["hits"]] == ["PROP-2", "PROP-3"]
+    assert [h["_id"] for h in legs["vector"]["hits"]["hits"]] == ["PROP-2", "PROP-3"]
+    assert "embedding" not in legs["vector"]["hits"]["hits"][0]["_source"]
+    assert backend.search_legs("PROP-1 flat", None, 1, [], legs=("lexical",))["lexical"]["hits"]["hits"][0]["_id"] == "PROP-1"
+    wildcard = search.build_filters({"location": "sector 5"}, needs_certificate=False)
+    assert [h["_id"] for h in backend.search_legs("flat", None, 5, wildcard, legs=("lexical",))["lexical"]["hits"]["hits"]] == ["PROP-3"]
+    certified = search.build_filters({"location": "Bengaluru"}, needs_certificate=True)
+    assert [h["_id"] for h in backend.search_legs("villa", [1.0, 0.0], 5, certified)["vector"]["hits"]["hits"]] == ["PROP-1"]
+
+    backend.delete_documents(["PROP-2"])
+    backend.add_memory({"user_id": "u1", "text": "prefers 2BHK", "embedding": [0.0, 1.0]})
+    backend.add_memory({"user_id": "u2", "text": "wants a villa", "embedding": [0.0, 1.0]})
+    backend.close()
+
+    # A second process sees the snapshots: float16 vectors memory-mapped, deletes compacted away
+    reopened = search_backends.EmbeddedBackend(str(tmp_path), vector_dtype="float16")
+    assert sorted(reopened.properties.doc_ids()) == ["PROP-1", "PROP-3"]
+    assert isinstance(reopened.properties._vectors, np.memmap) and reopened.properties._vectors.dtype == np.float16
+    hits = reopened.search_legs("flat", [0.0, 1.0], 5, [])["vector"]["hits"]["hits"]
+    assert hits[0]["_id"] == "PROP-3" and hits[0]["_score"] == pytest.approx(0.9, abs=1e-3)
+    assert [h["_source"]["text"] for h in reopened.search_memory("u1", "2BHK", [0.0, 1.0], 5)["hits"]["hits"]] == ["prefers 2BHK"]
+    # Writes after loading a memory-mapped snapshot, and pickup of a snapshot saved elsewhere
+    reopened.index_documents([("PROP-4", {"title": "Plot", "embedding": [1.0, 0.0]})])
+    reopened.flush()
+    assert "PROP-4" in backend._current_properties().doc_ids()
+    # The snapshot readers may still have open survives one more save; older ones are pruned
+    first = sorted(n for n in os.listdir(reopened.properties_dir) if n.startswith("snapshot-"))
+    reopened.index_documents([("PROP-5", {"title": "Shop", "embedding": [0.0, 1.0]})])
+    reopened.flush()
+    kept = [n for n in os.listdir(reopened.properties_dir) if n.startswith("snapshot-")]
+    assert len(first) == 2 and len(kept) == 2 and reopened.properties.snapshot in kept
+    assert len(set(first) & set(kept)) == 1
+
+    class _Incomplete(search_backends.SearchBackend):
+        def search_legs(self, query, vector, size, clauses, num_candidates=None, legs=search_backends.LEGS):
+            return {}
+
+    with pytest.raises(TypeError):
+        _Incomplete()
+
+
+def test_search_cache_invalidates_on_generation_and_coalesces(tmp_path, monkeypatch):
+    import json
+    import threading
+    import time
+
+    try:
+        from smartestate import cache as cache_mod
+        from smartestate.tools import search
+    except Exception as e:
+        pytest.skip(f"search tools unavailable: {e}")
+
+    import types
+
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("SEARCH_CACHE_GENERATION_POLL", "0")
+    monkeypatch.setattr(search, "_result_cache", search.SearchResultCache(max_entries=8, ttl=60))
+    marker = ["properties_v1:"]
+    monkeypatch.setattr(search, "get_search_backend", lambda: types.SimpleNamespace(generation=lambda: marker[0]))
+    calls = []
+    release = threading.Event()
+
+    def _fake_search(query, k, clauses, num_candidates, mode):
+        calls.append((query, json.dumps(clauses)))
+        release.wait(5)
+        return [{"id": f"P{len(calls)}", "score": 1.0}]
+
+    monkeypatch.setattr(search, "_search", _fake_search)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(search.search_properties("2bhk  hyderabad", filters={"location": "Hyderabad"})))
+        for _ in range(6)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(0.2)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1 and all(r == [{"id": "P1", "score": 1.0}] for r in results)
+
+    # Same normalized query and equivalent filters hit; a mutated result does not leak back
+    hit = search.search_properties("2bhk hyderabad", filters={"location": "hyderabad"})
+    hit[0]["id"] = "changed"
+    assert search.search_properties("2bhk hyderabad", filters={"location": "Hyderabad"})[0]["id"] == "P1"
+    assert len(calls) == 1
+
+    assert cache_mod.bump_index_generation() == 1
+    assert search.search_properties("2bhk hyderabad", filters={"location": "Hyderabad"})[0]["id"] == "P2"
+    # Another host's ingest or reindex only shows up in the backend's own marker
+    marker[0] = "properties_v2:"
+    assert search.search_properties("2bhk hyderabad", filters={"location": "Hyderabad"})[0]["id"] == "P3"
+    stats = search.get_search_cache().stats()
+    assert (stats["hits"], stats["misses"], stats["coalesced"]) == (2, 3, 5)
+
+
+def test_es_backend_generation_follows_alias_and_ingest_marker(monkeypatch):
+    import types
+
+    from smartestate import search_backends
+
+    stored_meta = {}
+    concrete = ["properties_v1"]
+    indices = types.SimpleNamespace(
+        get_mapping=lambda index: {concrete[0]: {"mappings": {"_meta": dict(stored_meta)}}},
+        put_mapping=lambda index, meta: stored_meta.update(meta),
+    )
+    monkeypatch.setattr(search_backends, "get_es", lambda: types.SimpleNamespace(indices=indices))
+    backend = search_backends.ElasticsearchBackend()
+    first = backend.generation()
+    backend.mark_changed()
+    second = backend.generation()
+    concrete[0] = "properties_v2"
+    assert len({first, second, backend.generation()}) == 3
+
+
+def test_es_client_is_shared_per_process(monkeypatch):
+    from smartestate import es_client
+
+    built = []
+
+    class _Client:
+        def __init__(self, url, **options):
+            built.append(options)
+            self.closed = False
+
+        def close(self):
+            self.closed = True
+
+    monkeypatch.setattr(es_client, "Elasticsearch", _Client)
+    monkeypatch.setattr(es_client, "_es", None)
+    monkeypatch.setenv("ES_MAX_RETRIES", "5")
+    monkeypatch.setenv("ES_CONNECTIONS_PER_NODE", "4")
+    first = es_client.get_es()
+    assert es_client.get_es() is first and len(built) == 1
+    assert built[0]["max_retries"] == 5 and built[0]["connections_per_node"] == 4
+
+    # A forked child gets its own client instead of the parent's sockets
+    monkeypatch.setattr(es_client, "_es_pid", -1)
+    assert es_client.get_es() is not first and len(built) == 2
+    second = es_client.get_es()
+    es_client.close_es()
+    assert second.closed and es_client._es is None
+
+
+def test_batch_search_uses_one_encode_and_one_msearch(monkeypatch, search_es):
+    try:
+        from smartestate.embedding import Embeddings, QueryEmbeddingCache
+        from smartestate.tools import search
+    except Exception as e:
+        pytest.skip(f"search tools unavailable: {e}")
+
+    def _echo(searches):
+        # The query text comes back as the hit id so results can be matched to queries
+        return {"responses": [
+            {"took": 2, "hits": {"hits": [{"_id": (b.get("query") or {}).get("multi_match", {}).get("query", "knn"), "_source": {}}]}}
+            for b in searches[1::2]
+        ]}
+
+    emb = Embeddings("fake", query_cache=QueryEmbeddingCache())
+    emb._load_attempted = True
+    emb._model = object()
+    encoded = []
+    monkeypatch.setattr(emb, "_encode", lambda texts, batch_size: encoded.append(list(texts)) or [[1.0, 0.0]] * len(texts))
+    es = search_es(_echo, emb)
+
+    queries = ["villa", "2bhk  flat", "plot", "2bhk flat"]
+    out = search.search_properties_batch(queries, k=1, mode="hybrid")
+    assert encoded == [["villa", "2bhk flat", "plot"]]
+    assert len(es.calls) == 1 and len(es.calls[0]) == 12
+    assert [r[0]["id"] for r in out] == ["villa", "2bhk  flat", "plot", "2bhk  flat"]
+
+    # Cached now: neither the encoder nor ES is called again
+    assert [r[0]["id"] for r in search.search_properties_batch(["plot", "villa"], k=1, mode="hybrid")] == ["plot", "villa"]
+    assert len(encoded) == 1 and len(es.calls) == 1
+
+
+def test_search_hits_are_projected_and_highlighted(tmp_path, monkeypatch):
+    try:
+        from smartestate import search_backends
+        from smartestate.tools import search
+    except Exception as e:
+        pytest.skip(f"search tools unavailable: {e}")
+
+    monkeypatch.setenv("SEARCH_SOURCE_EXCLUDES", '["full_text", "parsed_json"]')
+    monkeypatch.setenv("SEARCH_HIGHLIGHT_FRAGMENT_SIZE", "60")
+    bodies = search_backends.ElasticsearchBackend._bodies("fire noc", [1.0], 10, [], None, search_backends.LEGS)
+    for body in bodies.values():
+        assert body["_source"] == {"excludes": ["embedding", "full_text", "parsed_json"]}
+        assert body["highlight"]["highlight_query"] == {"match": {"full_text": "fire noc"}}
+        assert body["highlight"]["fields"]["full_text"]["fragment_size"] == 60
+
+    hit = {"_id": "P1", "_source": {"title": "Villa"}, "highlight": {"full_text": ["<em>Fire</em> NOC issued"]}}
+    assert search._to_result(hit, 1.0) == {"id": "P1", "score": 1.0, "title": "Villa", "highlights": ["<em>Fire</em> NOC issued"]}
+
+    backend = search_backends.EmbeddedBackend(str(tmp_path))
+    full_text = "Villa with garden. " + "Spacious rooms. " * 20 + "Fire NOC issued by the municipal fire department in 2022."
+    backend.index_documents([("P1", {"title": "Villa", "full_text": full_text, "parsed_json": {"rooms": 4}, "embedding": [1.0, 0.0]})])
+    res = backend.search_legs("fire noc", [1.0, 0.0], 5, [])
+    for leg in ("lexical", "vector"):
+        (hit,) = res[leg]["hits"]["hits"]
+        assert set(hit["_source"]) == {"title"}
+        (fragment,) = hit["highlight"]["full_text"]
+        assert "<em>Fire</em> <em>NOC</em>" in fragment and len(fragment) <= 60 + 4 * 9
+    assert backend.properties.sources[0]["full_text"] == full_text
+
+    monkeypatch.setenv("SEARCH_SOURCE_INCLUDES", '["ti*"]')
+    assert search_backends._project({"title": "a", "price": 1}, search_backends.source_filter()) == {"title": "a"}
+
+
+def test_bulk_ingest_resumes_from_mid_window_checkpoint(tmp_path, monkeypatch):
+    if ETL_IMPORT_ERROR:
+        pytest.skip(f"ETL module not available: {ETL_IMPORT_ERROR}")
+    import types
+
+    from smartestate import etl
+
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path / "cache"))
+    feed = tmp_path / "feed.csv"
+    feed.write_text("property_id,title,price\n" + "".join(f"PROP-{i},Flat {i},{i}00000\n" for i in range(1, 8)))
+
+    checkpoints, saved, flushed, deleted = {}, [], [], []
+    crash_on = []
+
+    def fake_flush(es, index, items, stats):
+        ids = [item["values"]["external_id"] for item in items]
+        if crash_on and ids[0] == crash_on[0]:
+            raise RuntimeError("bulk write failed")
+        flushed.append(ids)
+
+    def fake_save(fingerprint, rows):
+        checkpoints[fingerprint] = rows
+        saved.append(rows)
+
+    monkeypatch.setattr(etl, "init_db", lambda: None)
+    monkeypatch.setattr(etl, "get_search_backend", lambda: types.SimpleNamespace(name="embedded", flush=lambda: None))
+    monkeypatch.setattr(etl, "get_embedder", lambda: types.SimpleNamespace(identity="fake"))
+    monkeypatch.setattr(etl, "get_embedding_store", lambda identity: None)
+    monkeypatch.setattr(etl, "_embed_items", lambda items, *a, **kw: 0)
+    monkeypatch.setattr(etl, "_flush_batch", fake_flush)
+    monkeypatch.setattr(etl, "_load_checkpoint", lambda fp: checkpoints.get(fp, 0))
+    monkeypatch.setattr(etl, "_save_checkpoint", fake_save)
+    monkeypatch.setattr(etl, "_clear_checkpoint", lambda fp: checkpoints.pop(fp))
+    monkeypatch.setattr(etl, "_delete_missing", lambda es, index, seen: deleted.append(set(seen)) or 0)
+
+    def ingest(**kw):
+        return etl.ingest_excel(str(feed), bulk=True, batch_size=3, parse_workers=0, incremental=False, **kw)
+
+    # First run dies on the third window; the first two are committed
+    crash_on.append("PROP-7")
+    with pytest.raises(RuntimeError):
+        ingest()
+    assert flushed == [["PROP-1", "PROP-2", "PROP-3"], ["PROP-4", "PROP-5", "PROP-6"]]
+    assert saved == [3, 6]
+
+    # A checkpoint that ends mid-window: rows 1-4 are skipped, including the first of window two
+    fingerprint = next(iter(checkpoints))
+    checkpoints[fingerprint] = 4
+    crash_on.clear()
+    flushed.clear()
+    saved.clear()
+    progress = []
+    stats = ingest(delete_missing=True, progress=progress.append)
+    assert stats["resumed_from_row"] == 4
+    assert flushed == [["PROP-5", "PROP-6"], ["PROP-7"]]
+    assert saved == [6, 7]
+    assert [p["rows_processed"] for p in progress] == [6, 7]
+    # Skipped rows still count as seen, so --delete-missing keeps them
+    assert deleted == [{f"PROP-{i}" for i in range(1, 8)}]
+    assert checkpoints == {}
+
+    # --restart ignores a leftover checkpoint
+    checkpoints[fingerprint] = 6
+    flushed.clear()
+    stats = ingest(resume=False)
+    assert stats["resumed_from_row"] == 0
+    assert flushed[0] == ["PROP-1", "PROP-2", "PROP-3"] and checkpoints == {}
+
+
+def test_incremental_ingest_reindexes_rows_from_an_older_doc_schema(tmp_path, monkeypatch):
+    if ETL_IMPORT_ERROR:
+        pytest.skip(f"ETL module not available: {ETL_IMPORT_ERROR}")
+    import types
+
+    from smartestate import etl
+
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path / "cache"))
+    feed = tmp_path / "feed.csv"
+    feed.write_text("property_id,title,price\nPROP-1,Flat in Pune,100000\nPROP-2,Villa,200000\n")
+
+    def _fingerprints():
+        return {rec["external_id"]: etl._row_fingerprint(rec)[0] for window in etl.iter_records(str(feed)) for rec in window}
+
+    # Fingerprints as stored by an ingest that ran before the current doc schema
+    current = etl._DOC_SCHEMA_VERSION
+    monkeypatch.setattr(etl, "_DOC_SCHEMA_VERSION", current - 1)
+    stored = _fingerprints()
+    monkeypatch.setattr(etl, "_DOC_SCHEMA_VERSION", current)
+
+    flushed = []
+    monkeypatch.setattr(etl, "init_db", lambda: None)
+    monkeypatch.setattr(etl, "get_search_backend", lambda: types.SimpleNamespace(name="embedded", flush=lambda: None))
+    monkeypatch.setattr(etl, "get_embedder", lambda: types.SimpleNamespace(identity="fake"))
+    monkeypatch.setattr(etl, "get_embedding_store", lambda identity: None)
+    monkeypatch.setattr(etl, "_embed_items", lambda items, *a, **kw: 0)
+    monkeypatch.setattr(etl, "_flush_batch", lambda es, index, items, stats: flushed.extend(i["values"]["external_id"] for i in items))
+    monkeypatch.setattr(etl, "_existing_fingerprints", lambda ids: {i: stored.get(i) for i in ids})
+    monkeypatch.setattr(etl, "_load_checkpoint", lambda fp: 0)
+    monkeypatch.setattr(etl, "_save_checkpoint", lambda fp, rows: None)
+    monkeypatch.setattr(etl, "_clear_checkpoint", lambda fp: None)
+
+    stats = etl.ingest_excel(str(feed), bulk=True, parse_workers=0)
+    assert flushed == ["PROP-1", "PROP-2"] and stats["unchanged_rows"] == 0
+
+    # Once stored under the current schema, the same rows are skipped
+    stored = _fingerprints()
+    flushed.clear()
+    stats = etl.ingest_excel(str(feed), bulk=True, parse_workers=0)
+    assert flushed == [] and stats["unchanged_rows"] == 2
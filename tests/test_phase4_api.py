@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+
+import pytest
+
+
+def _wait_for(manager, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_job_manager_progress_and_result():
+    from smartestate.jobs import JobManager
+
+    def fake_ingest(path, progress=None):
+        for done in (50, 100):
+            progress({"rows_processed": done, "rows_total": 100, "failed_rows": 1, "skipped_index": 0})
+        return {"ingested_rows": 99, "failed_rows": 1, "rows_processed": 100, "rows_total": 100}
+
+    cleaned = []
+    manager = JobManager(max_concurrent=1, max_queued=0)
+    job_id = manager.submit("ingest", fake_ingest, "feed.xlsx", cleanup=lambda: cleaned.append(True))
+    job = _wait_for(manager, job_id)
+    assert job["status"] == "succeeded"
+    assert job["result"]["ingested_rows"] == 99
+    assert job["rows_processed"] == 100 and job["failures"] == 1
+    assert job["eta_seconds"] == 0
+    assert cleaned == [True]
+    manager.shutdown()
+
+
+def test_job_manager_rejects_when_full():
+    from smartestate.jobs import JobManager, JobQueueFull
+
+    release = threading.Event()
+
+    def blocking(progress=None):
+        release.wait(5)
+        return {}
+
+    manager = JobManager(max_concurrent=1, max_queued=1)
+    first = manager.submit("ingest", blocking)
+    manager.submit("ingest", blocking)
+    with pytest.raises(JobQueueFull):
+        manager.submit("ingest", blocking)
+    release.set()
+    assert _wait_for(manager, first)["status"] == "succeeded"
+    manager.shutdown()
+
+
+def test_job_manager_shutdown_cancels_queued_jobs_and_cleans_up():
+    from smartestate.jobs import JobManager
+
+    started, release = threading.Event(), threading.Event()
+
+    def blocking(progress=None):
+        started.set()
+        release.wait(5)
+        return {}
+
+    cleaned = []
+    manager = JobManager(max_concurrent=1, max_queued=2)
+    running = manager.submit("ingest", blocking, cleanup=lambda: cleaned.append("running"))
+    assert started.wait(5)
+    queued = manager.submit("ingest", blocking, cleanup=lambda: cleaned.append("queued"))
+    manager.shutdown()
+    assert cleaned == ["queued"]
+    job = manager.get(queued)
+    assert job["status"] == "cancelled" and job["finished_at"] is not None
+    release.set()
+    assert _wait_for(manager, running)["status"] == "succeeded"
+    deadline = time.time() + 5
+    while len(cleaned) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert cleaned == ["queued", "running"]
+
+
+def test_upload_size_limit(monkeypatch, tmp_path):
+    try:
+        from fastapi.testclient import TestClient
+        import api.main as api_main
+    except Exception as e:
+        pytest.skip(f"API dependencies not available: {e}")
+    import asyncio
+    import io
+    import tempfile
+    from starlette.datastructures import UploadFile
+
+    monkeypatch.setenv("MAX_UPLOAD_MB", "0.001")  # ~1 KB
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+
+    client = TestClient(api_main.app)
+    resp = client.post("/parse_floorplan", files={"file": ("plan.jpg", b"x" * 5000, "image/jpeg")})
+    assert resp.status_code == 413
+
+    # No Content-Length to go by: the chunked copy enforces the cap and removes the partial file
+    upload = UploadFile(io.BytesIO(b"x" * 5000), filename="feed.xlsx")
+    with pytest.raises(api_main.UploadTooLarge):
+        asyncio.run(api_main._save_upload(upload, "smartestate_excel_", ".xlsx"))
+    assert list(tmp_path.iterdir()) == []
+
+    small = UploadFile(io.BytesIO(b"y" * 100), filename="feed.xlsx")
+    saved = asyncio.run(api_main._save_upload(small, "smartestate_excel_", ".xlsx"))
+    assert saved.endswith(".xlsx") and os.path.getsize(saved) == 100
+    os.remove(saved)
+
+
+def test_batch_search_endpoint(monkeypatch):
+    try:
+        from fastapi.testclient import TestClient
+        import api.main as api_main
+    except Exception as e:
+        pytest.skip(f"API dependencies not available: {e}")
+
+    seen = {}
+
+    def fake_batch(queries, k=5, needs_certificate=False, mode=None, filters=None):
+        seen.update(k=k, filters=filters)
+        return [[{"id": q.upper()}] for q in queries]
+
+    monkeypatch.setattr(api_main, "search_properties_batch", fake_batch)
+    monkeypatch.setenv("SEARCH_BATCH_MAX_QUERIES", "2")
+    client = TestClient(api_main.app)
+    resp = client.post("/search/batch", json={"queries": ["villa", "plot"], "k": 3, "filters": {"max_price": 5000000}})
+    assert resp.status_code == 200
+    assert resp.json()["results"] == [{"query": "villa", "hits": [{"id": "VILLA"}]}, {"query": "plot", "hits": [{"id": "PLOT"}]}]
+    assert seen == {"k": 3, "filters": {"max_price": 5000000}}
+    assert client.post("/search/batch", json={"queries": ["a", "b", "c"]}).status_code == 400
+    # k and the batch size are bounded by the request model whatever the settings say
+    monkeypatch.setenv("SEARCH_BATCH_MAX_QUERIES", "1000")
+    assert client.post("/search/batch", json={"queries": ["a"], "k": 0}).status_code == 422
+    assert client.post("/search/batch", json={"queries": ["a"], "k": 51}).status_code == 422
+    assert client.post("/search/batch", json={"queries": ["a"] * 101}).status_code == 422